@@ -3,21 +3,24 @@ from __future__ import annotations
 import os
 import json
 import time
+import argparse
 import shutil
 import pathlib
-from dataclasses import dataclass
-from typing import Dict, List, Any, Iterable
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Any, Iterable, Iterator, TextIO
 
-import pandas as pd
 import yaml
 from tqdm import tqdm
 
 from grey_search.sources.openalex import search_openalex
 from grey_search.sources.clinicaltrials import search_clinicaltrials
-from grey_search.sources.seedsites import harvest_seed_sites
-from grey_search.utils.rank import score_record, looks_relevant
-from grey_search.utils.dedupe import dedupe_records
-from grey_search.utils.log import log_event, now_iso
+from grey_search.sources.seedsites import crawl_seed_site
+from grey_search.sources.record import GreyRecord
+from grey_search.utils.rank import RelevanceScorer
+from grey_search.utils.dedupe import IncrementalDeduper
+from grey_search.utils.checkpoint import Checkpoint
+from grey_search.utils.export import NormalizedCsvWriter
+from grey_search.utils.log import add_metrics_args, log_event, metrics_from_args, now_iso
 
 
 @dataclass
@@ -32,51 +35,81 @@ def load_config(path: str = "grey_search/config.yaml") -> Dict[str, Any]:
         return yaml.safe_load(f)
 
 
-def save_jsonl(path: pathlib.Path, records: Iterable[Dict[str, Any]]) -> None:
+def append_jsonl(path: pathlib.Path, records: Iterable[GreyRecord]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
+    with open(path, "a", encoding="utf-8") as f:
         for r in records:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            f.write(json.dumps(r.to_dict(), ensure_ascii=False) + "\n")
 
 
 def _ris_line(tag: str, value: str) -> str:
     return f"{tag}  - {value}\n"
 
 
-def save_ris(path: pathlib.Path, records: Iterable[Dict[str, Any]]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
+def write_ris_record(f: TextIO, r: GreyRecord) -> None:
+    title = (r.title or "Untitled").strip()
+    abstract = r.abstract or ""
+
+    year = r.year
+    date = str(year) if year else ""
+
+    url = r.url or r.id
+    doi = r.doi
+
+    f.write(_ris_line("TY", "GEN"))
+    f.write(_ris_line("TI", title))
+    if abstract:
+        f.write(_ris_line("AB", str(abstract).strip()))
+    if date:
+        f.write(_ris_line("PY", date))
+    if doi:
+        f.write(_ris_line("DO", str(doi).strip()))
+    if url:
+        f.write(_ris_line("UR", str(url).strip()))
+    f.write(_ris_line("DB", str(r.source or "grey_search")))
+    f.write(_ris_line("ER", ""))
+    f.write("\n")
+
+
+class CandidateSink:
+    """
+    Scores, filters and dedupes records as they arrive and appends survivors to
+    the RIS output and the normalized CSV. Only the dedupe index stays in memory.
+    """
+
+    def __init__(self, scorer: RelevanceScorer, deduper: IncrementalDeduper,
+                 ris_path: pathlib.Path, normalized_path: pathlib.Path) -> None:
+        self.scorer = scorer
+        self.deduper = deduper
+        self.ris_path = ris_path
+        self.normalized_path = normalized_path
+        self.raw_n = 0
+        self.filtered_n = 0
+        self.deduped_n = 0
+
+        ris_path.parent.mkdir(parents=True, exist_ok=True)
+        self._ris = open(ris_path, "w", encoding="utf-8")
+        self._csv = NormalizedCsvWriter(normalized_path)
+
+    def add(self, records: Iterable[GreyRecord]) -> None:
         for r in records:
-            title = (r.get("title") or "Untitled").strip()
-            abstract = r.get("abstract") or r.get("snippet") or ""
-            if isinstance(abstract, dict):
-                abstract = json.dumps(abstract, ensure_ascii=False)
-
-            year = r.get("year")
-            date = str(year) if year else ""
-
-            url = r.get("url") or r.get("primary_location") or r.get("id")
-            doi = r.get("doi")
-
-            f.write(_ris_line("TY", "GEN"))
-            f.write(_ris_line("TI", title))
-            if abstract:
-                f.write(_ris_line("AB", str(abstract).strip()))
-            if date:
-                f.write(_ris_line("PY", date))
-            if doi:
-                f.write(_ris_line("DO", str(doi).strip()))
-            if url:
-                f.write(_ris_line("UR", str(url).strip()))
-            f.write(_ris_line("DB", str(r.get("source") or "grey_search")))
-            f.write(_ris_line("ER", ""))
-            f.write("\n")
-
-
-def save_normalized_csv(path: pathlib.Path, records: Iterable[Dict[str, Any]]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    df = pd.DataFrame(list(records))
-    df.to_csv(path, index=False)
+            self.raw_n += 1
+            if r.relevance_score is None:
+                self.scorer.annotate(r)
+            if r.relevance_score < self.scorer.min_score:
+                continue
+            self.filtered_n += 1
+            if not self.deduper.accept(r):
+                continue
+            self.deduped_n += 1
+            write_ris_record(self._ris, r)
+            self._csv.write(r)
+        self._ris.flush()
+        self._csv.flush()
+
+    def close(self) -> None:
+        self._ris.close()
+        self._csv.close()
 
 
 def migrate_legacy_outputs(raw_dir: pathlib.Path, normalized_path: pathlib.Path) -> None:
@@ -94,12 +127,105 @@ def migrate_legacy_outputs(raw_dir: pathlib.Path, normalized_path: pathlib.Path)
         shutil.move(str(legacy_csv), str(normalized_path))
 
 
+def restore_raw(raw_path: pathlib.Path, n_keep: int, sink: CandidateSink) -> None:
+    """
+    Trim raw_path to the first n_keep records recorded in the checkpoint (drops
+    anything written after the last checkpoint save) and replay them into the sink.
+    """
+    if not raw_path.exists():
+        raw_path.parent.mkdir(parents=True, exist_ok=True)
+        raw_path.write_text("", encoding="utf-8")
+        return
+    tmp = raw_path.with_suffix(raw_path.suffix + ".tmp")
+    kept = 0
+    with open(raw_path, "r", encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as dst:
+        for line in src:
+            if kept >= n_keep:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            dst.write(line + "\n")
+            sink.add([GreyRecord.from_dict(json.loads(line))])
+            kept += 1
+    os.replace(tmp, raw_path)
+
+
+def run_stream(key: str, fingerprint: str, raw_path: pathlib.Path,
+               pages_fn: Callable[[Dict[str, Any]], Iterable[List[GreyRecord]]],
+               sink: CandidateSink, checkpoint: Checkpoint, log_path: pathlib.Path) -> None:
+    """
+    Run one (source, query) stream: restore whatever a previous run already
+    wrote for it, then append each new page to raw_path, feed it to the sink
+    and checkpoint the stream state.
+    """
+    state = checkpoint.stream(key)
+    if state and state.get("fingerprint") == fingerprint:
+        restore_raw(raw_path, int(state.get("n_written", 0)), sink)
+        log_event(log_path, {
+            "ts": now_iso(), "stream": key, "event": "resume",
+            "n_written": state.get("n_written", 0), "done": bool(state.get("done")),
+        })
+    else:
+        state.clear()
+        state.update({"fingerprint": fingerprint, "n_written": 0, "done": False})
+        raw_path.parent.mkdir(parents=True, exist_ok=True)
+        raw_path.write_text("", encoding="utf-8")
+        checkpoint.save()
+
+    if state.get("done"):
+        return
+
+    for page in pages_fn(state):
+        append_jsonl(raw_path, page)
+        sink.add(page)
+        state["n_written"] += len(page)
+        checkpoint.save()
+
+    state["done"] = True
+    checkpoint.save()
+
+
+def iter_seed_pages(seed_sites: List[Dict[str, Any]], max_pages: int,
+                    state: Dict[str, Any]) -> Iterator[List[GreyRecord]]:
+    frontiers = state.setdefault("frontiers", {})
+    for site in seed_sites:
+        frontier = frontiers.setdefault(site["base_url"], {})
+        if frontier.get("done"):
+            continue
+        yield from crawl_seed_site(site, max_pages=max_pages, state=frontier)
+        frontier["done"] = True
+
+
+def tag_query(records: List[GreyRecord], query_id: str) -> List[GreyRecord]:
+    for r in records:
+        r.query_id = query_id
+    return records
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Grey literature search pipeline.")
+    parser.add_argument("--config", default="grey_search/config.yaml", help="Grey-search config YAML path.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from the per-(source, query) checkpoint of an interrupted run instead of starting over.",
+    )
+    add_metrics_args(parser)
+    return parser.parse_args()
+
+
 def main() -> None:
-    cfg = load_config()
+    args = parse_args()
+    metrics = metrics_from_args("grey_search", args)
+    cfg = load_config(args.config)
     raw_dir = pathlib.Path(cfg["project"].get("raw_dir", "data/raw/grey-literature"))
     normalized_path = pathlib.Path(cfg["project"].get("normalized_path", "data/normalized/grey-literature.csv"))
+    checkpoint_path = pathlib.Path(cfg["project"].get("checkpoint_path", raw_dir / "grey_search_checkpoint.json"))
+    keep_raw = bool(cfg["project"].get("keep_raw_payloads", False))
     log_dir = pathlib.Path(cfg["project"]["log_dir"])
     log_dir.mkdir(parents=True, exist_ok=True)
+    log_path = log_dir / "search_log.jsonl"
 
     migrate_legacy_outputs(raw_dir=raw_dir, normalized_path=normalized_path)
 
@@ -109,154 +235,185 @@ def main() -> None:
         zero_streak_stop=int(cfg["stopping_rules"]["zero_hit_streak_stop"]),
     )
 
-    queries = cfg["queries"]
-    all_records: List[Dict[str, Any]] = []
-
-    for q in queries:
-        qid = q["id"]
-        qtext = q["text"]
+    checkpoint = Checkpoint.load(checkpoint_path)
+    if not args.resume:
+        checkpoint.clear()
 
-        log_event(log_dir / "search_log.jsonl", {
-            "ts": now_iso(),
-            "source": "openalex",
-            "query_id": qid,
-            "query": qtext,
-            "event": "start"
-        })
-        oa_records = run_with_stopping(
-            source_name="openalex",
-            fetch_fn=lambda cursor: search_openalex(qtext, per_page=200, cursor=cursor),
-            stop_cfg=stop_cfg,
-            cfg=cfg,
-            query_id=qid,
-            log_path=log_dir / "search_log.jsonl"
-        )
-        save_jsonl(raw_dir / f"openalex_{qid}.jsonl", oa_records)
-        all_records.extend(oa_records)
-
-        log_event(log_dir / "search_log.jsonl", {
-            "ts": now_iso(),
-            "source": "clinicaltrials",
-            "query_id": qid,
-            "query": qtext,
-            "event": "start"
-        })
-        ct_records = run_with_stopping(
-            source_name="clinicaltrials",
-            fetch_fn=lambda cursor: search_clinicaltrials(qtext, page_token=cursor),
-            stop_cfg=stop_cfg,
-            cfg=cfg,
-            query_id=qid,
-            log_path=log_dir / "search_log.jsonl"
-        )
-        save_jsonl(raw_dir / f"clinicaltrials_{qid}.jsonl", ct_records)
-        all_records.extend(ct_records)
-
-    log_event(log_dir / "search_log.jsonl", {
-        "ts": now_iso(),
-        "source": "seed_sites",
-        "event": "start",
-        "seed_sites": [s["base_url"] for s in cfg.get("seed_sites", [])]
-    })
-    seed_records = harvest_seed_sites(cfg.get("seed_sites", []), max_pages=80)
-    save_jsonl(raw_dir / "seed_sites.jsonl", seed_records)
-    all_records.extend(seed_records)
+    scorer = RelevanceScorer.from_config(cfg)
+    queries = cfg["queries"]
 
-    if cfg.get("serpapi", {}).get("enabled", False):
-        from grey_search.sources.serpapi_optional import search_serpapi
-        api_key_env = cfg["serpapi"]["api_key_env"]
-        api_key = os.getenv(api_key_env, "")
-        if not api_key:
-            raise RuntimeError(f"SERP API enabled but env var {api_key_env} is empty.")
+    ris_path = raw_dir / "grey_candidates_deduped.ris"
+    sink = CandidateSink(scorer, IncrementalDeduper(cfg), ris_path=ris_path, normalized_path=normalized_path)
 
+    try:
         for q in queries:
             qid = q["id"]
             qtext = q["text"]
-            for engine in cfg["serpapi"]["engines"]:
-                serp_records = search_serpapi(
-                    qtext,
-                    engine=engine,
-                    api_key=api_key,
-                    max_pages=int(cfg["stopping_rules"]["max_pages_google_like"]),
-                )
-                save_jsonl(raw_dir / f"serpapi_{engine}_{qid}.jsonl", serp_records)
-                all_records.extend(serp_records)
-
-    for r in all_records:
-        r["relevance_score"] = score_record(r, cfg)
-        r["looks_relevant"] = looks_relevant(r, cfg)
-
-    filtered = [r for r in all_records if r["relevance_score"] >= cfg["ranking"]["min_score_to_keep"]]
-    deduped = dedupe_records(filtered, cfg)
-
-    ris_path = raw_dir / "grey_candidates_deduped.ris"
-    save_ris(ris_path, deduped)
-    save_normalized_csv(normalized_path, deduped)
 
-    log_event(log_dir / "search_log.jsonl", {
+            sources = [
+                ("openalex", lambda cursor: search_openalex(qtext, per_page=200, cursor=cursor, keep_raw=keep_raw)),
+                ("clinicaltrials", lambda cursor: search_clinicaltrials(qtext, page_token=cursor, keep_raw=keep_raw)),
+            ]
+            for source_name, fetch_fn in sources:
+                log_event(log_path, {
+                    "ts": now_iso(),
+                    "source": source_name,
+                    "query_id": qid,
+                    "query": qtext,
+                    "event": "start"
+                })
+                with metrics.span(source_name):
+                    run_stream(
+                        key=f"{source_name}:{qid}",
+                        # Stop rules are part of the stream identity: raising n_max etc. re-runs it on --resume.
+                        fingerprint=f"{qtext}|{json.dumps(asdict(stop_cfg), sort_keys=True)}",
+                        raw_path=raw_dir / f"{source_name}_{qid}.jsonl",
+                        pages_fn=lambda state: iter_pages_with_stopping(
+                            source_name=source_name,
+                            fetch_fn=fetch_fn,
+                            stop_cfg=stop_cfg,
+                            scorer=scorer,
+                            query_id=qid,
+                            log_path=log_path,
+                            state=state,
+                        ),
+                        sink=sink,
+                        checkpoint=checkpoint,
+                        log_path=log_path,
+                    )
+
+        seed_sites = cfg.get("seed_sites", [])
+        log_event(log_path, {
+            "ts": now_iso(),
+            "source": "seed_sites",
+            "event": "start",
+            "seed_sites": [s["base_url"] for s in seed_sites]
+        })
+        with metrics.span("seed_sites", profile=True):
+            run_stream(
+                key="seed_sites",
+                fingerprint=json.dumps(seed_sites, sort_keys=True),
+                raw_path=raw_dir / "seed_sites.jsonl",
+                pages_fn=lambda state: iter_seed_pages(seed_sites, max_pages=80, state=state),
+                sink=sink,
+                checkpoint=checkpoint,
+                log_path=log_path,
+            )
+
+        if cfg.get("serpapi", {}).get("enabled", False):
+            from grey_search.sources.serpapi_optional import search_serpapi
+            api_key_env = cfg["serpapi"]["api_key_env"]
+            api_key = os.getenv(api_key_env, "")
+            if not api_key:
+                raise RuntimeError(f"SERP API enabled but env var {api_key_env} is empty.")
+
+            max_pages = int(cfg["stopping_rules"]["max_pages_google_like"])
+            for q in queries:
+                qid = q["id"]
+                qtext = q["text"]
+                for engine in cfg["serpapi"]["engines"]:
+                    with metrics.span(f"serpapi_{engine}"):
+                        run_stream(
+                            key=f"serpapi_{engine}:{qid}",
+                            fingerprint=f"{qtext}|{max_pages}",
+                            raw_path=raw_dir / f"serpapi_{engine}_{qid}.jsonl",
+                            pages_fn=lambda state: [
+                                tag_query(search_serpapi(qtext, engine=engine, api_key=api_key, max_pages=max_pages), qid)
+                            ],
+                            sink=sink,
+                            checkpoint=checkpoint,
+                            log_path=log_path,
+                        )
+    finally:
+        with metrics.span("finalize"):
+            sink.close()
+
+    log_event(log_path, {
         "ts": now_iso(),
         "event": "complete",
-        "raw_n": len(all_records),
-        "filtered_n": len(filtered),
-        "deduped_n": len(deduped),
+        "raw_n": sink.raw_n,
+        "filtered_n": sink.filtered_n,
+        "deduped_n": sink.deduped_n,
         "output_ris": str(ris_path),
         "output_normalized_csv": str(normalized_path),
     })
 
-    print(f"Done. Raw={len(all_records)} Filtered={len(filtered)} Deduped={len(deduped)}")
+    print(f"Done. Raw={sink.raw_n} Filtered={sink.filtered_n} Deduped={sink.deduped_n}")
     print(f"Raw output dir: {raw_dir}")
     print(f"RIS output: {ris_path}")
     print(f"Normalized CSV: {normalized_path}")
-
-
-def run_with_stopping(source_name: str, fetch_fn, stop_cfg: StopConfig, cfg: Dict[str, Any],
-                      query_id: str, log_path: pathlib.Path) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    cursor = None
-    irrelevant_streak = 0
-
-    pbar = tqdm(total=stop_cfg.n_max, desc=f"{source_name}:{query_id}", leave=False)
-    while len(out) < stop_cfg.n_max:
-        payload = fetch_fn(cursor)
-        batch = payload.get("records", [])
-        cursor = payload.get("next_cursor")
-
-        if not batch:
-            log_event(log_path, {"ts": now_iso(), "source": source_name, "query_id": query_id, "event": "no_more_results"})
-            break
-
-        for r in batch:
-            r["source"] = source_name
-            r["query_id"] = query_id
-            out.append(r)
-
-            if len(out) > stop_cfg.warmup_n:
-                if not looks_relevant(r, cfg):
-                    irrelevant_streak += 1
-                else:
-                    irrelevant_streak = 0
-
-                if irrelevant_streak >= stop_cfg.zero_streak_stop:
-                    log_event(log_path, {
-                        "ts": now_iso(), "source": source_name, "query_id": query_id,
-                        "event": "early_stop_irrelevant_streak",
-                        "irrelevant_streak": irrelevant_streak,
-                        "n_collected": len(out)
-                    })
-                    pbar.close()
-                    return out[: stop_cfg.n_max]
-
-            if len(out) >= stop_cfg.n_max:
+    metrics.count("raw", sink.raw_n)
+    metrics.count("filtered", sink.filtered_n)
+    metrics.count("deduped", sink.deduped_n)
+    print("\n".join(metrics.close()))
+
+
+def iter_pages_with_stopping(source_name: str, fetch_fn, stop_cfg: StopConfig, scorer: RelevanceScorer,
+                             query_id: str, log_path: pathlib.Path,
+                             state: Dict[str, Any] | None = None) -> Iterator[List[GreyRecord]]:
+    """
+    Yield scored pages from fetch_fn until n_max records were produced, the
+    source runs dry, or the post-warmup irrelevant streak limit is hit.
+
+    `state` (cursor, n_collected, irrelevant_streak) is updated before each
+    yield, so persisting it after a page has been consumed lets a later call
+    continue from the next page.
+    """
+    if state is None:
+        state = {}
+    n_collected = int(state.get("n_collected", 0))
+    cursor = state.get("cursor")
+    irrelevant_streak = int(state.get("irrelevant_streak", 0))
+
+    pbar = tqdm(total=stop_cfg.n_max, initial=n_collected, desc=f"{source_name}:{query_id}", leave=False)
+    try:
+        while n_collected < stop_cfg.n_max:
+            payload = fetch_fn(cursor)
+            batch = payload.get("records", [])
+            cursor = payload.get("next_cursor")
+
+            if not batch:
+                log_event(log_path, {"ts": now_iso(), "source": source_name, "query_id": query_id, "event": "no_more_results"})
                 break
-            pbar.update(1)
-
-        if not cursor:
-            break
 
-        time.sleep(0.2)
+            page: List[GreyRecord] = []
+            stop = False
+            for r in batch:
+                r.source = source_name
+                r.query_id = query_id
+                relevant = scorer.annotate(r).score >= scorer.min_score
+                page.append(r)
+                n_collected += 1
+
+                if n_collected > stop_cfg.warmup_n:
+                    if not relevant:
+                        irrelevant_streak += 1
+                    else:
+                        irrelevant_streak = 0
+
+                    if irrelevant_streak >= stop_cfg.zero_streak_stop:
+                        log_event(log_path, {
+                            "ts": now_iso(), "source": source_name, "query_id": query_id,
+                            "event": "early_stop_irrelevant_streak",
+                            "irrelevant_streak": irrelevant_streak,
+                            "n_collected": n_collected
+                        })
+                        stop = True
+                        break
+
+                if n_collected >= stop_cfg.n_max:
+                    break
+                pbar.update(1)
+
+            state.update({"cursor": cursor, "n_collected": n_collected, "irrelevant_streak": irrelevant_streak})
+            yield page
+
+            if stop or not cursor:
+                break
 
-    pbar.close()
-    return out[: stop_cfg.n_max]
+            time.sleep(0.2)
+    finally:
+        pbar.close()
 
 
 if __name__ == "__main__":
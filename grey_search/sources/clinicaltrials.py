@@ -4,13 +4,43 @@ from typing import Dict, Any, Optional, List
 
 import requests
 
+from grey_search.sources.record import GreyRecord
+
 BASE = "https://clinicaltrials.gov/api/v2/studies"
 
+# Only the protocolSection pieces ranking, dedupe and export read.
+FIELDS = [
+    "NCTId",
+    "BriefTitle",
+    "BriefSummary",
+    "OverallStatus",
+    "StartDate",
+    "CompletionDate",
+    "Condition",
+    "PrimaryOutcomeMeasure",
+    "PrimaryOutcomeTimeFrame",
+    "SecondaryOutcomeMeasure",
+    "SecondaryOutcomeTimeFrame",
+]
+
+
+def _outcome_labels(outcomes: Optional[List[Dict[str, Any]]]) -> List[str]:
+    labels: List[str] = []
+    for outcome in outcomes or []:
+        measure = (outcome.get("measure") or "").strip()
+        time_frame = (outcome.get("timeFrame") or "").strip()
+        if measure and time_frame:
+            labels.append(f"{measure} [{time_frame}]")
+        elif measure or time_frame:
+            labels.append(measure or time_frame)
+    return labels
+
 
-def search_clinicaltrials(query: str, page_token: Optional[str] = None) -> Dict[str, Any]:
+def search_clinicaltrials(query: str, page_token: Optional[str] = None, keep_raw: bool = False) -> Dict[str, Any]:
     params = {
         "query.term": query,
         "pageSize": 100,
+        "fields": "|".join(FIELDS),
     }
     if page_token:
         params["pageToken"] = page_token
@@ -19,7 +49,7 @@ def search_clinicaltrials(query: str, page_token: Optional[str] = None) -> Dict[
     response.raise_for_status()
     payload = response.json()
 
-    records: List[Dict[str, Any]] = []
+    records: List[GreyRecord] = []
     for study in payload.get("studies", []):
         protocol = study.get("protocolSection", {})
         ident = protocol.get("identificationModule", {})
@@ -29,17 +59,19 @@ def search_clinicaltrials(query: str, page_token: Optional[str] = None) -> Dict[
         cond = protocol.get("conditionsModule", {})
         nct_id = ident.get("nctId")
 
-        records.append({
-            "title": ident.get("briefTitle"),
-            "abstract": descr.get("briefSummary"),
-            "nct_id": nct_id,
-            "status": status.get("overallStatus"),
-            "start_date": status.get("startDateStruct", {}).get("date"),
-            "completion_date": status.get("completionDateStruct", {}).get("date"),
-            "conditions": cond.get("conditions"),
-            "primary_outcomes": outcomes.get("primaryOutcomes"),
-            "secondary_outcomes": outcomes.get("secondaryOutcomes"),
-            "url": f"https://clinicaltrials.gov/study/{nct_id}" if nct_id else None,
-        })
+        records.append(GreyRecord(
+            title=ident.get("briefTitle"),
+            abstract=descr.get("briefSummary"),
+            nct_id=nct_id,
+            type="clinical_trial",
+            status=status.get("overallStatus"),
+            start_date=status.get("startDateStruct", {}).get("date"),
+            completion_date=status.get("completionDateStruct", {}).get("date"),
+            conditions=cond.get("conditions") or [],
+            primary_outcomes=_outcome_labels(outcomes.get("primaryOutcomes")),
+            secondary_outcomes=_outcome_labels(outcomes.get("secondaryOutcomes")),
+            url=f"https://clinicaltrials.gov/study/{nct_id}" if nct_id else None,
+            raw=study if keep_raw else None,
+        ))
 
     return {"records": records, "next_cursor": payload.get("nextPageToken")}
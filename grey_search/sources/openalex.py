@@ -4,33 +4,49 @@ from typing import Dict, Any, Optional, List
 
 import requests
 
+from grey_search.sources.record import GreyRecord
+from grey_search.utils.text import openalex_abstract_to_text
+
 BASE = "https://api.openalex.org/works"
 
+# Only the fields ranking, dedupe and RIS/CSV export read.
+SELECT_FIELDS = [
+    "id",
+    "doi",
+    "title",
+    "publication_year",
+    "type",
+    "primary_location",
+    "abstract_inverted_index",
+]
+
 
-def search_openalex(query: str, per_page: int = 200, cursor: Optional[str] = None) -> Dict[str, Any]:
+def search_openalex(query: str, per_page: int = 200, cursor: Optional[str] = None,
+                    keep_raw: bool = False) -> Dict[str, Any]:
     params = {
         "search": query,
         "per-page": min(per_page, 200),
         "cursor": cursor or "*",
+        "select": ",".join(SELECT_FIELDS),
         "mailto": "your_email@example.com",
     }
     response = requests.get(BASE, params=params, timeout=30)
     response.raise_for_status()
     payload = response.json()
 
-    records: List[Dict[str, Any]] = []
+    records: List[GreyRecord] = []
     for item in payload.get("results", []):
-        records.append({
-            "title": item.get("title"),
-            "abstract": item.get("abstract_inverted_index"),
-            "doi": (item.get("doi") or "").replace("https://doi.org/", "") if item.get("doi") else None,
-            "id": item.get("id"),
-            "year": item.get("publication_year"),
-            "type": item.get("type"),
-            "primary_location": (item.get("primary_location") or {}).get("landing_page_url"),
-            "host_venue": (item.get("host_venue") or {}).get("display_name"),
-            "authorships": item.get("authorships"),
-            "open_access": item.get("open_access"),
-        })
+        location = item.get("primary_location") or {}
+        records.append(GreyRecord(
+            title=item.get("title"),
+            abstract=openalex_abstract_to_text(item.get("abstract_inverted_index")) or None,
+            doi=(item.get("doi") or "").replace("https://doi.org/", "") if item.get("doi") else None,
+            id=item.get("id"),
+            year=item.get("publication_year"),
+            type=item.get("type"),
+            url=location.get("landing_page_url"),
+            venue=(location.get("source") or {}).get("display_name"),
+            raw=item if keep_raw else None,
+        ))
 
     return {"records": records, "next_cursor": payload.get("meta", {}).get("next_cursor")}
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(slots=True)
+class GreyRecord:
+    """
+    Compact, source-agnostic candidate record. Sources fill only what ranking,
+    dedupe and export use; the original API payload is attached to `raw` only
+    when explicitly requested.
+    """
+
+    title: Optional[str] = None
+    abstract: Optional[str] = None
+    doi: Optional[str] = None
+    pmid: Optional[str] = None
+    nct_id: Optional[str] = None
+    id: Optional[str] = None
+    year: Optional[int] = None
+    type: Optional[str] = None
+    url: Optional[str] = None
+    venue: Optional[str] = None
+    status: Optional[str] = None
+    start_date: Optional[str] = None
+    completion_date: Optional[str] = None
+    conditions: List[str] = field(default_factory=list)
+    primary_outcomes: List[str] = field(default_factory=list)
+    secondary_outcomes: List[str] = field(default_factory=list)
+    source: Optional[str] = None
+    query_id: Optional[str] = None
+    relevance_score: Optional[int] = None
+    looks_relevant: Optional[bool] = None
+    matched_terms: List[str] = field(default_factory=list)
+    raw: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Drop empty fields so the raw JSONL only carries what a source actually provided.
+        out: Dict[str, Any] = {}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if value is None or value == []:
+                continue
+            out[f.name] = value
+        return out
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GreyRecord":
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in names})
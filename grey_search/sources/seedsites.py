@@ -1,62 +1,59 @@
 from __future__ import annotations
 
 import re
-from typing import List, Dict, Any, Set
+from collections import deque
+from typing import List, Dict, Any, Iterator, Optional
 from urllib.parse import urljoin, urlparse
 
 import requests
 from bs4 import BeautifulSoup
 
+from grey_search.sources.record import GreyRecord
+
 PDF_RE = re.compile(r"\.pdf(\?|$)", re.IGNORECASE)
 
 
-def harvest_seed_sites(seed_sites: List[Dict[str, Any]], max_pages: int = 80) -> List[Dict[str, Any]]:
+def crawl_seed_site(site: Dict[str, Any], max_pages: int = 80,
+                    state: Optional[Dict[str, Any]] = None) -> Iterator[List[GreyRecord]]:
     """
     Simple breadth-first crawl from base_url, staying within allow_domains.
     Captures PDFs + pages that look like "guidance/report/audit/toolkit".
     Keep max_pages low to avoid runaway crawling.
+
+    Yields the hits of each visited URL (possibly empty) once that URL's links
+    are queued, so `state` (queue/seen/pages) is a consistent crawler frontier
+    at every yield and can be checkpointed and passed back in to resume.
     """
-    hits: List[Dict[str, Any]] = []
-
-    for site in seed_sites:
-        base = site["base_url"]
-        allow = set(site.get("allow_domains", []))
-        queue = [base]
-        seen: Set[str] = set()
-
-        pages = 0
-        while queue and pages < max_pages:
-            url = queue.pop(0)
-            if url in seen:
+    base = site["base_url"]
+    allow = set(site.get("allow_domains", []))
+    if state is None:
+        state = {}
+    queue = deque(state.get("queue") or [base])
+    seen = set(state.get("seen") or [])
+    pages = int(state.get("pages") or 0)
+
+    while queue and pages < max_pages:
+        url = queue.popleft()
+        if url in seen:
+            continue
+        seen.add(url)
+        hits: List[GreyRecord] = []
+
+        try:
+            response = requests.get(url, timeout=20, headers={"User-Agent": "Mozilla/5.0"})
+            if response.status_code >= 400:
                 continue
-            seen.add(url)
-
-            try:
-                response = requests.get(url, timeout=20, headers={"User-Agent": "Mozilla/5.0"})
-                if response.status_code >= 400:
-                    continue
-                ctype = response.headers.get("Content-Type", "")
-                pages += 1
-
-                if "application/pdf" in ctype or PDF_RE.search(url):
-                    hits.append({
-                        "title": None,
-                        "url": url,
-                        "type": "pdf",
-                        "host": urlparse(url).netloc,
-                    })
-                    continue
+            ctype = response.headers.get("Content-Type", "")
+            pages += 1
 
+            if "application/pdf" in ctype or PDF_RE.search(url):
+                hits.append(GreyRecord(title=None, url=url, type="pdf", source="seed_sites"))
+            else:
                 soup = BeautifulSoup(response.text, "lxml")
                 title = soup.title.text.strip() if soup.title else None
 
                 if looks_like_grey_page(url, title):
-                    hits.append({
-                        "title": title,
-                        "url": url,
-                        "type": "page",
-                        "host": urlparse(url).netloc,
-                    })
+                    hits.append(GreyRecord(title=title, url=url, type="page", source="seed_sites"))
 
                 for a_tag in soup.select("a[href]"):
                     href = a_tag.get("href")
@@ -71,10 +68,14 @@ def harvest_seed_sites(seed_sites: List[Dict[str, Any]], max_pages: int = 80) ->
                     if nxt not in seen and (nxt.startswith("http://") or nxt.startswith("https://")):
                         queue.append(nxt)
 
-            except Exception:
-                continue
+        except Exception:
+            continue
+        finally:
+            state["queue"] = list(queue)
+            state["seen"] = list(seen)
+            state["pages"] = pages
 
-    return hits
+        yield hits
 
 
 def looks_like_grey_page(url: str, title: str | None) -> bool:
@@ -1,14 +1,16 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List
+from typing import List
 
 import requests
 
+from grey_search.sources.record import GreyRecord
+
 BASE = "https://serpapi.com/search.json"
 
 
-def search_serpapi(query: str, engine: str, api_key: str, max_pages: int = 10) -> List[Dict[str, Any]]:
-    results: List[Dict[str, Any]] = []
+def search_serpapi(query: str, engine: str, api_key: str, max_pages: int = 10) -> List[GreyRecord]:
+    results: List[GreyRecord] = []
     start = 0
 
     for _ in range(max_pages):
@@ -31,12 +33,13 @@ def search_serpapi(query: str, engine: str, api_key: str, max_pages: int = 10) -
             break
 
         for item in organic:
-            results.append({
-                "title": item.get("title"),
-                "snippet": item.get("snippet"),
-                "url": item.get("link"),
-                "engine": engine,
-            })
+            results.append(GreyRecord(
+                title=item.get("title"),
+                abstract=item.get("snippet"),
+                url=item.get("link"),
+                type="web_result",
+                source=f"serpapi_{engine}",
+            ))
 
         start += 10
 
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+from typing import Dict, Any
+
+from grey_search.utils.log import now_iso
+
+
+class Checkpoint:
+    """
+    Per-(source, query) resume state persisted as one JSON file.
+
+    Each stream entry is a plain dict (cursor, n_collected, ...) that callers
+    mutate in place and persist with save(); writes go through a temp file and
+    os.replace so an interrupted save never leaves a truncated checkpoint.
+    """
+
+    def __init__(self, path: pathlib.Path, data: Dict[str, Any] | None = None) -> None:
+        self.path = path
+        self.data: Dict[str, Any] = data or {"streams": {}}
+        self.data.setdefault("streams", {})
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "Checkpoint":
+        if not path.exists():
+            return cls(path)
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    def has(self, key: str) -> bool:
+        return key in self.data["streams"]
+
+    def stream(self, key: str, **defaults: Any) -> Dict[str, Any]:
+        state = self.data["streams"].setdefault(key, {})
+        for name, value in defaults.items():
+            state.setdefault(name, value)
+        return state
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.data["updated_at"] = now_iso()
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        self.data = {"streams": {}}
+        if self.path.exists():
+            self.path.unlink()
@@ -1,48 +1,68 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Set, Tuple
 
 from rapidfuzz import fuzz
 
+from grey_search.sources.record import GreyRecord
+
 
 def _norm(s: str) -> str:
     return " ".join((s or "").lower().split())
 
 
-def dedupe_records(records: List[Dict[str, Any]], cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
-    seen: Dict[Tuple[str, str], int] = {}
-    out: List[Dict[str, Any]] = []
+class IncrementalDeduper:
+    """
+    Streaming version of dedupe_records: only identifier keys and normalized
+    titles of accepted records are kept, never the records themselves.
+    """
 
-    thresh = int(cfg["dedupe"]["title_fuzzy_threshold"])
+    def __init__(self, cfg: Dict[str, Any]) -> None:
+        self.use_doi = bool(cfg["dedupe"]["use_doi"])
+        self.use_pmid = bool(cfg["dedupe"]["use_pmid"])
+        self.thresh = int(cfg["dedupe"]["title_fuzzy_threshold"])
+        self.seen_keys: Set[Tuple[str, str]] = set()
+        self.titles: List[str] = []
+        self._exact_titles: Set[str] = set()
 
-    for record in records:
-        doi = (record.get("doi") or "").lower().strip()
-        pmid = str(record.get("pmid") or "").strip()
-        nct = str(record.get("nct_id") or "").strip()
-        title = _norm(record.get("title") or "")
+    def record_key(self, record: GreyRecord) -> Optional[Tuple[str, str]]:
+        doi = (record.doi or "").lower().strip()
+        pmid = str(record.pmid or "").strip()
+        nct = str(record.nct_id or "").strip()
+        if doi and self.use_doi:
+            return ("doi", doi)
+        if pmid and self.use_pmid:
+            return ("pmid", pmid)
+        if nct:
+            return ("nct", nct)
+        return None
 
-        key = None
-        if doi and cfg["dedupe"]["use_doi"]:
-            key = ("doi", doi)
-        elif pmid and cfg["dedupe"]["use_pmid"]:
-            key = ("pmid", pmid)
-        elif nct:
-            key = ("nct", nct)
+    def accept(self, record: GreyRecord) -> bool:
+        title = _norm(record.title or "")
+        key = self.record_key(record)
 
         if key:
-            if key in seen:
-                continue
-            seen[key] = 1
-            out.append(record)
-            continue
-
-        dup = False
-        for existing in out:
-            existing_title = _norm(existing.get("title") or "")
-            if title and existing_title and fuzz.token_set_ratio(title, existing_title) >= thresh:
-                dup = True
-                break
-        if not dup:
-            out.append(record)
-
-    return out
+            if key in self.seen_keys:
+                return False
+            self.seen_keys.add(key)
+            self._remember_title(title)
+            return True
+
+        if title:
+            if title in self._exact_titles:
+                return False
+            for existing_title in self.titles:
+                if fuzz.token_set_ratio(title, existing_title) >= self.thresh:
+                    return False
+        self._remember_title(title)
+        return True
+
+    def _remember_title(self, title: str) -> None:
+        if title and title not in self._exact_titles:
+            self._exact_titles.add(title)
+            self.titles.append(title)
+
+
+def dedupe_records(records: List[GreyRecord], cfg: Dict[str, Any]) -> List[GreyRecord]:
+    deduper = IncrementalDeduper(cfg)
+    return [record for record in records if deduper.accept(record)]
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import csv
+import json
+import pathlib
+from typing import Any, List
+
+from grey_search.sources.record import GreyRecord
+
+# Same columns as scripts/transform/ris_to_csv.py so scripts/dedupe/merge_and_dedupe.py
+# can read data/normalized/grey-literature.csv like any other normalized source.
+# "url" is appended because seed-site and web hits have no other identifier.
+CSV_FIELDS = [
+    "source_database",
+    "source_file",
+    "record_type",
+    "title",
+    "abstract",
+    "journal",
+    "year",
+    "authors",
+    "doi",
+    "pmid",
+    "accession_number",
+    "query_id",
+    "url",
+]
+
+
+def _flat(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return "; ".join(_flat(v) for v in value if v is not None)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return str(value).strip()
+
+
+def raw_file_name(record: GreyRecord) -> str:
+    source = record.source or "grey_search"
+    return f"{source}_{record.query_id}.jsonl" if record.query_id else f"{source}.jsonl"
+
+
+def normalized_row(record: GreyRecord) -> List[str]:
+    values = {
+        "source_database": record.source or "grey_search",
+        "source_file": raw_file_name(record),
+        "record_type": record.type,
+        "title": record.title,
+        "abstract": record.abstract,
+        "journal": record.venue,
+        "year": record.year,
+        "authors": "",
+        "doi": record.doi,
+        "pmid": record.pmid,
+        "accession_number": record.nct_id or record.id,
+        "query_id": record.query_id,
+        "url": record.url,
+    }
+    return [_flat(values[name]) for name in CSV_FIELDS]
+
+
+class NormalizedCsvWriter:
+    """Streams GreyRecords to the normalized CSV one row at a time."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._f = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._f)
+        self._writer.writerow(CSV_FIELDS)
+
+    def write(self, record: GreyRecord) -> None:
+        self._writer.writerow(normalized_row(record))
+
+    def flush(self) -> None:
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
@@ -1,9 +1,25 @@
 from __future__ import annotations
 
+import argparse
+import cProfile
 import datetime
 import json
+import os
 import pathlib
-from typing import Dict, Any
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is reported as None
+    resource = None
+
+DEFAULT_METRICS_JSONL = pathlib.Path(__file__).resolve().parents[2] / "logs" / "metrics.jsonl"
+DEFAULT_PROFILE_DIR = pathlib.Path(__file__).resolve().parents[2] / "logs" / "profiles"
 
 
 def now_iso() -> str:
@@ -14,3 +30,155 @@ def log_event(path: pathlib.Path, event: Dict[str, Any]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     with open(path, "a", encoding="utf-8") as f:
         f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size now (Linux /proc only); None where unavailable."""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1048576, 1)
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Process peak RSS so far; None on platforms without the resource module (Windows)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return round(peak / (1048576 if sys.platform == "darwin" else 1024), 1)
+
+
+class RunMetrics:
+    """
+    Lightweight per-run instrumentation: `span()` timers (wall/CPU seconds and
+    RSS at exit), counters and peak RSS. Every closed span is appended to a
+    metrics JSONL as it happens, and `close()` appends a run summary and returns
+    human-readable lines. With `profile_dir`, spans opened with `profile=True`
+    run under cProfile and are dumped as .prof files (pstats format, readable by
+    snakeviz/gprof2dot). Nested spans are named "outer/inner". Thread-safe.
+    """
+
+    def __init__(self, run_name: str, jsonl_path: Optional[pathlib.Path] = None, profile_dir: Optional[pathlib.Path] = None):
+        self.run_name = run_name
+        self.run_id = f"{run_name}-{datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.jsonl_path = jsonl_path
+        self.profile_dir = profile_dir
+        self.started_at = now_iso()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._spans: Dict[str, Dict[str, float]] = {}
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._profiles: List[str] = []
+        self._profiling = False
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        if self.jsonl_path is not None:
+            log_event(self.jsonl_path, {"run_id": self.run_id, "run": self.run_name, **event})
+
+    @contextmanager
+    def span(self, name: str, profile: bool = False) -> Iterator[None]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        full_name = "/".join([*stack, name])
+        stack.append(name)
+        profiler = None
+        if profile and self.profile_dir is not None:
+            with self._lock:
+                # Only one cProfile profiler can be active at a time.
+                if not self._profiling:
+                    self._profiling = True
+                    profiler = cProfile.Profile()
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+            wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+            stack.pop()
+            event = {
+                "kind": "span",
+                "span": full_name,
+                "wall_s": round(wall, 4),
+                "cpu_s": round(cpu, 4),
+                "rss_mb": current_rss_mb(),
+                "ts": now_iso(),
+            }
+            if profiler is not None:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                prof_path = self.profile_dir / f"{self.run_id}_{full_name.replace('/', '.')}.prof"
+                profiler.dump_stats(str(prof_path))
+                event["profile"] = str(prof_path)
+            with self._lock:
+                agg = self._spans.setdefault(full_name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_wall_s": 0.0})
+                agg["calls"] += 1
+                agg["wall_s"] += wall
+                agg["cpu_s"] += cpu
+                agg["max_wall_s"] = max(agg["max_wall_s"], wall)
+                if profiler is not None:
+                    self._profiles.append(event["profile"])
+                self._emit(event)
+
+    def count(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "run": self.run_name,
+                "started_at": self.started_at,
+                "wall_s": round(time.perf_counter() - self._t0, 3),
+                "peak_rss_mb": peak_rss_mb(),
+                "spans": {
+                    name: {k: round(v, 4) if isinstance(v, float) else v for k, v in agg.items()}
+                    for name, agg in self._spans.items()
+                },
+                "counters": {k: int(v) if float(v).is_integer() else v for k, v in sorted(self._counters.items())},
+                "profiles": list(self._profiles),
+            }
+
+    def close(self) -> List[str]:
+        """Append the run summary to the metrics JSONL and return it as printable lines."""
+        summary = self.summary()
+        self._emit({"kind": "run_summary", **summary})
+        peak = summary["peak_rss_mb"]
+        lines = [f"[{self.run_name}] {summary['wall_s']:.1f}s total" + (f", peak RSS {peak:.0f} MB" if peak is not None else "")]
+        for name, agg in summary["spans"].items():
+            calls = f" x{agg['calls']}" if agg["calls"] > 1 else ""
+            lines.append(f"  {name:<32} {agg['wall_s']:>9.2f}s wall {agg['cpu_s']:>9.2f}s cpu{calls}")
+        if summary["counters"]:
+            lines.append("  " + ", ".join(f"{k}={v}" for k, v in summary["counters"].items()))
+        for path in summary["profiles"]:
+            lines.append(f"  profile: {path}")
+        return lines
+
+
+def add_metrics_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--metrics-jsonl",
+        default=str(DEFAULT_METRICS_JSONL),
+        help="Append per-stage timings/counters for this run to this JSONL ('' to disable).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Run the hot stages under cProfile and write .prof files to logs/profiles/.",
+    )
+
+
+def metrics_from_args(run_name: str, args: argparse.Namespace) -> RunMetrics:
+    return RunMetrics(
+        run_name,
+        jsonl_path=pathlib.Path(args.metrics_jsonl) if args.metrics_jsonl else None,
+        profile_dir=DEFAULT_PROFILE_DIR if args.profile else None,
+    )
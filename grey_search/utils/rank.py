@@ -1,32 +1,103 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+import re
+from dataclasses import dataclass
+from typing import Dict, Any, Iterable, List, Sequence, Tuple
 
-from grey_search.utils.text import openalex_abstract_to_text
+from grey_search.sources.record import GreyRecord
 
 
-def _text_blob(record: Dict[str, Any]) -> str:
-    title = record.get("title") or ""
-    abstract = record.get("abstract") or record.get("snippet") or ""
-    if isinstance(abstract, dict):
-        abstract = openalex_abstract_to_text(abstract)
-    return f"{title} {abstract}".lower()
+@dataclass(frozen=True)
+class ScoreResult:
+    score: int
+    include_hits: Tuple[str, ...]
+    exclude_hits: Tuple[str, ...]
 
+    @property
+    def matched_terms(self) -> List[str]:
+        return [*self.include_hits, *(f"-{t}" for t in self.exclude_hits)]
 
-def score_record(record: Dict[str, Any], cfg: Dict[str, Any]) -> int:
-    blob = _text_blob(record)
-    include_terms = cfg["ranking"]["include_terms"]
-    exclude_terms = cfg["ranking"]["exclude_terms"]
 
-    score = 0
-    for term in include_terms:
-        if term.lower() in blob:
-            score += 1
-    for term in exclude_terms:
-        if term.lower() in blob:
-            score -= 2
-    return score
+def _text_blob(record: GreyRecord) -> str:
+    return f"{record.title or ''} {record.abstract or ''}".lower()
 
 
-def looks_relevant(record: Dict[str, Any], cfg: Dict[str, Any]) -> bool:
-    return score_record(record, cfg) >= cfg["ranking"]["min_score_to_keep"]
+class RelevanceScorer:
+    """
+    Scores records against include/exclude terms with compiled regexes.
+    Each term counts at most once per record (+1 include, -2 exclude) and must
+    match on word boundaries; a trailing plural "s"/"es" is tolerated so
+    "survivor" still matches "survivors" while "rat" no longer matches "rate".
+
+    A lookahead reports one term per offset, so terms are split into layers in
+    which no term is a prefix of another ("quality" and "quality of life" land
+    in different layers) and each layer gets its own regex. Configs without such
+    pairs still compile to a single regex.
+    """
+
+    def __init__(self, include_terms: Sequence[str], exclude_terms: Sequence[str], min_score: int) -> None:
+        self.min_score = min_score
+        self._weights: Dict[str, int] = {}
+        self._include: List[str] = []
+        self._exclude: List[str] = []
+        for term in include_terms:
+            key = term.lower()
+            if key and key not in self._weights:
+                self._weights[key] = 1
+                self._include.append(key)
+        for term in exclude_terms:
+            key = term.lower()
+            if key and key not in self._weights:
+                self._weights[key] = -2
+                self._exclude.append(key)
+
+        # Layer = length of the longest chain of prefixes below a term, so prefix pairs never share a layer.
+        layers: Dict[str, int] = {}
+        for term in sorted(self._weights, key=len):
+            layers[term] = 1 + max((layers[p] for p in layers if term.startswith(p)), default=-1)
+        self._group_terms: Dict[str, str] = {}
+        self._patterns: List[re.Pattern] = []
+        for layer in range(max(layers.values(), default=-1) + 1):
+            groups = []
+            for term in (t for t in self._weights if layers[t] == layer):
+                name = f"t{len(self._group_terms)}"
+                self._group_terms[name] = term
+                groups.append(f"(?P<{name}>{re.escape(term)})")
+            # Zero-width lookahead so overlapping terms starting at different offsets are all reported.
+            self._patterns.append(re.compile(rf"(?<!\w)(?=(?:{'|'.join(groups)})(?:e?s)?(?!\w))"))
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "RelevanceScorer":
+        ranking = cfg["ranking"]
+        return cls(
+            include_terms=ranking.get("include_terms") or [],
+            exclude_terms=ranking.get("exclude_terms") or [],
+            min_score=int(ranking["min_score_to_keep"]),
+        )
+
+    def score(self, record: GreyRecord) -> ScoreResult:
+        hits = set()
+        blob = _text_blob(record)
+        for pattern in self._patterns:
+            for match in pattern.finditer(blob):
+                hits.add(self._group_terms[match.lastgroup])
+        include_hits = tuple(t for t in self._include if t in hits)
+        exclude_hits = tuple(t for t in self._exclude if t in hits)
+        return ScoreResult(
+            score=len(include_hits) - 2 * len(exclude_hits),
+            include_hits=include_hits,
+            exclude_hits=exclude_hits,
+        )
+
+    def score_many(self, records: Iterable[GreyRecord]) -> List[ScoreResult]:
+        return [self.score(r) for r in records]
+
+    def looks_relevant(self, record: GreyRecord) -> bool:
+        return self.score(record).score >= self.min_score
+
+    def annotate(self, record: GreyRecord) -> ScoreResult:
+        result = self.score(record)
+        record.relevance_score = result.score
+        record.looks_relevant = result.score >= self.min_score
+        record.matched_terms = result.matched_terms
+        return result
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import json
+import math
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 12
+KMEANS_TRAIN_PER_LIST = 64
+# Below this many vectors a single list (exact search) is both faster and exact.
+MIN_VECTORS_FOR_IVF = 2048
+ASSIGN_BLOCK_SIZE = 8192
+
+
+def ann_dir_for(index_dir: Path, embedding_model: str) -> Path:
+    return index_dir / f"ann_{embedding_model}"
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_SIZE):
+        block = vectors[start : start + ASSIGN_BLOCK_SIZE]
+        labels[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors: np.ndarray, nlist: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Cosine k-means on a sample of unit vectors; returns unit-norm centroids (nlist x dim)."""
+    rng = np.random.default_rng(seed)
+    n_train = min(len(vectors), nlist * KMEANS_TRAIN_PER_LIST)
+    train = vectors[rng.choice(len(vectors), size=n_train, replace=False)]
+    centroids = train[rng.choice(n_train, size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, train)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists with random training points so every list stays in use.
+            sums[empty] = train[rng.choice(n_train, size=int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+def jsonl_line_offsets(path: Path, key: str) -> dict[str, int]:
+    """Byte offset of every line in a JSONL file, keyed by one of its fields."""
+    offsets: dict[str, int] = {}
+    with path.open("rb") as f:
+        pos = f.tell()
+        for line in iter(f.readline, b""):
+            if line.strip():
+                offsets[json.loads(line)[key]] = pos
+            pos = f.tell()
+    return offsets
+
+
+def read_jsonl_at(f, offset: int) -> dict:
+    f.seek(offset)
+    return json.loads(f.readline())
+
+
+class IvfIndex:
+    """
+    Pure-NumPy inverted-file index for cosine similarity over unit-normalised
+    embeddings. Vectors are stored grouped by their nearest centroid, so a query
+    scores the centroids, then only the `nprobe` closest lists. Saved as .npy
+    files (vectors are memory-mapped on load) plus the chunk ids in list order.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        vectors: np.ndarray,
+        chunk_ids: list[str],
+        meta: dict,
+        chunk_offsets: np.ndarray | None = None,
+    ):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.vectors = vectors
+        self.chunk_ids = chunk_ids
+        self.meta = meta
+        # Byte offset of each chunk's line in chunks.jsonl (index order), for direct lookups.
+        self.chunk_offsets = chunk_offsets
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, chunk_ids: list[str], vectors: list[list[float]], embedding_model: str, nlist: int = 0) -> "IvfIndex":
+        matrix = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        n = len(matrix)
+        if n == 0:
+            raise ValueError("cannot build an ANN index without vectors")
+        if nlist <= 0:
+            nlist = 1 if n < MIN_VECTORS_FOR_IVF else int(4 * math.sqrt(n))
+        nlist = max(1, min(nlist, n))
+        if nlist == 1:
+            centroids = normalize_rows(matrix.mean(axis=0, keepdims=True)).astype(np.float32)
+            labels = np.zeros(n, dtype=np.int32)
+        else:
+            centroids = spherical_kmeans(matrix, nlist)
+            labels = _assign(matrix, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        meta = {
+            "embedding_model": embedding_model,
+            "vector_count": n,
+            "dim": int(matrix.shape[1]),
+            "nlist": nlist,
+            "built_at_utc": datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+        }
+        return cls(centroids, list_offsets, matrix[order], [chunk_ids[i] for i in order], meta)
+
+    def attach_chunk_offsets(self, line_offsets: dict[str, int]) -> None:
+        self.chunk_offsets = np.asarray([line_offsets.get(cid, -1) for cid in self.chunk_ids], dtype=np.int64)
+
+    def save(self, ann_dir: Path) -> None:
+        ann_dir.mkdir(parents=True, exist_ok=True)
+        if self.chunk_offsets is not None:
+            np.save(ann_dir / "chunk_offsets.npy", self.chunk_offsets)
+        np.save(ann_dir / "centroids.npy", self.centroids)
+        np.save(ann_dir / "list_offsets.npy", self.list_offsets)
+        np.save(ann_dir / "vectors.npy", self.vectors)
+        (ann_dir / "chunk_ids.json").write_text(json.dumps(self.chunk_ids), encoding="utf-8")
+        (ann_dir / "meta.json").write_text(json.dumps(self.meta, indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, ann_dir: Path) -> "IvfIndex":
+        if not (ann_dir / "meta.json").exists():
+            raise FileNotFoundError(f"Missing ANN index: {ann_dir}. Run scripts/build_index.py first.")
+        return cls(
+            centroids=np.load(ann_dir / "centroids.npy"),
+            list_offsets=np.load(ann_dir / "list_offsets.npy"),
+            vectors=np.load(ann_dir / "vectors.npy", mmap_mode="r"),
+            chunk_ids=json.loads((ann_dir / "chunk_ids.json").read_text(encoding="utf-8")),
+            meta=json.loads((ann_dir / "meta.json").read_text(encoding="utf-8")),
+            chunk_offsets=np.load(ann_dir / "chunk_offsets.npy") if (ann_dir / "chunk_offsets.npy").exists() else None,
+        )
+
+    def search(self, query: list[float], k: int, nprobe: int = DEFAULT_NPROBE) -> list[tuple[str, float]]:
+        """Top-k (chunk_id, cosine score) pairs, best first."""
+        return [(self.chunk_ids[pos], score) for pos, score in self.search_positions(query, k, nprobe)]
+
+    def search_positions(self, query: list[float], k: int, nprobe: int = DEFAULT_NPROBE) -> list[tuple[int, float]]:
+        """Like search, but returns positions in index order (see chunk_ids / chunk_offsets)."""
+        q = np.asarray(query, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        nprobe = max(1, min(nprobe, self.nlist))
+        probe = np.argsort(self.centroids @ q)[::-1][:nprobe]
+        spans = [(int(self.list_offsets[i]), int(self.list_offsets[i + 1])) for i in sorted(probe)]
+        positions = np.concatenate([np.arange(start, end) for start, end in spans]) if spans else np.array([], dtype=np.int64)
+        if len(positions) == 0:
+            return []
+        scores = np.asarray(self.vectors[positions]) @ q
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(positions[i]), float(scores[i])) for i in top]
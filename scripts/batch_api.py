@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+from shared import jsonl_read, jsonl_write
+
+EMBEDDINGS_ENDPOINT = "/v1/embeddings"
+RESPONSES_ENDPOINT = "/v1/responses"
+COMPLETION_WINDOW = "24h"
+# Batch API input limits are 50,000 requests and 200 MB per file; stay under both.
+MAX_REQUESTS_PER_BATCH = 50_000
+MAX_BATCH_FILE_BYTES = 190 * 1024 * 1024
+DEFAULT_POLL_SECONDS = 30
+TERMINAL_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+# A rerun submits the requests these jobs left without a result again.
+RESUBMIT_STATUSES = frozenset({"failed", "expired", "cancelled"})
+STUB_EMBEDDING_DIM = 64
+
+
+def batch_dir_for(base_dir: Path) -> Path:
+    return base_dir / "batches"
+
+
+def add_batch_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--batch-mode",
+        action="store_true",
+        help="Submit the API calls through the OpenAI Batch API (half price, results within 24h) and wait for them.",
+    )
+    parser.add_argument(
+        "--batch-stub",
+        action="store_true",
+        help="Batch mode against a local offline stub (deterministic fake vectors/payloads, no API key or network).",
+    )
+    parser.add_argument(
+        "--batch-poll-seconds",
+        type=float,
+        default=None,
+        help=f"Seconds between batch status checks (default {DEFAULT_POLL_SECONDS}; 0 with --batch-stub).",
+    )
+
+
+def request_line(custom_id: str, endpoint: str, body: dict) -> dict:
+    return {"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body}
+
+
+def split_requests(lines: list[dict]) -> list[list[dict]]:
+    """Consecutive groups of request lines that each fit in one batch input file."""
+    parts: list[list[dict]] = [[]]
+    size = 0
+    for line in lines:
+        line_bytes = len(json.dumps(line, ensure_ascii=True)) + 1
+        if parts[-1] and (len(parts[-1]) >= MAX_REQUESTS_PER_BATCH or size + line_bytes > MAX_BATCH_FILE_BYTES):
+            parts.append([])
+            size = 0
+        parts[-1].append(line)
+        size += line_bytes
+    return parts if parts[0] else []
+
+
+def file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def output_text_of(body: dict) -> str:
+    """Concatenated output_text parts of a Responses API result body (the JSON form of resp.output_text)."""
+    parts: list[str] = []
+    for item in body.get("output") or []:
+        if item.get("type") != "message":
+            continue
+        for content in item.get("content") or []:
+            if content.get("type") == "output_text":
+                parts.append(content.get("text", ""))
+    return "".join(parts)
+
+
+def _read_results(batch_dir: Path, input_name: str, results: dict[str, dict]) -> None:
+    """Merge one job's downloaded output/error files into custom_id -> {"body"} / {"error"}."""
+    for suffix in ("output", "errors"):
+        result_path = batch_dir / input_name.replace("_input.jsonl", f"_{suffix}.jsonl")
+        for row in jsonl_read(result_path):
+            response = row.get("response") or {}
+            if row.get("error") or response.get("status_code") != 200:
+                error = row.get("error") or (response.get("body") or {}).get("error") or response
+                results[row["custom_id"]] = {"error": json.dumps(error, ensure_ascii=True)[:500]}
+            else:
+                results[row["custom_id"]] = {"body": response["body"]}
+
+
+def run_batch(
+    client: Any,
+    batch_dir: Path,
+    name: str,
+    endpoint: str,
+    requests: list[tuple[str, dict]],
+    poll_seconds: float | None = None,
+) -> dict[str, dict]:
+    """
+    Write (custom_id, body) requests to `<name>_NNN_input.jsonl` files, submit each
+    as a batch job, poll until every job ends and return custom_id -> {"body": ...}
+    or {"error": ...}. Submitted jobs are kept in `<name>_state.json`: a rerun with
+    the same input resumes polling (or reuses finished results) instead of paying
+    twice, and after a job expired, failed or was cancelled it resubmits only the
+    requests that got no result (as `<name>_NNN_retryK_input.jsonl`). Without
+    `poll_seconds`, the local stub is polled without waiting.
+    """
+    if poll_seconds is None:
+        poll_seconds = 0.0 if isinstance(client, StubBatchClient) else DEFAULT_POLL_SECONDS
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    state_path = batch_dir / f"{name}_state.json"
+    state = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+    lines = [request_line(custom_id, endpoint, body) for custom_id, body in requests]
+
+    def save_state() -> None:
+        state_path.write_text(json.dumps(state, indent=2), encoding="utf-8")
+
+    results: dict[str, dict] = {}
+    parts: list[tuple[dict, list[str]]] = []
+    for part_idx, part in enumerate(split_requests(lines)):
+        input_path = batch_dir / f"{name}_{part_idx:03d}_input.jsonl"
+        jsonl_write(input_path, part)
+        digest = file_sha256(input_path)
+        entry = state.get(input_path.name)
+        if not entry or entry.get("sha256") != digest:
+            entry = state[input_path.name] = {"sha256": digest, "jobs": []}
+        for job in entry["jobs"]:
+            if job["status"] in TERMINAL_STATUSES:
+                _read_results(batch_dir, job["input_name"], results)
+
+        last = entry["jobs"][-1] if entry["jobs"] else None
+        if last is not None and last["status"] not in RESUBMIT_STATUSES:
+            print(f"Resuming batch {last['batch_id']} ({last['input_name']}, status {last['status']})")
+        else:
+            pending = [line for line in part if line["custom_id"] not in results]
+            if pending:
+                job_path = input_path
+                if last is not None:
+                    job_path = batch_dir / f"{name}_{part_idx:03d}_retry{len(entry['jobs'])}_input.jsonl"
+                    jsonl_write(job_path, pending)
+                    print(f"Batch {last['batch_id']} ended {last['status']}; resubmitting {len(pending)} request(s) without a result")
+                with job_path.open("rb") as f:
+                    uploaded = client.files.create(file=f, purpose="batch")
+                batch = client.batches.create(
+                    input_file_id=uploaded.id,
+                    endpoint=endpoint,
+                    completion_window=COMPLETION_WINDOW,
+                    metadata={"name": name, "part": str(part_idx)},
+                )
+                entry["jobs"].append(
+                    {"input_name": job_path.name, "input_file_id": uploaded.id, "batch_id": batch.id, "status": batch.status}
+                )
+                save_state()
+                print(f"Submitted batch {batch.id} ({len(pending)} request(s), {job_path.name})")
+        parts.append((entry, [line["custom_id"] for line in part]))
+
+    for entry, custom_ids in parts:
+        job = entry["jobs"][-1] if entry["jobs"] else None
+        if job is None or job["status"] in TERMINAL_STATUSES:
+            # Finished on an earlier run: its results were read above.
+            reason = f"batch {job['batch_id']} {job['status']}" if job else "not submitted"
+            for custom_id in custom_ids:
+                results.setdefault(custom_id, {"error": f"no result ({reason})"})
+            continue
+        batch = client.batches.retrieve(job["batch_id"])
+        while batch.status not in TERMINAL_STATUSES:
+            counts = getattr(batch, "request_counts", None)
+            done = f" {counts.completed}/{counts.total}" if counts is not None else ""
+            print(f"Batch {batch.id}: {batch.status}{done}; next check in {poll_seconds:g}s")
+            time.sleep(poll_seconds)
+            batch = client.batches.retrieve(job["batch_id"])
+
+        # Expired/cancelled jobs still return whatever finished; the rest is reported as missing
+        # (and resubmitted by the next run).
+        for file_id, suffix in ((batch.output_file_id, "output"), (getattr(batch, "error_file_id", None), "errors")):
+            if file_id:
+                result_path = batch_dir / job["input_name"].replace("_input.jsonl", f"_{suffix}.jsonl")
+                result_path.write_text(client.files.content(file_id).text, encoding="utf-8")
+        job["status"] = batch.status
+        save_state()
+        _read_results(batch_dir, job["input_name"], results)
+        for custom_id in custom_ids:
+            results.setdefault(custom_id, {"error": f"no result (batch {batch.id} {batch.status})"})
+    return results
+
+
+def stub_vector(text: str, dim: int = STUB_EMBEDDING_DIM) -> list[float]:
+    """Deterministic unit vector from the text's hash, so stub runs are repeatable."""
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    raw = [(seed[i % len(seed)] * (i + 1) % 251) / 125.0 - 1.0 for i in range(dim)]
+    norm = math.sqrt(sum(x * x for x in raw)) or 1.0
+    return [x / norm for x in raw]
+
+
+def stub_instance(schema: dict, defs: dict | None = None) -> Any:
+    """Smallest value that satisfies a (strict) JSON schema: first enum value, empty arrays, null where allowed."""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return stub_instance(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+    options = schema.get("anyOf")
+    if options:
+        if any(option.get("type") == "null" for option in options):
+            return None
+        return stub_instance(options[0], defs)
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        if "null" in kind:
+            return None
+        kind = kind[0]
+    if kind == "object":
+        return {key: stub_instance(prop, defs) for key, prop in (schema.get("properties") or {}).items()}
+    if kind == "array":
+        return []
+    if kind in ("number", "integer"):
+        return max(1, schema.get("minimum", 1))
+    if kind == "boolean":
+        return False
+    return "stub"
+
+
+def _stub_tokens(value: Any) -> int:
+    return max(1, len(json.dumps(value)) // 4)
+
+
+class _StubEmbeddings:
+    def create(self, model: str, input: list[str]):
+        data = [SimpleNamespace(index=i, embedding=stub_vector(text)) for i, text in enumerate(input)]
+        tokens = sum(_stub_tokens(text) for text in input)
+        return SimpleNamespace(data=data, model=model, usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+
+class _StubFiles:
+    def __init__(self, root: Path):
+        self.root = root
+
+    def create(self, file, purpose: str):
+        file_id = f"file-stub-{uuid.uuid4().hex[:12]}"
+        (self.root / f"{file_id}.jsonl").write_bytes(file.read())
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def content(self, file_id: str):
+        return SimpleNamespace(text=(self.root / f"{file_id}.jsonl").read_text(encoding="utf-8"))
+
+
+class _StubBatches:
+    def __init__(self, root: Path, files: _StubFiles):
+        self.root = root
+        self.files = files
+
+    def _path(self, batch_id: str) -> Path:
+        return self.root / f"{batch_id}.json"
+
+    def _view(self, job: dict):
+        return SimpleNamespace(
+            **{k: v for k, v in job.items() if k != "request_counts"},
+            request_counts=SimpleNamespace(**job["request_counts"]),
+        )
+
+    def create(self, input_file_id: str, endpoint: str, completion_window: str, metadata: dict | None = None):
+        total = sum(1 for _ in jsonl_read(self.root / f"{input_file_id}.jsonl"))
+        job = {
+            "id": f"batch-stub-{uuid.uuid4().hex[:12]}",
+            "status": "validating",
+            "endpoint": endpoint,
+            "input_file_id": input_file_id,
+            "output_file_id": None,
+            "error_file_id": None,
+            "metadata": metadata or {},
+            "request_counts": {"total": total, "completed": 0, "failed": 0},
+        }
+        self._path(job["id"]).write_text(json.dumps(job), encoding="utf-8")
+        return self._view(job)
+
+    def retrieve(self, batch_id: str):
+        # validating -> in_progress -> completed, one step per poll, so callers exercise their wait loop.
+        job = json.loads(self._path(batch_id).read_text(encoding="utf-8"))
+        if job["status"] == "validating":
+            job["status"] = "in_progress"
+        elif job["status"] == "in_progress":
+            rows = [self._answer(line) for line in jsonl_read(self.root / f"{job['input_file_id']}.jsonl")]
+            output_file_id = f"file-stub-{uuid.uuid4().hex[:12]}"
+            jsonl_write(self.root / f"{output_file_id}.jsonl", rows)
+            job.update(status="completed", output_file_id=output_file_id)
+            job["request_counts"]["completed"] = len(rows)
+        self._path(batch_id).write_text(json.dumps(job), encoding="utf-8")
+        return self._view(job)
+
+    def _answer(self, line: dict) -> dict:
+        body = line["body"]
+        if line["url"] == EMBEDDINGS_ENDPOINT:
+            tokens = sum(_stub_tokens(text) for text in body["input"])
+            result = {
+                "object": "list",
+                "model": body["model"],
+                "data": [{"object": "embedding", "index": i, "embedding": stub_vector(t)} for i, t in enumerate(body["input"])],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        elif line["url"] == RESPONSES_ENDPOINT:
+            text = json.dumps(stub_instance(body["text"]["format"]["schema"]))
+            result = {
+                "object": "response",
+                "model": body["model"],
+                "status": "completed",
+                "output": [{"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": text}]}],
+                "usage": {
+                    "input_tokens": _stub_tokens(body["input"]),
+                    "input_tokens_details": {"cached_tokens": 0},
+                    "output_tokens": _stub_tokens(text),
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                },
+            }
+        else:
+            return {"custom_id": line["custom_id"], "response": None, "error": {"message": f"unsupported url {line['url']}"}}
+        return {
+            "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+            "custom_id": line["custom_id"],
+            "response": {"status_code": 200, "request_id": "stub", "body": result},
+            "error": None,
+        }
+
+
+class StubBatchClient:
+    """
+    Offline stand-in for the parts of the OpenAI client the batch path uses
+    (files, batches and synchronous embeddings). Files and job state live under
+    `root`, so an interrupted stub run resumes like a real one.
+    """
+
+    def __init__(self, root: Path):
+        root.mkdir(parents=True, exist_ok=True)
+        self.files = _StubFiles(root)
+        self.batches = _StubBatches(root, self.files)
+        self.embeddings = _StubEmbeddings()
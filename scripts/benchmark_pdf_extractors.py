@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+from collections import Counter
+from pathlib import Path
+
+from rapidfuzz import fuzz
+
+from build_index import find_pdfs
+from pdf_extractors import EXTRACTORS
+from shared import load_pipeline_config
+
+REFERENCE_BACKEND = "pdfplumber"
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_ws(text: str) -> str:
+    return " ".join(text.split())
+
+
+def word_recall(reference: str, candidate: str) -> float:
+    """Share of the reference's word tokens (with multiplicity) that the candidate also has."""
+    ref = Counter(_WORD_RE.findall(reference.lower()))
+    if not ref:
+        return 1.0
+    cand = Counter(_WORD_RE.findall(candidate.lower()))
+    return sum((ref & cand).values()) / sum(ref.values())
+
+
+def time_backend(backend: str, pdfs: list[tuple[str, Path]]) -> tuple[dict[str, list[str]], float]:
+    texts: dict[str, list[str]] = {}
+    started = time.perf_counter()
+    for paper_id, path in pdfs:
+        try:
+            texts[paper_id] = EXTRACTORS[backend](path)
+        except Exception as exc:  # one broken PDF should not end the benchmark
+            print(f"  {backend}: {paper_id} failed ({type(exc).__name__}: {exc})")
+            texts[paper_id] = []
+    return texts, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare PDF text backends: pages/sec and text parity against pdfplumber.")
+    parser.add_argument("--config", default="pipeline_config.yaml", help="Pipeline config YAML path.")
+    parser.add_argument("--pdf-dir", default=None, help="Folder containing PDFs (default: paths.pdf_dir).")
+    parser.add_argument("--backends", nargs="+", choices=sorted(EXTRACTORS), default=sorted(EXTRACTORS))
+    parser.add_argument("--limit", type=int, default=None, help="Optional max number of PDFs.")
+    parser.add_argument("--json-out", default=None, help="Optional path for the results as JSON.")
+    args = parser.parse_args()
+
+    cfg = load_pipeline_config(args.config)
+    pdf_dir = Path(args.pdf_dir or cfg.get("paths", {}).get("pdf_dir", "data/pdfs/calibration-set/caresearchhub"))
+    if not pdf_dir.exists():
+        raise FileNotFoundError(f"PDF directory not found: {pdf_dir}")
+    pdfs = find_pdfs(pdf_dir)
+    if args.limit:
+        pdfs = pdfs[: args.limit]
+    if not pdfs:
+        raise RuntimeError(f"No PDFs found in {pdf_dir}")
+
+    backends = [REFERENCE_BACKEND] + [b for b in args.backends if b != REFERENCE_BACKEND]
+    reference: dict[str, list[str]] = {}
+    results: list[dict] = []
+    for backend in backends:
+        texts, seconds = time_backend(backend, pdfs)
+        if backend == REFERENCE_BACKEND:
+            reference = texts
+        pages = ratios = recalls = empty = mismatched = 0.0
+        for paper_id, ref_pages in reference.items():
+            cand_pages = texts.get(paper_id, [])
+            if len(cand_pages) != len(ref_pages):
+                mismatched += 1
+            for ref, cand in zip(ref_pages, cand_pages):
+                pages += 1
+                empty += 0 if cand.strip() else 1
+                ratios += fuzz.ratio(normalize_ws(ref), normalize_ws(cand)) / 100.0
+                recalls += word_recall(ref, cand)
+        results.append(
+            {
+                "backend": backend,
+                "pdfs": len(pdfs),
+                "pages": int(pages),
+                "seconds": round(seconds, 2),
+                "pages_per_sec": round(pages / seconds, 1) if seconds else 0.0,
+                "speedup_vs_reference": None,
+                "mean_char_similarity": round(ratios / pages, 4) if pages else 0.0,
+                "mean_word_recall": round(recalls / pages, 4) if pages else 0.0,
+                "empty_pages": int(empty),
+                "page_count_mismatches": int(mismatched),
+            }
+        )
+    ref_rate = results[0]["pages_per_sec"]
+    for row in results:
+        row["speedup_vs_reference"] = round(row["pages_per_sec"] / ref_rate, 1) if ref_rate else None
+
+    print(f"{len(pdfs)} PDF(s) from {pdf_dir.as_posix()}; parity is measured against {REFERENCE_BACKEND}.")
+    print(f"{'backend':<12} {'pages/s':>9} {'speedup':>8} {'char sim':>9} {'word recall':>12} {'empty':>6}")
+    for row in results:
+        print(
+            f"{row['backend']:<12} {row['pages_per_sec']:>9.1f} {row['speedup_vs_reference']:>7}x "
+            f"{row['mean_char_similarity']:>9.3f} {row['mean_word_recall']:>12.3f} {row['empty_pages']:>6}"
+        )
+    if args.json_out:
+        out_path = Path(args.json_out)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Wrote {out_path.as_posix()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,54 @@ import argparse
 import hashlib
 import json
 import math
-from dataclasses import dataclass
+import re
+import time
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Iterable, Iterator
 
-import pdfplumber
 from openai import OpenAI
 
-from shared import build_openai_client, call_with_retries, jsonl_read, jsonl_write, load_pipeline_config
+try:
+    import tiktoken
+except ImportError:  # optional: token counts fall back to a chars-per-token estimate
+    tiktoken = None
+
+from ann_index import IvfIndex, ann_dir_for, jsonl_line_offsets
+from batch_api import EMBEDDINGS_ENDPOINT, StubBatchClient, add_batch_args, batch_dir_for, run_batch
+from chunk_dedupe import NearDuplicateIndex, looks_like_references, strip_boilerplate
+from lexical_index import LexicalIndex, lexical_dir_for
+from pdf_extractors import DEFAULT_BACKEND, DEFAULT_FALLBACK, EXTRACTORS, extract_page_texts
+from pdf_store import PdfStore, file_sha256
+from text_store import PaperText, TextStoreWriter, text_store_dir_for
+from usage_ledger import UsageLedger, load_pricing
+from shared import (
+    PAGE_SEPARATOR,
+    add_metrics_args,
+    build_openai_client,
+    call_with_retries,
+    jsonl_read,
+    jsonl_write,
+    load_pipeline_config,
+    metrics_from_args,
+)
 
 EMBEDDING_MODEL = "text-embedding-3-small"
 CHUNK_SIZE_CHARS = 2000
 CHUNK_OVERLAP_CHARS = 200
+CHUNKERS = ("sentences", "chars")
+DEFAULT_CHUNKER = "sentences"
+CHUNK_MAX_TOKENS = 512
+CHUNK_OVERLAP_TOKENS = 64
+# Rough OpenAI average, used only when tiktoken is not installed.
+CHARS_PER_TOKEN = 4
+
+# A sentence ends at . ! ? (plus closing quotes/brackets) before whitespace and a capital/digit;
+# blank lines (paragraphs, including PAGE_SEPARATOR) always end one.
+_SENTENCE_BREAK_RE = re.compile(r"[.!?][\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])|\n[^\S\n]*(?:\f[^\S\n]*)?\n\s*")
 EMBEDDING_BATCH_SIZE = 32
 
 @dataclass(frozen=True)
@@ -25,11 +60,15 @@ class ChunkRecord:
     paper_id: str
     source_path: str
     page: int
+    page_end: int
     chunk_index_on_page: int
     char_start: int
     char_end: int
     text: str
     content_hash: str
+    # Earlier chunk with (near-)identical text; this one reuses its embedding instead of being embedded.
+    duplicate_of: str | None = None
+    is_references: bool = False
 
 
 def utc_now_iso() -> str:
@@ -40,23 +79,49 @@ def stable_hash(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
-def find_pdfs(pdf_dir: Path) -> list[Path]:
-    return sorted([p for p in pdf_dir.rglob("*.pdf") if p.is_file()])
-
-
-def extract_pages(pdf_path: Path) -> list[dict]:
+def find_pdfs(pdf_dir: Path) -> list[tuple[str, Path]]:
+    """
+    (paper_id, path) for every distinct PDF under pdf_dir. Content-addressed store
+    objects come first under their canonical paper_id; loose PDFs keep their file
+    stem and are skipped when the same bytes (or paper_id) were already seen.
+    """
+    store = PdfStore(pdf_dir)
+    papers: list[tuple[str, Path]] = []
+    seen_hashes: set[str] = set()
+    seen_ids: set[str] = set()
+    for paper_id, path in store.iter_objects():
+        papers.append((paper_id, path))
+        seen_hashes.add(path.stem)
+        seen_ids.add(paper_id)
+    for path in sorted(p for p in pdf_dir.rglob("*.pdf") if p.is_file()):
+        if store.objects_dir in path.parents or path.stem in seen_ids:
+            continue
+        sha256 = file_sha256(path)
+        if sha256 in seen_hashes:
+            continue
+        papers.append((path.stem, path))
+        seen_hashes.add(sha256)
+        seen_ids.add(path.stem)
+    return papers
+
+
+def extract_pages(
+    pdf_path: Path,
+    paper_id: str,
+    backend: str = DEFAULT_BACKEND,
+    fallback: str | None = DEFAULT_FALLBACK,
+) -> list[dict]:
     pages: list[dict] = []
-    with pdfplumber.open(str(pdf_path)) as pdf:
-        for idx, page in enumerate(pdf.pages, start=1):
-            text = page.extract_text() or ""
-            pages.append(
-                {
-                    "paper_id": pdf_path.stem,
-                    "source_path": str(pdf_path.as_posix()),
-                    "page": idx,
-                    "text": text,
-                }
-            )
+    for idx, (text, extractor) in enumerate(extract_page_texts(pdf_path, backend, fallback), start=1):
+        pages.append(
+            {
+                "paper_id": paper_id,
+                "source_path": str(pdf_path.as_posix()),
+                "page": idx,
+                "text": text,
+                "extractor": extractor,
+            }
+        )
     return pages
 
 
@@ -84,57 +149,347 @@ def chunk_text(text: str, chunk_size: int, overlap: int) -> list[tuple[int, int,
     return chunks
 
 
+def token_counter(model: str = EMBEDDING_MODEL):
+    """len-in-tokens function for `model`'s tokenizer (the embedding model's by default; estimate without tiktoken)."""
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except (KeyError, ValueError):
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode_ordinary(text))
+    return lambda text: max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def sentence_spans(text: str, max_tokens: int, count_tokens) -> list[tuple[int, int, int]]:
+    """
+    (start, end, tokens) for every sentence in text, in order. Sentences longer
+    than max_tokens are cut at whitespace into pieces that fit, so packing never
+    has to split a span.
+    """
+    spans: list[tuple[int, int, int]] = []
+
+    def _add(start: int, end: int) -> None:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start >= end:
+            return
+        tokens = count_tokens(text[start:end])
+        if tokens <= max_tokens:
+            spans.append((start, end, tokens))
+            return
+        piece_chars = max(1, (end - start) * max_tokens // tokens)
+        while start < end:
+            cut = min(end, start + piece_chars)
+            if cut < end:
+                space = text.rfind(" ", start + piece_chars // 2, cut)
+                cut = space if space > start else cut
+            spans.append((start, cut, count_tokens(text[start:cut])))
+            start = cut
+            while start < end and text[start].isspace():
+                start += 1
+
+    cursor = 0
+    for match in _SENTENCE_BREAK_RE.finditer(text):
+        end = match.start() + len(match.group(0).rstrip())
+        _add(cursor, end)
+        cursor = match.end()
+    _add(cursor, len(text))
+    return spans
+
+
+def pack_sentences(spans: list[tuple[int, int, int]], max_tokens: int, overlap_tokens: int) -> list[tuple[int, int]]:
+    """
+    Greedily pack consecutive sentences into (start, end) chunks of at most
+    max_tokens, each new chunk re-using trailing sentences of the previous one
+    worth up to overlap_tokens (when the next sentence still fits). Linear in
+    the number of sentences.
+    """
+    chunks: list[tuple[int, int]] = []
+    i, n = 0, len(spans)
+    while i < n:
+        j, total = i, 0
+        while j < n and (j == i or total + spans[j][2] <= max_tokens):
+            total += spans[j][2]
+            j += 1
+        chunks.append((spans[i][0], spans[j - 1][1]))
+        if j >= n:
+            break
+        # Only carry what still leaves room for the next sentence, or the chunk would be overlap alone.
+        k, carried, room = j, 0, max_tokens - spans[j][2]
+        while k - 1 > i and carried + spans[k - 1][2] <= min(overlap_tokens, room):
+            k -= 1
+            carried += spans[k][2]
+        i = k
+    return chunks
+
+
+def chunk_record(page: dict, page_end: int, chunk_idx: int, char_start: int, char_end: int, text: str) -> ChunkRecord:
+    seed = f'{page["paper_id"]}|{page["page"]}|{chunk_idx}|{char_start}|{char_end}|{text}'
+    return ChunkRecord(
+        chunk_id=stable_hash(seed)[:24],
+        paper_id=page["paper_id"],
+        source_path=page["source_path"],
+        page=page["page"],
+        page_end=page_end,
+        chunk_index_on_page=chunk_idx,
+        char_start=char_start,
+        char_end=char_end,
+        text=text,
+        content_hash=stable_hash(f"{EMBEDDING_MODEL}|{text}"),
+    )
+
+
 def build_chunks(pages: list[dict], chunk_size: int, overlap: int) -> list[ChunkRecord]:
+    """Fixed-size character chunks within each page (the pre-token-budget chunker)."""
     rows: list[ChunkRecord] = []
     for page in pages:
         page_chunks = chunk_text(page["text"], chunk_size=chunk_size, overlap=overlap)
         for chunk_idx, (char_start, char_end, chunk_text_value) in enumerate(page_chunks):
-            seed = f'{page["paper_id"]}|{page["page"]}|{chunk_idx}|{char_start}|{char_end}|{chunk_text_value}'
-            chunk_id = stable_hash(seed)[:24]
-            content_hash = stable_hash(f"{EMBEDDING_MODEL}|{chunk_text_value}")
+            rows.append(chunk_record(page, page["page"], chunk_idx, char_start, char_end, chunk_text_value))
+    return rows
+
+
+def build_sentence_chunks(
+    pages: list[dict],
+    max_tokens: int,
+    overlap_tokens: int,
+    span_pages: bool = False,
+    count_tokens=None,
+) -> list[ChunkRecord]:
+    """
+    Token-budgeted chunks made of whole sentences. With span_pages, each paper's
+    pages are joined by PAGE_SEPARATOR so chunks can cross page breaks; char_start
+    is then relative to the start page's text and char_end to page_end's text,
+    exactly as for single-page chunks.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+    count_tokens = count_tokens or token_counter()
+    if span_pages:
+        groups: dict[str, list[dict]] = {}
+        for page in pages:
+            groups.setdefault(page["paper_id"], []).append(page)
+        units = list(groups.values())
+    else:
+        units = [[page] for page in pages]
+
+    rows: list[ChunkRecord] = []
+    for unit in units:
+        text = PAGE_SEPARATOR.join(page["text"] for page in unit)
+        page_starts: list[int] = []
+        pos = 0
+        for page in unit:
+            page_starts.append(pos)
+            pos += len(page["text"]) + len(PAGE_SEPARATOR)
+        chunk_counts = [0] * len(unit)
+        spans = sentence_spans(text, max_tokens, count_tokens)
+        for start, end in pack_sentences(spans, max_tokens, overlap_tokens):
+            first = bisect_right(page_starts, start) - 1
+            last = bisect_right(page_starts, end - 1) - 1
             rows.append(
-                ChunkRecord(
-                    chunk_id=chunk_id,
-                    paper_id=page["paper_id"],
-                    source_path=page["source_path"],
-                    page=page["page"],
-                    chunk_index_on_page=chunk_idx,
-                    char_start=char_start,
-                    char_end=char_end,
-                    text=chunk_text_value,
-                    content_hash=content_hash,
+                chunk_record(
+                    unit[first],
+                    unit[last]["page"],
+                    chunk_counts[first],
+                    start - page_starts[first],
+                    end - page_starts[last],
+                    text[start:end],
                 )
             )
+            chunk_counts[first] += 1
     return rows
 
 
-def embed_texts(client: OpenAI, texts: list[str]) -> list[list[float]]:
+def mark_duplicates(chunks: list[ChunkRecord]) -> list[ChunkRecord]:
+    """Tag reference-list chunks and point exact/near-duplicate chunks at the first occurrence."""
+    index = NearDuplicateIndex()
+    marked: list[ChunkRecord] = []
+    for chunk in chunks:
+        if looks_like_references(chunk.text):
+            marked.append(replace(chunk, is_references=True))
+        else:
+            marked.append(replace(chunk, duplicate_of=index.add(chunk.chunk_id, chunk.text)))
+    return marked
+
+
+def write_text_store(
+    store_dir: Path, pages: list[dict], chunk_pages: list[dict], chunks: list[ChunkRecord]
+) -> tuple[list[dict], list[dict]]:
+    """
+    Write every paper's extracted pages to the text store and return page and
+    chunk metadata rows that reference text by (text_offset, text_length) byte
+    spans instead of carrying it. Overlapping chunks share the same bytes.
+
+    Chunks were cut from `chunk_pages` (boilerplate blanked with spaces, same
+    length as `pages`), so they are located there and the char spans mapped onto
+    the stored extracted text.
+    """
+    pages_by_paper: dict[str, list[dict]] = defaultdict(list)
+    for page in pages:
+        pages_by_paper[page["paper_id"]].append(page)
+    chunk_pages_by_paper: dict[str, list[dict]] = defaultdict(list)
+    for page in chunk_pages:
+        chunk_pages_by_paper[page["paper_id"]].append(page)
+    chunks_by_paper: dict[str, list[ChunkRecord]] = defaultdict(list)
+    for chunk in chunks:
+        chunks_by_paper[chunk.paper_id].append(chunk)
+
+    page_rows: list[dict] = []
+    chunk_rows: list[dict] = []
+    with TextStoreWriter(store_dir) as writer:
+        for paper_id, paper_pages in pages_by_paper.items():
+            paper = writer.add_paper(paper_id, paper_pages[0]["source_path"], [p["text"] for p in paper_pages])
+            blanked = PaperText(paper_id, paper.source_path, [p["text"] for p in chunk_pages_by_paper[paper_id]], 0)
+            page_index = {p["page"]: i for i, p in enumerate(paper_pages)}
+            paper_chunks = chunks_by_paper.get(paper_id, [])
+            spans = paper.byte_spans(
+                [(start, start + length) for start, length in zip(paper.page_starts, paper.page_lengths)]
+                + [blanked.locate(c.text, page_index[c.page], c.char_start) for c in paper_chunks]
+            )
+            for page, (offset, length) in zip(paper_pages, spans):
+                page_rows.append(
+                    {
+                        "paper_id": paper_id,
+                        "page": page["page"],
+                        "source_path": page["source_path"],
+                        "extractor": page.get("extractor"),
+                        "text_offset": offset,
+                        "text_length": length,
+                    }
+                )
+            for c, (offset, length) in zip(paper_chunks, spans[len(paper_pages) :]):
+                chunk_rows.append(
+                    {
+                        "chunk_id": c.chunk_id,
+                        "paper_id": c.paper_id,
+                        "page": c.page,
+                        "page_end": c.page_end,
+                        "chunk_index_on_page": c.chunk_index_on_page,
+                        "char_start": c.char_start,
+                        "char_end": c.char_end,
+                        "text_offset": offset,
+                        "text_length": length,
+                        "content_hash": c.content_hash,
+                        "duplicate_of": c.duplicate_of,
+                        "is_references": c.is_references,
+                    }
+                )
+    return page_rows, chunk_rows
+
+
+def embed_texts(client: OpenAI, texts: list[str], ledger: UsageLedger | None = None) -> list[list[float]]:
     def _call():
         return client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
 
+    started = time.perf_counter()
     resp = call_with_retries(_call)
+    if ledger is not None:
+        ledger.record("embed", EMBEDDING_MODEL, resp.usage, time.perf_counter() - started)
     return [item.embedding for item in resp.data]
 
 
+def embed_with_batch_api(
+    client, batch_dir: Path, batches: list[list[ChunkRecord]], ledger: UsageLedger, poll_seconds: float | None
+) -> tuple[dict[str, list[float]], list[list[ChunkRecord]]]:
+    """Vectors by chunk_id from one Batch API run over `batches`, plus the batches whose request failed."""
+    requests = [
+        (f"embed-{i:06d}", {"model": EMBEDDING_MODEL, "input": [c.text for c in batch]}) for i, batch in enumerate(batches)
+    ]
+    results = run_batch(client, batch_dir, "embeddings", EMBEDDINGS_ENDPOINT, requests, poll_seconds)
+    vectors: dict[str, list[float]] = {}
+    failed: list[list[ChunkRecord]] = []
+    for (custom_id, _), batch in zip(requests, batches):
+        result = results[custom_id]
+        if "error" in result:
+            print(f"Batch request {custom_id} failed ({result['error']}); embedding its {len(batch)} chunk(s) synchronously.")
+            failed.append(batch)
+            continue
+        body = result["body"]
+        ledger.record("embed", EMBEDDING_MODEL, body.get("usage"), 0.0, batch=True)
+        for chunk, item in zip(batch, sorted(body["data"], key=lambda d: d["index"])):
+            vectors[chunk.chunk_id] = item["embedding"]
+    return vectors, failed
+
+
 def l2_norm(v: list[float]) -> float:
     return math.sqrt(sum(x * x for x in v))
 
 
+def embedding_record(chunk: ChunkRecord, vector: list[float], stub: bool = False) -> dict:
+    record = {
+        "chunk_id": chunk.chunk_id,
+        "paper_id": chunk.paper_id,
+        "page": chunk.page,
+        "model": EMBEDDING_MODEL,
+        "content_hash": chunk.content_hash,
+        "vector": vector,
+        "vector_norm": l2_norm(vector),
+        "updated_at": utc_now_iso(),
+    }
+    if stub:
+        # Fake vectors from --batch-stub; never reused by a real run (and vice versa).
+        record["stub"] = True
+    return record
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Extract PDF text, chunk pages, and build cached embeddings index.")
     parser.add_argument("--config", default="pipeline_config.yaml", help="Pipeline config YAML path.")
     parser.add_argument("--pdf-dir", default=None, help="Folder containing PDFs.")
     parser.add_argument("--out-dir", default=None, help="Base output directory.")
-    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE_CHARS)
-    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP_CHARS)
+    parser.add_argument(
+        "--pdf-backend",
+        choices=sorted(EXTRACTORS),
+        default=None,
+        help=f"PDF text extractor (default: pdf_text.backend in the config, else {DEFAULT_BACKEND}).",
+    )
+    parser.add_argument(
+        "--chunker",
+        choices=CHUNKERS,
+        default=None,
+        help="sentences = token-budgeted sentence packing (default); chars = fixed character windows per page.",
+    )
+    parser.add_argument("--max-tokens", type=int, default=None, help=f"Token budget per chunk (sentences; default {CHUNK_MAX_TOKENS}).")
+    parser.add_argument("--overlap-tokens", type=int, default=None, help=f"Tokens of trailing sentences repeated in the next chunk (default {CHUNK_OVERLAP_TOKENS}).")
+    parser.add_argument("--span-pages", action="store_true", default=None, help="Let sentence chunks cross page breaks.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE_CHARS, help="Characters per chunk (chars chunker).")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP_CHARS, help="Character overlap (chars chunker).")
     parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
     parser.add_argument("--limit", type=int, default=None, help="Optional max number of PDFs (for testing).")
+    parser.add_argument(
+        "--no-dedupe",
+        action="store_true",
+        help="Keep running headers/footers and embed every chunk, including duplicates and reference lists.",
+    )
+    parser.add_argument("--keep-references", action="store_true", help="Embed chunks that look like reference lists.")
+    parser.add_argument(
+        "--ann-nlist",
+        type=int,
+        default=0,
+        help="Number of IVF lists for the corpus ANN index (0 = auto: exact below 2048 chunks, else 4*sqrt(N)).",
+    )
+    add_batch_args(parser)
+    add_metrics_args(parser)
     args = parser.parse_args()
+    metrics = metrics_from_args("build_index", args)
+    batch_mode = args.batch_mode or args.batch_stub
 
     cfg = load_pipeline_config(args.config)
     cfg_paths = cfg.get("paths", {})
     pdf_dir = Path(args.pdf_dir or cfg_paths.get("pdf_dir", "data/pdfs/calibration-set/caresearchhub"))
     out_dir = Path(args.out_dir or cfg_paths.get("out_dir", "outputs"))
+    cfg_pdf_text = cfg.get("pdf_text", {}) or {}
+    pdf_backend = args.pdf_backend or cfg_pdf_text.get("backend", DEFAULT_BACKEND)
+    pdf_fallback = cfg_pdf_text.get("fallback", DEFAULT_FALLBACK) or None
+    cfg_chunking = cfg.get("chunking", {}) or {}
+    chunker = args.chunker or cfg_chunking.get("strategy", DEFAULT_CHUNKER)
+    if chunker not in CHUNKERS:
+        raise ValueError(f"Unknown chunking.strategy {chunker!r}; expected one of {CHUNKERS}")
+    max_tokens = args.max_tokens or int(cfg_chunking.get("max_tokens", CHUNK_MAX_TOKENS))
+    overlap_tokens = args.overlap_tokens if args.overlap_tokens is not None else int(cfg_chunking.get("overlap_tokens", CHUNK_OVERLAP_TOKENS))
+    span_pages = bool(args.span_pages if args.span_pages is not None else cfg_chunking.get("span_pages", False))
     index_dir = out_dir / "index"
     pages_path = index_dir / "pages.jsonl"
     chunks_path = index_dir / "chunks.jsonl"
@@ -150,33 +505,43 @@ def main() -> None:
     if not pdfs:
         raise RuntimeError(f"No PDFs found in {pdf_dir}")
 
-    client = build_openai_client()
+    client = StubBatchClient(batch_dir_for(out_dir / "index") / "stub") if args.batch_stub else build_openai_client()
+    ledger = UsageLedger(load_pricing(cfg))
+    count_tokens = token_counter()
 
-    all_pages: list[dict] = []
-    all_chunks: list[ChunkRecord] = []
-    for pdf_path in pdfs:
-        pages = extract_pages(pdf_path)
-        all_pages.extend(pages)
-        all_chunks.extend(build_chunks(pages, chunk_size=args.chunk_size, overlap=args.chunk_overlap))
+    with metrics.span("extract_pages", profile=True):
+        all_pages: list[dict] = []
+        for paper_id, pdf_path in pdfs:
+            all_pages.extend(extract_pages(pdf_path, paper_id, backend=pdf_backend, fallback=pdf_fallback))
 
-    jsonl_write(pages_path, all_pages)
-    jsonl_write(
-        chunks_path,
-        (
-            {
-                "chunk_id": c.chunk_id,
-                "paper_id": c.paper_id,
-                "source_path": c.source_path,
-                "page": c.page,
-                "chunk_index_on_page": c.chunk_index_on_page,
-                "char_start": c.char_start,
-                "char_end": c.char_end,
-                "text": c.text,
-                "content_hash": c.content_hash,
-            }
-            for c in all_chunks
-        ),
-    )
+    with metrics.span("chunk", profile=True):
+        # Boilerplate is blanked in place (same length), so char offsets still index the extracted page text.
+        chunk_pages, boilerplate_lines = (all_pages, 0) if args.no_dedupe else strip_boilerplate(all_pages)
+        if chunker == "chars":
+            all_chunks = build_chunks(chunk_pages, chunk_size=args.chunk_size, overlap=args.chunk_overlap)
+        else:
+            all_chunks = build_sentence_chunks(
+                chunk_pages, max_tokens, overlap_tokens, span_pages=span_pages, count_tokens=count_tokens
+            )
+
+    with metrics.span("dedupe", profile=True):
+        if not args.no_dedupe:
+            all_chunks = mark_duplicates(all_chunks)
+    skip_references = not args.no_dedupe and not args.keep_references
+    canonical_chunks = [
+        c for c in all_chunks if c.duplicate_of is None and not (skip_references and c.is_references)
+    ]
+
+    with metrics.span("write_text_store"):
+        text_store_dir = text_store_dir_for(index_dir)
+        page_rows, chunk_rows = write_text_store(text_store_dir, all_pages, chunk_pages, all_chunks)
+        jsonl_write(pages_path, page_rows)
+        jsonl_write(chunks_path, chunk_rows)
+
+    with metrics.span("lexical_index"):
+        lexical_dir = lexical_dir_for(index_dir)
+        lexical = LexicalIndex.build((c.chunk_id, c.text) for c in canonical_chunks)
+        lexical.save(lexical_dir)
 
     existing_embeddings: dict[str, dict] = {}
     for row in jsonl_read(embeddings_path):
@@ -188,61 +553,108 @@ def main() -> None:
     to_embed: list[ChunkRecord] = []
     reused_count = 0
 
-    for chunk in all_chunks:
+    for chunk in canonical_chunks:
         cached = existing_embeddings.get(chunk.chunk_id)
-        if cached and cached.get("content_hash") == chunk.content_hash and cached.get("model") == EMBEDDING_MODEL:
+        if (
+            cached
+            and cached.get("content_hash") == chunk.content_hash
+            and cached.get("model") == EMBEDDING_MODEL
+            and bool(cached.get("stub")) == args.batch_stub
+        ):
             embeddings_records[chunk.chunk_id] = cached
             reused_count += 1
         else:
             to_embed.append(chunk)
 
-    for batch_start in range(0, len(to_embed), args.batch_size):
-        batch = to_embed[batch_start : batch_start + args.batch_size]
-        vectors = embed_texts(client, [c.text for c in batch])
-        for chunk, vector in zip(batch, vectors):
-            embeddings_records[chunk.chunk_id] = {
-                "chunk_id": chunk.chunk_id,
-                "paper_id": chunk.paper_id,
-                "page": chunk.page,
-                "model": EMBEDDING_MODEL,
-                "content_hash": chunk.content_hash,
-                "vector": vector,
-                "vector_norm": l2_norm(vector),
-                "updated_at": utc_now_iso(),
-            }
+    with metrics.span("embed", profile=True):
+        batches = [to_embed[i : i + args.batch_size] for i in range(0, len(to_embed), args.batch_size)]
+        if batch_mode and batches:
+            batch_vectors, batches = embed_with_batch_api(
+                client, batch_dir_for(index_dir), batches, ledger, args.batch_poll_seconds
+            )
+            for chunk in to_embed:
+                if chunk.chunk_id in batch_vectors:
+                    embeddings_records[chunk.chunk_id] = embedding_record(chunk, batch_vectors[chunk.chunk_id], args.batch_stub)
+        # Synchronous path, and the retry for any batch requests that failed.
+        for batch in batches:
+            vectors = embed_texts(client, [c.text for c in batch], ledger)
+            for chunk, vector in zip(batch, vectors):
+                embeddings_records[chunk.chunk_id] = embedding_record(chunk, vector, args.batch_stub)
 
     jsonl_write(
         embeddings_path,
         (
             embeddings_records[c.chunk_id]
-            for c in all_chunks
+            for c in canonical_chunks
             if c.chunk_id in embeddings_records
         ),
     )
 
+    ann_dir = ann_dir_for(index_dir, EMBEDDING_MODEL)
+    ann_ids = [c.chunk_id for c in canonical_chunks if c.chunk_id in embeddings_records]
+    ann_meta: dict = {}
+    with metrics.span("ann_index", profile=True):
+        if ann_ids:
+            ann = IvfIndex.build(
+                ann_ids,
+                [embeddings_records[cid]["vector"] for cid in ann_ids],
+                embedding_model=EMBEDDING_MODEL,
+                nlist=args.ann_nlist,
+            )
+            ann.attach_chunk_offsets(jsonl_line_offsets(chunks_path, "chunk_id"))
+            ann.save(ann_dir)
+            ann_meta = ann.meta
+
+    metrics.count("pdfs", len(pdfs))
+    metrics.count("pages", len(all_pages))
+    metrics.count("chunks", len(all_chunks))
+    metrics.count("embedding_calls", math.ceil(len(to_embed) / args.batch_size))
     papers_with_text = len({p["paper_id"] for p in all_pages if p["text"].strip()})
+    run_summary = metrics.summary()
     manifest = {
         "timestamp_utc": utc_now_iso(),
         "pdf_dir": str(pdf_dir.as_posix()),
         "pdf_count": len(pdfs),
         "page_count": len(all_pages),
+        "pdf_backend": pdf_backend,
+        "pdf_fallback": pdf_fallback,
+        "pages_by_extractor": dict(Counter(p["extractor"] for p in all_pages)),
         "chunk_count": len(all_chunks),
+        "boilerplate_lines_blanked": boilerplate_lines,
+        "duplicate_chunks": sum(1 for c in all_chunks if c.duplicate_of),
+        "reference_chunks": sum(1 for c in all_chunks if c.is_references),
+        "embedded_chunks": len(canonical_chunks),
         "papers_with_any_text": papers_with_text,
         "embedding_model": EMBEDDING_MODEL,
-        "chunk_size": args.chunk_size,
-        "chunk_overlap": args.chunk_overlap,
+        "chunker": chunker,
+        "chunk_size": args.chunk_size if chunker == "chars" else None,
+        "chunk_overlap": args.chunk_overlap if chunker == "chars" else None,
+        "chunk_max_tokens": max_tokens if chunker == "sentences" else None,
+        "chunk_overlap_tokens": overlap_tokens if chunker == "sentences" else None,
+        "chunk_span_pages": span_pages if chunker == "sentences" else None,
+        "token_counter": "tiktoken" if tiktoken is not None else f"chars/{CHARS_PER_TOKEN}",
         "reused_embeddings": reused_count,
         "new_embeddings": len(to_embed),
+        "batch_mode": ("stub" if args.batch_stub else "api") if batch_mode else None,
+        "ann_nlist": ann_meta.get("nlist"),
+        "lexical_term_count": lexical.meta["term_count"],
+        "timings_s": {name: round(agg["wall_s"], 3) for name, agg in run_summary["spans"].items()},
+        "peak_rss_mb": run_summary["peak_rss_mb"],
+        "usage": ledger.summary(),
         "outputs": {
             "pages_jsonl": str(pages_path.as_posix()),
+            "text_store_dir": str(text_store_dir.as_posix()),
             "chunks_jsonl": str(chunks_path.as_posix()),
             "embeddings_jsonl": str(embeddings_path.as_posix()),
+            "ann_index_dir": str(ann_dir.as_posix()),
+            "lexical_index_dir": str(lexical_dir.as_posix()),
         },
     }
     manifest_path.parent.mkdir(parents=True, exist_ok=True)
     manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
 
     print(json.dumps(manifest, indent=2))
+    print("\n".join(ledger.report_lines() + metrics.close()))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# Running headers/footers live in the first/last few lines of a page.
+EDGE_LINES = 3
+PAGE_REPEAT_MIN_PAGES = 3
+PAGE_REPEAT_MIN_FRACTION = 0.4
+CROSS_PAPER_MIN_PAPERS = 5
+CROSS_PAPER_MIN_CHARS = 20
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 8
+NEAR_DUPLICATE_JACCARD = 0.9
+# Reference lists: lines with a Vancouver-style "2019;140" / "2019, 12(" or a DOI.
+REFERENCE_LINE_FRACTION = 0.4
+REFERENCE_MIN_MATCHES = 5
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_DIGITS_RE = re.compile(r"\d+")
+_WORD_RE = re.compile(r"\w+")
+_CITATION_RE = re.compile(r"\b(?:19|20)\d{2}\s*(?:;\s*\d+|,\s*\d+\s*[(:])|\bdoi\b|doi\.org/", re.I)
+
+
+def normalize_line(line: str) -> str:
+    """Case/whitespace-folded line with digit runs collapsed, so "Page 3 of 12" == "Page 4 of 12"."""
+    return " ".join(_DIGITS_RE.sub("#", line.lower()).split())
+
+
+def edge_lines(text: str) -> list[tuple[int, int, str]]:
+    """(start, end, normalized) for the first and last EDGE_LINES non-empty lines of a page."""
+    lines: list[tuple[int, int, str]] = []
+    pos = 0
+    for raw in text.split("\n"):
+        norm = normalize_line(raw)
+        if norm:
+            lines.append((pos, pos + len(raw), norm))
+        pos += len(raw) + 1
+    if len(lines) <= 2 * EDGE_LINES:
+        return lines
+    return lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+
+
+def find_boilerplate(pages: list[dict]) -> tuple[set[tuple[str, str]], set[str]]:
+    """
+    Normalized edge lines that repeat on many pages of one paper ((paper_id, line)
+    pairs) and long edge lines shared by many papers (journal banners, licences).
+    """
+    page_counts: dict[str, Counter] = defaultdict(Counter)
+    pages_per_paper: Counter = Counter()
+    papers_per_line: dict[str, set[str]] = defaultdict(set)
+    for page in pages:
+        paper_id = page["paper_id"]
+        pages_per_paper[paper_id] += 1
+        for norm in {norm for _, _, norm in edge_lines(page["text"])}:
+            page_counts[paper_id][norm] += 1
+            if len(norm) >= CROSS_PAPER_MIN_CHARS:
+                papers_per_line[norm].add(paper_id)
+
+    per_paper = {
+        (paper_id, norm)
+        for paper_id, counts in page_counts.items()
+        for norm, n in counts.items()
+        if n >= PAGE_REPEAT_MIN_PAGES and n >= PAGE_REPEAT_MIN_FRACTION * pages_per_paper[paper_id]
+    }
+    cross_paper = {norm for norm, papers in papers_per_line.items() if len(papers) >= CROSS_PAPER_MIN_PAPERS}
+    return per_paper, cross_paper
+
+
+def strip_boilerplate(pages: list[dict]) -> tuple[list[dict], int]:
+    """
+    Copies of `pages` with boilerplate edge lines overwritten by spaces. Text
+    length is unchanged, so chunk char offsets still index the original page text.
+    Returns (pages, number of lines blanked).
+    """
+    per_paper, cross_paper = find_boilerplate(pages)
+    cleaned: list[dict] = []
+    blanked = 0
+    for page in pages:
+        text = page["text"]
+        spans = [
+            (start, end)
+            for start, end, norm in edge_lines(text)
+            if norm in cross_paper or (page["paper_id"], norm) in per_paper
+        ]
+        if spans:
+            parts: list[str] = []
+            cursor = 0
+            for start, end in spans:
+                parts.append(text[cursor:start])
+                parts.append(" " * (end - start))
+                cursor = end
+            parts.append(text[cursor:])
+            text = "".join(parts)
+            blanked += len(spans)
+        cleaned.append({**page, "text": text})
+    return cleaned, blanked
+
+
+def looks_like_references(text: str) -> bool:
+    """True when most lines of a chunk read like bibliography entries."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return False
+    matches = sum(1 for line in lines if _CITATION_RE.search(line))
+    return matches >= REFERENCE_MIN_MATCHES and matches >= REFERENCE_LINE_FRACTION * len(lines)
+
+
+class NearDuplicateIndex:
+    """
+    Exact (normalized-text hash) and near (MinHash over word shingles, banded LSH)
+    duplicate detection. `add` returns the key of an earlier text whose estimated
+    Jaccard similarity is at least `threshold`, or registers the text as new.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = MINHASH_PERMUTATIONS,
+        bands: int = LSH_BANDS,
+        threshold: float = NEAR_DUPLICATE_JACCARD,
+        seed: int = 0,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._exact: dict[str, str] = {}
+        self._buckets: dict[tuple[int, bytes], list[str]] = defaultdict(list)
+        self._signatures: dict[str, np.ndarray] = {}
+
+    def signature(self, words: list[str]) -> np.ndarray:
+        n = max(1, len(words) - SHINGLE_WORDS + 1)
+        shingles = {" ".join(words[i : i + SHINGLE_WORDS]) for i in range(n)}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+    def add(self, key: str, text: str) -> str | None:
+        words = _WORD_RE.findall(text.lower())
+        digest = hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()
+        original = self._exact.get(digest)
+        if original is not None:
+            return original
+
+        sig = self.signature(words)
+        bands = [(band, sig[band * self.rows : (band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+        seen: set[str] = set()
+        for bucket in bands:
+            for candidate in self._buckets.get(bucket, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if float(np.mean(self._signatures[candidate] == sig)) >= self.threshold:
+                    return candidate
+
+        self._exact[digest] = key
+        self._signatures[key] = sig
+        for bucket in bands:
+            self._buckets[bucket].append(key)
+        return None
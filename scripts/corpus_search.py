@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from openai import OpenAI
+
+from ann_index import DEFAULT_NPROBE, IvfIndex, ann_dir_for, read_jsonl_at
+from shared import build_openai_client, call_with_retries, load_pipeline_config
+from text_store import TextStore, text_store_dir_for
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+DEFAULT_TOP_K = 10
+SNIPPET_CHARS = 300
+
+
+def embed_query(client: OpenAI, query: str) -> list[float]:
+    def _call():
+        return client.embeddings.create(model=EMBEDDING_MODEL, input=[query])
+
+    resp = call_with_retries(_call)
+    return resp.data[0].embedding
+
+
+def search_corpus(
+    index: IvfIndex,
+    chunks_path: Path,
+    query_vector: list[float],
+    *,
+    text_store: TextStore | None = None,
+    k: int,
+    nprobe: int,
+    paper_id: str | None = None,
+) -> list[dict]:
+    # Over-fetch when filtering by paper so the filter does not starve the top-k.
+    fetch_k = k * 20 if paper_id else k
+    hits = index.search_positions(query_vector, fetch_k, nprobe=nprobe)
+    results: list[dict] = []
+    with chunks_path.open("rb") as f:
+        for pos, score in hits:
+            offset = int(index.chunk_offsets[pos]) if index.chunk_offsets is not None else -1
+            if offset < 0:
+                continue
+            chunk = read_jsonl_at(f, offset)
+            if paper_id and chunk["paper_id"] != paper_id:
+                continue
+            results.append(
+                {
+                    "rank": len(results) + 1,
+                    "score": round(score, 6),
+                    "chunk_id": chunk["chunk_id"],
+                    "paper_id": chunk["paper_id"],
+                    "page": chunk["page"],
+                    "page_end": chunk.get("page_end", chunk["page"]),
+                    "chunk_index_on_page": chunk["chunk_index_on_page"],
+                    "source_path": chunk.get("source_path") or (text_store.source_path(chunk["paper_id"]) if text_store else ""),
+                    "text": chunk["text"] if "text" in chunk else text_store.text(chunk),
+                }
+            )
+            if len(results) >= k:
+                break
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ad-hoc semantic search across every chunk in the local PDF corpus.")
+    parser.add_argument("query", nargs="+", help="Question or keywords, e.g. 'QOLIBRI at 12 months'.")
+    parser.add_argument("--config", default="pipeline_config.yaml", help="Pipeline config YAML path.")
+    parser.add_argument("--out-dir", default=None, help="Base output directory (index is read from <out-dir>/index).")
+    parser.add_argument("--k", type=int, default=DEFAULT_TOP_K, help="Number of chunks to return.")
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="IVF lists scanned per query (higher = more exact).")
+    parser.add_argument("--paper-id", default=None, help="Restrict results to one paper_id.")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines with full chunk text.")
+    args = parser.parse_args()
+
+    cfg = load_pipeline_config(args.config)
+    cfg_paths = cfg.get("paths", {})
+    out_dir = Path(args.out_dir or cfg_paths.get("out_dir", "outputs"))
+    index_dir = out_dir / "index"
+    chunks_path = index_dir / "chunks.jsonl"
+    text_store_dir = text_store_dir_for(index_dir)
+    text_store = TextStore(text_store_dir) if (text_store_dir / "corpus.txt").exists() else None
+
+    index = IvfIndex.load(ann_dir_for(index_dir, EMBEDDING_MODEL))
+    if index.chunk_offsets is None:
+        raise RuntimeError("ANN index has no chunk offsets; re-run scripts/build_index.py.")
+
+    query = " ".join(args.query)
+    client = build_openai_client()
+    query_vector = embed_query(client, query)
+
+    started = time.perf_counter()
+    results = search_corpus(
+        index, chunks_path, query_vector, text_store=text_store, k=args.k, nprobe=args.nprobe, paper_id=args.paper_id
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if args.json:
+        for row in results:
+            print(json.dumps(row, ensure_ascii=False))
+        return
+    print(f"{len(results)} hit(s) for {query!r} in {elapsed_ms:.1f} ms ({index.meta['vector_count']} chunks, nprobe={args.nprobe}/{index.nlist})")
+    for row in results:
+        snippet = " ".join(row["text"].split())[:SNIPPET_CHARS]
+        print(f"\n#{row['rank']} score={row['score']:.3f} paper_id={row['paper_id']} page={row['page']} chunk_id={row['chunk_id']}")
+        print(f"   {snippet}")
+
+
+if __name__ == "__main__":
+    main()
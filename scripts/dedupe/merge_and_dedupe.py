@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import argparse
 import csv
 import re
 import sys
@@ -8,6 +9,9 @@ from pathlib import Path
 from typing import Dict, List, Tuple
 
 ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+from grey_search.utils.log import add_metrics_args, metrics_from_args  # noqa: E402
+
 NORMALIZED_DIR = ROOT / "data" / "normalized"
 MERGED_PATH = ROOT / "data" / "merged" / "studies_merged.csv"
 
@@ -68,36 +72,47 @@ def merge_query_ids(existing: str, incoming: str) -> str:
 
 
 def main() -> None:
-    rows: List[Dict[str, str]] = []
-    for csv_file in sorted(NORMALIZED_DIR.rglob("*.csv")):
-        with csv_file.open(newline="", encoding="utf-8") as f:
-            for row in csv.DictReader(f):
-                row["source_file"] = row.get("source_file") or csv_file.name
-                rows.append(row)
-
-    deduped: Dict[Tuple[str, str], Dict[str, str]] = {}
-    for row in rows:
-        key = dedupe_key(row)
-        existing = deduped.get(key)
-        if existing is None:
-            deduped[key] = row
-            continue
-
-        if quality_score(row) > quality_score(existing):
-            row["query_id"] = merge_query_ids(existing.get("query_id", ""), row.get("query_id", ""))
-            deduped[key] = row
-        else:
-            existing["query_id"] = merge_query_ids(existing.get("query_id", ""), row.get("query_id", ""))
-
-    out_rows = list(deduped.values())
-    fieldnames = sorted({key for row in out_rows for key in row.keys()})
-    MERGED_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with MERGED_PATH.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(out_rows)
-
+    parser = argparse.ArgumentParser(description="Merge normalized source CSVs and drop duplicate studies.")
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    metrics = metrics_from_args("merge_and_dedupe", args)
+
+    with metrics.span("load"):
+        rows: List[Dict[str, str]] = []
+        for csv_file in sorted(NORMALIZED_DIR.rglob("*.csv")):
+            with csv_file.open(newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    row["source_file"] = row.get("source_file") or csv_file.name
+                    rows.append(row)
+
+    with metrics.span("dedupe", profile=True):
+        deduped: Dict[Tuple[str, str], Dict[str, str]] = {}
+        for row in rows:
+            key = dedupe_key(row)
+            existing = deduped.get(key)
+            if existing is None:
+                deduped[key] = row
+                continue
+
+            if quality_score(row) > quality_score(existing):
+                row["query_id"] = merge_query_ids(existing.get("query_id", ""), row.get("query_id", ""))
+                deduped[key] = row
+            else:
+                existing["query_id"] = merge_query_ids(existing.get("query_id", ""), row.get("query_id", ""))
+
+    with metrics.span("write"):
+        out_rows = list(deduped.values())
+        fieldnames = sorted({key for row in out_rows for key in row.keys()})
+        MERGED_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with MERGED_PATH.open("w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(out_rows)
+
+    metrics.count("input_rows", len(rows))
+    metrics.count("merged_rows", len(out_rows))
     print(f"Wrote {len(out_rows)} merged rows to {MERGED_PATH}")
+    print("\n".join(metrics.close()))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import argparse
+import json
+from collections import defaultdict
+from pathlib import Path
+
+from build_index import token_counter
+from lexical_index import LexicalIndex, lexical_dir_for
+from retrieve_and_extract import (
+    DEFAULT_MAX_CHUNKS_SENT,
+    DEFAULT_TOP_K_PER_QUERY,
+    EMBEDDING_MODEL,
+    EXTRACTION_MODEL,
+    RETRIEVAL_QUERIES,
+    ExtractionPayload,
+    build_extraction_prompt,
+    load_existing_paper_ids,
+    make_openai_strict_json_schema,
+    materialize_text,
+    open_text_store,
+    paper_lexical_scores,
+)
+from shared import jsonl_read, load_pipeline_config
+from usage_ledger import load_pricing, token_cost
+
+# Output tokens (reasoning included) assumed per paper when no earlier run in
+# extractions.jsonl recorded run_metadata.usage to calibrate against.
+DEFAULT_OUTPUT_TOKENS = 2000
+
+
+def load_embedded(embeddings_path: Path) -> dict[str, str] | None:
+    """chunk_id -> content_hash of cached embeddings for EMBEDDING_MODEL (None without a cache file)."""
+    if not embeddings_path.exists():
+        return None
+    return {
+        row["chunk_id"]: row.get("content_hash")
+        for row in jsonl_read(embeddings_path)
+        if row.get("model", EMBEDDING_MODEL) == EMBEDDING_MODEL
+    }
+
+
+def extraction_candidates(chunks: dict[str, dict], embedded: dict[str, str] | None) -> dict[str, list[dict]]:
+    """Per paper, the chunks retrieval can choose from (mirrors retrieve_and_extract.load_index, without vectors)."""
+    papers: dict[str, list[dict]] = defaultdict(list)
+    for chunk_id, chunk in chunks.items():
+        original_id = chunk.get("duplicate_of")
+        if original_id:
+            original = chunks.get(original_id)
+            if original is None or original["paper_id"] == chunk["paper_id"]:
+                continue
+        target = original_id or chunk_id
+        if embedded is not None and target not in embedded:
+            continue
+        if embedded is None and chunks[target].get("is_references"):
+            continue
+        papers[chunk["paper_id"]].append(chunk)
+    for paper_chunks in papers.values():
+        paper_chunks.sort(key=lambda r: (r["page"], r["chunk_index_on_page"], r["char_start"]))
+    return papers
+
+
+def select_chunks(
+    paper_chunks: list[dict], lexical_scores: list[list[float]] | None, top_k_per_query: int, max_chunks_sent: int
+) -> list[dict]:
+    """
+    Stand-in for retrieval without query embeddings: per query the top-k chunks by
+    BM25 (document order among ties), capped at max_chunks_sent. Without a lexical
+    index, the first top_k * queries chunks (an upper bound on the union).
+    """
+    if lexical_scores is None:
+        return paper_chunks[: min(max_chunks_sent, top_k_per_query * len(RETRIEVAL_QUERIES))]
+    best: dict[int, float] = {}
+    for scores in lexical_scores:
+        ranked = sorted(range(len(paper_chunks)), key=lambda i: scores[i], reverse=True)
+        for i in ranked[:top_k_per_query]:
+            best[i] = max(best.get(i, 0.0), scores[i])
+    keep = sorted(best, key=lambda i: best[i], reverse=True)[:max_chunks_sent]
+    return [paper_chunks[i] for i in sorted(keep)]
+
+
+def observed_output_tokens(extractions_path: Path) -> tuple[int, int]:
+    """(mean output tokens per paper, number of papers) from run_metadata.usage of earlier runs."""
+    observed = [
+        (row.get("run_metadata") or {}).get("usage", {}).get("output_tokens", 0)
+        for row in jsonl_read(extractions_path)
+    ]
+    observed = [n for n in observed if n]
+    return (round(sum(observed) / len(observed)), len(observed)) if observed else (0, 0)
+
+
+def format_cost(cost: float | None) -> str:
+    return f"${cost:,.4f}" if cost is not None else "unpriced"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Pre-flight token and cost estimate for embedding and extraction, from the chunk index."
+    )
+    parser.add_argument("--config", default="pipeline_config.yaml", help="Pipeline config YAML path.")
+    parser.add_argument("--out-dir", default=None, help="Base output directory.")
+    parser.add_argument("--paper-id", default=None, help="Optional single paper_id to estimate.")
+    parser.add_argument("--top-k-per-query", type=int, default=DEFAULT_TOP_K_PER_QUERY)
+    parser.add_argument("--max-chunks-sent", type=int, default=DEFAULT_MAX_CHUNKS_SENT)
+    parser.add_argument("--limit", type=int, default=None, help="Optional max number of papers.")
+    parser.add_argument("--resume", action="store_true", help="Only count papers not yet in outputs/extractions.jsonl.")
+    parser.add_argument(
+        "--output-tokens",
+        type=int,
+        default=None,
+        help=f"Output tokens per paper (default: mean of earlier runs' recorded usage, else {DEFAULT_OUTPUT_TOKENS}).",
+    )
+    parser.add_argument("--batch-mode", action="store_true", help="Price at Batch API rates (see --batch-mode on the pipeline scripts).")
+    parser.add_argument("--top", type=int, default=10, help="Largest prompts to list.")
+    parser.add_argument("--json-out", default=None, help="Optional path for the estimate as JSON.")
+    args = parser.parse_args()
+
+    cfg = load_pipeline_config(args.config)
+    pricing = load_pricing(cfg)
+    out_dir = Path(args.out_dir or cfg.get("paths", {}).get("out_dir", "outputs"))
+    index_dir = out_dir / "index"
+    chunks_path = index_dir / "chunks.jsonl"
+    extractions_path = out_dir / "extractions.jsonl"
+    if not chunks_path.exists():
+        raise FileNotFoundError(f"Missing chunks file: {chunks_path}. Run scripts/build_index.py first.")
+
+    chunks = {row["chunk_id"]: row for row in jsonl_read(chunks_path)}
+    embedded = load_embedded(index_dir / f"embeddings_{EMBEDDING_MODEL}.jsonl")
+    text_store = open_text_store(index_dir)
+    count_embedding_tokens = token_counter(EMBEDDING_MODEL)
+    count_prompt_tokens = token_counter(EXTRACTION_MODEL)
+
+    # Embeddings: every canonical chunk on a cold rebuild; only changed/missing ones against the cache.
+    canonical = [c for c in chunks.values() if not c.get("duplicate_of") and not c.get("is_references")]
+    materialize_text(canonical, text_store)
+    embed_tokens = {c["chunk_id"]: count_embedding_tokens(c["text"]) for c in canonical}
+    pending = [c for c in canonical if embedded is None or embedded.get(c["chunk_id"]) != c.get("content_hash")]
+    rebuild_tokens = sum(embed_tokens.values())
+    pending_tokens = sum(embed_tokens[c["chunk_id"]] for c in pending)
+    query_tokens = sum(count_embedding_tokens(q) for q in RETRIEVAL_QUERIES)
+
+    papers = extraction_candidates(chunks, embedded)
+    paper_ids = sorted(papers)
+    if args.paper_id:
+        paper_ids = [pid for pid in paper_ids if pid == args.paper_id]
+    if args.resume:
+        done = load_existing_paper_ids(extractions_path)
+        paper_ids = [pid for pid in paper_ids if pid not in done]
+    if args.limit is not None:
+        paper_ids = paper_ids[: args.limit]
+
+    lexical_query_scores: list = []
+    row_of: dict[str, int] = {}
+    lexical_dir = lexical_dir_for(index_dir)
+    if (lexical_dir / "meta.json").exists():
+        lexical = LexicalIndex.load(lexical_dir)
+        lexical_query_scores = [lexical.score_all(q) for q in RETRIEVAL_QUERIES]
+        row_of = {cid: row for row, cid in enumerate(lexical.chunk_ids)}
+
+    # The strict JSON schema travels with every request as text.format, so it is billed as input.
+    schema_tokens = count_prompt_tokens(json.dumps(make_openai_strict_json_schema(ExtractionPayload.model_json_schema())))
+    output_tokens, observed_papers = observed_output_tokens(extractions_path)
+    if args.output_tokens is not None:
+        output_tokens, output_source = args.output_tokens, "--output-tokens"
+    elif observed_papers:
+        output_source = f"mean of {observed_papers} recorded paper(s)"
+    else:
+        output_tokens, output_source = DEFAULT_OUTPUT_TOKENS, "default"
+
+    per_paper: list[dict] = []
+    for paper_id in paper_ids:
+        paper_chunks = papers[paper_id]
+        lexical_scores = (
+            paper_lexical_scores(lexical_query_scores, row_of, paper_chunks) if lexical_query_scores else None
+        )
+        selected = select_chunks(paper_chunks, lexical_scores, args.top_k_per_query, args.max_chunks_sent)
+        materialize_text(selected, text_store)
+        messages = build_extraction_prompt(paper_id, selected)
+        prompt_tokens = sum(count_prompt_tokens(part["text"]) for m in messages for part in m["content"])
+        chunk_tokens = sum(count_prompt_tokens(c["text"]) for c in selected)
+        per_paper.append(
+            {
+                "paper_id": paper_id,
+                "chunks_available": len(paper_chunks),
+                "chunks_sent": len(selected),
+                "input_tokens": prompt_tokens + schema_tokens,
+                "chunk_text_tokens": chunk_tokens,
+            }
+        )
+
+    extract_input = sum(p["input_tokens"] for p in per_paper)
+    extract_output = output_tokens * len(per_paper)
+    chunk_text_tokens = sum(p["chunk_text_tokens"] for p in per_paper)
+    estimate = {
+        "index_dir": str(index_dir.as_posix()),
+        "chunk_selection": "bm25" if lexical_query_scores else "document_order",
+        "batch_pricing": args.batch_mode,
+        "embedding": {
+            "model": EMBEDDING_MODEL,
+            "cold_rebuild_chunks": len(canonical),
+            "cold_rebuild_tokens": rebuild_tokens,
+            "cold_rebuild_cost_usd": token_cost(EMBEDDING_MODEL, {"input_tokens": rebuild_tokens}, pricing, batch=args.batch_mode),
+            "pending_chunks": len(pending),
+            "pending_tokens": pending_tokens,
+            "pending_cost_usd": token_cost(EMBEDDING_MODEL, {"input_tokens": pending_tokens}, pricing, batch=args.batch_mode),
+            "query_tokens": query_tokens,
+        },
+        "extraction": {
+            "model": EXTRACTION_MODEL,
+            "papers": len(per_paper),
+            "input_tokens": extract_input,
+            "schema_tokens_per_call": schema_tokens,
+            "overhead_tokens": extract_input - chunk_text_tokens,
+            "output_tokens_per_paper": output_tokens,
+            "output_tokens_source": output_source,
+            "output_tokens": extract_output,
+            "cost_usd": token_cost(
+                EXTRACTION_MODEL,
+                {"input_tokens": extract_input, "output_tokens": extract_output},
+                pricing,
+                batch=args.batch_mode,
+            ),
+        },
+        "largest_prompts": sorted(per_paper, key=lambda p: p["input_tokens"], reverse=True)[: args.top],
+    }
+    emb, ext = estimate["embedding"], estimate["extraction"]
+    run_cost = None
+    if ext["cost_usd"] is not None:
+        query_cost = token_cost(EMBEDDING_MODEL, {"input_tokens": query_tokens}, pricing, batch=args.batch_mode)
+        run_cost = ext["cost_usd"] + (query_cost or 0.0)
+    estimate["extraction_run_cost_usd"] = run_cost
+
+    print(f"Embeddings ({EMBEDDING_MODEL}):")
+    print(f"  cold rebuild : {len(canonical)} chunks, {rebuild_tokens:,} tokens, {format_cost(emb['cold_rebuild_cost_usd'])}")
+    print(f"  not cached   : {len(pending)} chunks, {pending_tokens:,} tokens, {format_cost(emb['pending_cost_usd'])}")
+    print(f"Extraction ({EXTRACTION_MODEL}, chunks chosen by {estimate['chunk_selection']}):")
+    print(f"  papers       : {len(per_paper)}")
+    print(f"  input        : {extract_input:,} tokens ({ext['overhead_tokens']:,} instructions/schema/headers, {schema_tokens} schema per call)")
+    print(f"  output       : {extract_output:,} tokens ({output_tokens} per paper, {output_source})")
+    print(f"  cost         : {format_cost(ext['cost_usd'])}")
+    print(f"Extraction run total (incl. query embeddings): {format_cost(run_cost)}")
+    if per_paper:
+        mean_input = extract_input / len(per_paper)
+        print(f"Largest prompts (mean {mean_input:,.0f} input tokens per paper):")
+        for p in estimate["largest_prompts"]:
+            print(f"  {p['paper_id']:<48} {p['input_tokens']:>8,} tokens  {p['chunks_sent']}/{p['chunks_available']} chunks")
+    if args.json_out:
+        out_path = Path(args.json_out)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(json.dumps(estimate, indent=2), encoding="utf-8")
+        print(f"Wrote {out_path.as_posix()}")
+
+
+if __name__ == "__main__":
+    main()
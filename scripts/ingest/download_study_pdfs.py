@@ -2,32 +2,63 @@
 from __future__ import annotations
 
 import argparse
+import codecs
 import csv
 import hashlib
+import html
 import json
+import os
 import re
 import sys
+import threading
 import time
-from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 from urllib.parse import quote, urljoin
 
 import requests
-try:
-    from bs4 import BeautifulSoup
-except ImportError:  # optional fallback: DOI landing-page HTML parsing will be skipped
-    BeautifulSoup = None  # type: ignore[assignment]
+from eutils_client import esummary_sync
+from resolution_cache import ResolutionCache, is_cacheable_failure
+from telemetry import Telemetry, format_summary, http_calls, record_http
+from transport import DEFAULT_MAX_RETRIES, DEFAULT_POOL_SIZE, HostRateLimiter, build_session, shared_session
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from grey_search.utils.log import add_metrics_args, metrics_from_args  # noqa: E402
+from pdf_store import PdfStore  # noqa: E402
 
 
 ROOT = Path(__file__).resolve().parents[2]
 DEFAULT_INPUT = ROOT / "data" / "calibration-set" / "set-from-caresearchhub" / "qol_timepoint_matrix_timepoints.csv"
 DEFAULT_OUTDIR = ROOT / "data" / "pdfs" / "calibration-set" / "caresearchhub"
 DEFAULT_MANIFEST = DEFAULT_OUTDIR / "download_manifest.csv"
+DEFAULT_CACHE_DB = ROOT / "data" / "cache" / "pdf_resolution.sqlite"
 
-USER_AGENT = "QoL-cardiac-arrest-pdf-downloader/1.0 (+https://github.com/)"
 REQUEST_TIMEOUT = 45
 MIN_PDF_BYTES = 1024
+MAX_PDF_BYTES = 100 * 1024 * 1024
+
+# Landing-page scan: how far to look for PDF meta tags before giving up on <head>, and
+# how much of a page to read at most while looking for a PDF anchor.
+LANDING_META_ATTRS = ("citation_pdf_url", "wkhealth_pdf_url")
+LANDING_HEAD_MAX_BYTES = 512 * 1024
+LANDING_MAX_BYTES = 5 * 1024 * 1024
+LANDING_ANCHOR_TAIL_CHARS = 8 * 1024
+_HEAD_END_RE = re.compile(r"</head\s*>|<body\b", re.IGNORECASE)
+_META_TAG_RE = re.compile(r"<meta\b[^>]*>", re.IGNORECASE)
+_ANCHOR_RE = re.compile(r"<a\b([^>]*)>(.*?)</a\s*>", re.IGNORECASE | re.DOTALL)
+_ATTR_RE = re.compile(r"""([\w:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+EUROPE_PMC_SEARCH_POST_URL = "https://www.ebi.ac.uk/europepmc/webservices/rest/searchPOST"
+# esummary batches go to the E-utilities client (POST above 200 IDs); OR-ed Europe PMC
+# queries are kept well below its query-length limit.
+ESUMMARY_BATCH_SIZE = 200
+EUROPE_PMC_BATCH_SIZE = 100
+EUROPE_PMC_PAGE_SIZE = 1000
 
 
 @dataclass
@@ -106,33 +137,42 @@ def dedupe_citations(citations: Iterable[Citation]) -> List[Citation]:
     return out
 
 
-def build_session() -> requests.Session:
-    s = requests.Session()
-    s.headers.update({"User-Agent": USER_AGENT})
-    return s
+def record_response(resp: requests.Response) -> None:
+    """Report a resolver response (host, status, body size) to the telemetry of the lookup in progress."""
+    try:
+        n_bytes = len(resp.content)
+    except Exception:
+        n_bytes = 0
+    record_http(str(resp.url), resp.status_code, n_bytes)
 
 
 def get_json(session: requests.Session, url: str, params: Optional[Dict[str, str]] = None) -> Optional[dict]:
     try:
         resp = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+    except Exception:
+        record_http(url, None)
+        return None
+    record_response(resp)
+    try:
+        if resp.status_code == 404:
+            return {}  # the API answered: it has no record for this identifier
         resp.raise_for_status()
         return resp.json()
     except Exception:
         return None
 
 
-def get_pubmed_article_ids(session: requests.Session, pmid: str) -> Dict[str, str]:
-    data = get_json(
-        session,
-        "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi",
-        params={"db": "pubmed", "id": pmid, "retmode": "json"},
-    )
-    if not data:
-        return {}
-    result = data.get("result", {}).get(pmid, {})
-    articleids = result.get("articleids", []) or []
+# Resolvers return None when the lookup itself failed (network/HTTP error) and an empty
+# result when it succeeded but found nothing, so only real answers end up in the cache.
+def get_pubmed_article_ids(pmid: str) -> Optional[Dict[str, str]]:
+    # E-utilities go through the shared NCBI client (rate limit, retries, one connection pool).
+    answers = bulk_pubmed_article_ids([pmid])
+    return None if answers is None else answers.get(pmid, {})
+
+
+def esummary_article_ids(result: dict) -> Dict[str, str]:
     found: Dict[str, str] = {}
-    for item in articleids:
+    for item in result.get("articleids", []) or []:
         idtype = str(item.get("idtype", "")).lower()
         value = str(item.get("value", "")).strip()
         if idtype and value:
@@ -147,11 +187,11 @@ def pmcid_to_pdf_url(pmcid: str) -> str:
     return f"https://pmc.ncbi.nlm.nih.gov/articles/{pmcid}/pdf/"
 
 
-def resolve_from_unpaywall(session: requests.Session, doi: str, email: str) -> List[ResolutionCandidate]:
+def resolve_from_unpaywall(session: requests.Session, doi: str, email: str) -> Optional[List[ResolutionCandidate]]:
     url = f"https://api.unpaywall.org/v2/{quote(doi, safe='')}"
     data = get_json(session, url, params={"email": email})
-    if not data:
-        return []
+    if data is None:
+        return None
     candidates: List[ResolutionCandidate] = []
     best = data.get("best_oa_location") or {}
     best_pdf = normalize_ws(best.get("url_for_pdf", ""))
@@ -167,10 +207,10 @@ def resolve_from_unpaywall(session: requests.Session, doi: str, email: str) -> L
     return unique_candidates(candidates)
 
 
-def resolve_from_crossref(session: requests.Session, doi: str) -> List[ResolutionCandidate]:
+def resolve_from_crossref(session: requests.Session, doi: str) -> Optional[List[ResolutionCandidate]]:
     data = get_json(session, f"https://api.crossref.org/works/{quote(doi, safe='')}")
-    if not data:
-        return []
+    if data is None:
+        return None
     msg = data.get("message", {}) or {}
     candidates: List[ResolutionCandidate] = []
     for link in msg.get("link", []) or []:
@@ -185,7 +225,26 @@ def resolve_from_crossref(session: requests.Session, doi: str) -> List[Resolutio
     return unique_candidates(candidates)
 
 
-def resolve_from_europe_pmc(session: requests.Session, pmid: str = "", doi: str = "") -> List[ResolutionCandidate]:
+def europe_pmc_result_candidates(result: dict) -> List[ResolutionCandidate]:
+    candidates: List[ResolutionCandidate] = []
+    pmcid = normalize_ws(result.get("pmcid", ""))
+    if pmcid:
+        candidates.append(ResolutionCandidate(pmcid_to_pdf_url(pmcid), "europepmc.pmcid"))
+
+    for fulltext in result.get("fullTextUrlList", {}).get("fullTextUrl", []) or []:
+        ft_url = normalize_ws((fulltext or {}).get("url", ""))
+        document_style = normalize_ws((fulltext or {}).get("documentStyle", "")).lower()
+        availability = normalize_ws((fulltext or {}).get("availability", "")).lower()
+        if ft_url:
+            method = "europepmc.fullTextUrl"
+            note = ",".join([x for x in [document_style, availability] if x])
+            candidates.append(ResolutionCandidate(ft_url, method, note=note))
+    return candidates
+
+
+def resolve_from_europe_pmc(
+    session: requests.Session, pmid: str = "", doi: str = ""
+) -> Optional[List[ResolutionCandidate]]:
     queries: List[str] = []
     if pmid:
         queries.append(f"EXT_ID:{pmid} AND SRC:MED")
@@ -193,69 +252,120 @@ def resolve_from_europe_pmc(session: requests.Session, pmid: str = "", doi: str
         queries.append(f'DOI:"{doi}"')
 
     all_candidates: List[ResolutionCandidate] = []
+    failed = False
     for query in queries:
         data = get_json(
             session,
             "https://www.ebi.ac.uk/europepmc/webservices/rest/search",
             params={"query": query, "format": "json", "pageSize": "1"},
         )
-        if not data:
+        if data is None:
+            failed = True
             continue
         results = (data.get("resultList") or {}).get("result", []) or []
         if not results:
             continue
-        result = results[0] or {}
-        pmcid = normalize_ws(result.get("pmcid", ""))
-        if pmcid:
-            all_candidates.append(ResolutionCandidate(pmcid_to_pdf_url(pmcid), "europepmc.pmcid"))
-
-        for fulltext in result.get("fullTextUrlList", {}).get("fullTextUrl", []) or []:
-            ft_url = normalize_ws((fulltext or {}).get("url", ""))
-            document_style = normalize_ws((fulltext or {}).get("documentStyle", "")).lower()
-            availability = normalize_ws((fulltext or {}).get("availability", "")).lower()
-            if ft_url:
-                method = "europepmc.fullTextUrl"
-                note = ",".join([x for x in [document_style, availability] if x])
-                all_candidates.append(ResolutionCandidate(ft_url, method, note=note))
+        all_candidates.extend(europe_pmc_result_candidates(results[0] or {}))
+    if failed and not all_candidates:
+        return None
     return unique_candidates(all_candidates)
 
 
-def resolve_from_doi_landing(session: requests.Session, doi: str) -> List[ResolutionCandidate]:
-    candidates: List[ResolutionCandidate] = []
-    if BeautifulSoup is None:
-        return []
+def tag_attrs(tag: str) -> Dict[str, str]:
+    attrs: Dict[str, str] = {}
+    for m in _ATTR_RE.finditer(tag):
+        value = next((g for g in m.group(2, 3, 4) if g is not None), "")
+        attrs.setdefault(m.group(1).lower(), html.unescape(value).strip())
+    return attrs
+
+
+def scan_landing_page(texts: Iterable[str], base_url: str) -> List[ResolutionCandidate]:
+    """
+    Scan landing-page HTML as it streams in. PDF-looking anchors are collected
+    throughout, but until </head> (or <body>) citation_pdf_url/wkhealth_pdf_url
+    meta tags take precedence and reading stops at the first one. After that,
+    reading stops after the first chunk that contains an anchor. Only a short
+    unprocessed tail of the page is ever kept in memory.
+    """
+    buf = ""
+    in_head = True
+    seen_bytes = 0
+    anchors: List[ResolutionCandidate] = []
+    for text in texts:
+        buf += text
+        seen_bytes += len(text)
+        last_end = 0
+        for m in _ANCHOR_RE.finditer(buf):
+            last_end = m.end()
+            href = tag_attrs(f"<a {m.group(1)}>").get("href", "")
+            if not href:
+                continue
+            href = urljoin(base_url, href)
+            label = normalize_ws(html.unescape(_TAG_RE.sub(" ", m.group(2)))).lower()
+            if ".pdf" in href.lower() or "download pdf" in label or label == "pdf":
+                anchors.append(ResolutionCandidate(href, "doi.landing.anchor", note=label))
+        if in_head:
+            metas: List[ResolutionCandidate] = []
+            head_end = _HEAD_END_RE.search(buf)
+            for m in _META_TAG_RE.finditer(buf, 0, head_end.start() if head_end else len(buf)):
+                attrs = tag_attrs(m.group(0))
+                name = attrs.get("name", "").lower()
+                if name in LANDING_META_ATTRS and attrs.get("content"):
+                    metas.append(ResolutionCandidate(urljoin(base_url, attrs["content"]), f"doi.landing.meta.{name}"))
+            if metas:
+                return unique_candidates(metas)
+            in_head = head_end is None and seen_bytes < LANDING_HEAD_MAX_BYTES
+        if anchors and not in_head:
+            return unique_candidates(anchors)
+        if seen_bytes >= LANDING_MAX_BYTES:
+            break
+        # Carry over a possibly unfinished <meta>/<a ...>...</a>, bounded so anchor-free pages stay cheap.
+        buf = buf[max(last_end, len(buf) - LANDING_ANCHOR_TAIL_CHARS) :]
+    return unique_candidates(anchors)
+
+
+def resolve_from_doi_landing(session: requests.Session, doi: str) -> Optional[List[ResolutionCandidate]]:
+    url = f"https://doi.org/{quote(doi, safe='/')}"
     try:
-        resp = session.get(f"https://doi.org/{quote(doi, safe='/')}", timeout=REQUEST_TIMEOUT, allow_redirects=True)
+        resp = session.get(url, timeout=REQUEST_TIMEOUT, allow_redirects=True, stream=True)
     except Exception:
-        return []
-
-    final_url = str(resp.url)
-    content_type = (resp.headers.get("content-type") or "").lower()
-
-    if is_pdf_response(resp):
-        candidates.append(ResolutionCandidate(final_url, "doi.redirect.direct_pdf", note=content_type))
-        return unique_candidates(candidates)
-
-    if "html" not in content_type and not resp.text:
-        return []
-
-    soup = BeautifulSoup(resp.text, "lxml")
-
-    for attr in ["citation_pdf_url", "wkhealth_pdf_url"]:
-        meta = soup.find("meta", attrs={"name": attr})
-        if meta and meta.get("content"):
-            candidates.append(
-                ResolutionCandidate(urljoin(final_url, str(meta["content"]).strip()), f"doi.landing.meta.{attr}")
-            )
-
-    for a in soup.find_all("a", href=True):
-        href = urljoin(final_url, a["href"].strip())
-        text = normalize_ws(a.get_text(" ", strip=True)).lower()
-        href_lower = href.lower()
-        if ".pdf" in href_lower or "download pdf" in text or text == "pdf":
-            candidates.append(ResolutionCandidate(href, "doi.landing.anchor", note=text))
-
-    return unique_candidates(candidates)
+        record_http(url, None)
+        return None
+    n_read = 0
+    try:
+        if resp.status_code >= 500 or resp.status_code == 429:
+            return None
+
+        final_url = str(resp.url)
+        content_type = (resp.headers.get("content-type") or "").lower()
+        direct_pdf = [ResolutionCandidate(final_url, "doi.redirect.direct_pdf", note=content_type)]
+        if "application/pdf" in content_type:
+            return direct_pdf
+
+        chunks = resp.iter_content(chunk_size=16 * 1024)
+        first = next((c for c in chunks if c), b"")
+        n_read = len(first)
+        if first.startswith(b"%PDF"):
+            return direct_pdf
+        if "html" not in content_type and not first:
+            return []
+
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        def texts() -> Iterator[str]:
+            nonlocal n_read
+            yield decoder.decode(first)
+            for chunk in chunks:
+                if chunk:
+                    n_read += len(chunk)
+                    yield decoder.decode(chunk)
+
+        return scan_landing_page(texts(), final_url)
+    except requests.RequestException:
+        return None
+    finally:
+        record_http(str(resp.url), resp.status_code, n_read)
+        resp.close()
 
 
 def unique_candidates(candidates: Sequence[ResolutionCandidate]) -> List[ResolutionCandidate]:
@@ -270,21 +380,25 @@ def unique_candidates(candidates: Sequence[ResolutionCandidate]) -> List[Resolut
     return out
 
 
-def is_pdf_response(resp: requests.Response) -> bool:
-    ctype = (resp.headers.get("content-type") or "").lower()
-    if "application/pdf" in ctype:
-        return True
-    head = resp.content[:8] if resp.content is not None else b""
-    return head.startswith(b"%PDF")
-
-
 def looks_like_pdf_bytes(data: bytes, content_type: str) -> bool:
     if "application/pdf" in (content_type or "").lower():
         return True
     return data.startswith(b"%PDF")
 
 
-def download_pdf(session: requests.Session, candidate: ResolutionCandidate, dest: Path, overwrite: bool) -> Dict[str, str]:
+def download_pdf(
+    session: requests.Session,
+    candidate: ResolutionCandidate,
+    dest: Path,
+    overwrite: bool,
+    store: Optional[PdfStore] = None,
+    aliases: Sequence[str] = (),
+) -> Dict[str, str]:
+    """
+    Download one candidate. Without a store the PDF is written to `dest`; with a
+    store it is filed under objects/<sha256>.pdf (temp file next to `dest`) and
+    `aliases` are pointed at it, with dest.stem as the paper_id for new content.
+    """
     if dest.exists() and not overwrite:
         return {
             "status": "skipped_exists",
@@ -302,59 +416,69 @@ def download_pdf(session: requests.Session, candidate: ResolutionCandidate, dest
     content_type = (resp.headers.get("content-type") or "").lower()
     status_code = str(resp.status_code)
     if resp.status_code >= 400:
-        return {
-            "status": "error",
-            "reason": "http_error",
-            "http_status": status_code,
-            "content_type": content_type,
-            "source_url": str(resp.url),
-            "resolution_method": candidate.method,
-        }
-
-    chunks: List[bytes] = []
-    total = 0
-    try:
-        for chunk in resp.iter_content(chunk_size=64 * 1024):
-            if not chunk:
-                continue
-            chunks.append(chunk)
-            total += len(chunk)
-            if total > 100 * 1024 * 1024:
-                return {
-                    "status": "error",
-                    "reason": "file_too_large",
-                    "http_status": status_code,
-                    "content_type": content_type,
-                    "source_url": str(resp.url),
-                    "resolution_method": candidate.method,
-                }
-    finally:
+        # Release the streamed connection back to the shared pool.
         resp.close()
-
-    data = b"".join(chunks)
-    if len(data) < MIN_PDF_BYTES:
         return {
             "status": "error",
-            "reason": "response_too_small",
+            "reason": "http_error",
             "http_status": status_code,
             "content_type": content_type,
             "source_url": str(resp.url),
             "resolution_method": candidate.method,
         }
 
-    if not looks_like_pdf_bytes(data, content_type):
+    def failure(reason: str) -> Dict[str, str]:
         return {
             "status": "error",
-            "reason": "not_pdf",
+            "reason": reason,
             "http_status": status_code,
             "content_type": content_type,
             "source_url": str(resp.url),
             "resolution_method": candidate.method,
         }
 
+    # Stream into a temp file next to dest and hash as we go, so memory per download stays at one
+    # chunk; the file only appears under its final name via an atomic rename once it is complete.
     dest.parent.mkdir(parents=True, exist_ok=True)
-    dest.write_bytes(data)
-    sha256 = hashlib.sha256(data).hexdigest()
+    tmp_path = dest.with_name(f".{dest.name}.{os.getpid()}.{threading.get_ident()}.part")
+    digest = hashlib.sha256()
+    head = b""
+    total = 0
+    reason = ""
+    try:
+        with open(tmp_path, "wb") as fh:
+            for chunk in resp.iter_content(chunk_size=64 * 1024):
+                if not chunk:
+                    continue
+                if len(head) < 4:
+                    head += chunk[: 4 - len(head)]
+                    if len(head) >= 4 and not looks_like_pdf_bytes(head, content_type):
+                        reason = "not_pdf"
+                        break
+                fh.write(chunk)
+                digest.update(chunk)
+                total += len(chunk)
+                if total > MAX_PDF_BYTES:
+                    reason = "file_too_large"
+                    break
+        if not reason and total < MIN_PDF_BYTES:
+            reason = "response_too_small"
+        elif not reason and not looks_like_pdf_bytes(head, content_type):
+            reason = "not_pdf"
+        if reason:
+            return failure(reason)
+        if store is not None:
+            dest = store.add_file(tmp_path, digest.hexdigest(), aliases, paper_id=dest.stem)
+        else:
+            os.replace(tmp_path, dest)
+    except OSError as e:
+        return failure(f"write_failed:{type(e).__name__}")
+    except requests.RequestException as e:
+        return failure(f"request_failed:{type(e).__name__}")
+    finally:
+        resp.close()
+        tmp_path.unlink(missing_ok=True)
+
     return {
         "status": "downloaded",
         "reason": "",
@@ -363,38 +487,278 @@ def download_pdf(session: requests.Session, candidate: ResolutionCandidate, dest
         "resolution_method": candidate.method,
         "http_status": status_code,
         "content_type": content_type,
-        "bytes": str(len(data)),
-        "sha256": sha256,
+        "bytes": str(total),
+        "sha256": digest.hexdigest(),
     }
 
 
-def resolve_candidates(session: requests.Session, citation: Citation, unpaywall_email: str) -> Tuple[List[ResolutionCandidate], Dict[str, str]]:
-    meta: Dict[str, str] = {}
-    candidates: List[ResolutionCandidate] = []
+class ResolverContext:
+    """
+    Shared state for resolving citations: the resolver thread pool, the per-host
+    rate limiter, the optional resolution cache and telemetry, and the HTTP
+    session all threads share (so its pool bounds connections per host).
+    """
+
+    def __init__(
+        self,
+        pool: ThreadPoolExecutor,
+        limiter: HostRateLimiter,
+        unpaywall_email: str = "",
+        cache: Optional[ResolutionCache] = None,
+        session: Optional[requests.Session] = None,
+        telemetry: Optional[Telemetry] = None,
+    ):
+        self.pool = pool
+        self.limiter = limiter
+        self._session = session or build_session(limiter)
+        self.unpaywall_email = unpaywall_email
+        self.cache = cache
+        # Answers filled in by the bulk prefetch phase, keyed like the cache: (resolver, DOI/PMID).
+        self.prefetched: Dict[Tuple[str, str], Any] = {}
+        self._from_cache: set[Tuple[str, str]] = set()
+        self.telemetry = telemetry
+
+    def session(self) -> requests.Session:
+        return self._session
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        return self.pool.submit(lambda: fn(self.session(), *args, **kwargs))
+
+    def known(self, resolver: str, key: str) -> bool:
+        """True if an answer is already prefetched or cached (cached answers are pulled into memory)."""
+        if (resolver, key) in self.prefetched:
+            return True
+        if self.cache is not None:
+            cached = self.cache.get(resolver, key)
+            if cached is not None:
+                self.prefetched[(resolver, key)] = decode_resolver_result(cached)
+                self._from_cache.add((resolver, key))
+                return True
+        return False
+
+    def remember(self, resolver: str, key: str, result: Any) -> None:
+        self.prefetched[(resolver, key)] = result
+        if self.cache is not None:
+            self.cache.put(resolver, key, encode_resolver_result(result))
+
+    def resolve(self, resolver: str, key: str, fn, *args, **kwargs) -> Future:
+        """Like submit, but answers from the prefetch/cache when possible and stores successful lookups."""
+        if (resolver, key) in self.prefetched:
+            result = self.prefetched[(resolver, key)]
+            source = "cache" if (resolver, key) in self._from_cache else "prefetch"
+            self.record_resolver(resolver, key, source, 0.0, result)
+            done: Future = Future()
+            done.set_result(result)
+            return done
+        cache = self.cache
+
+        def run(session: requests.Session):
+            if cache is not None:
+                cached = cache.get(resolver, key)
+                if cached is not None:
+                    result = decode_resolver_result(cached)
+                    self.record_resolver(resolver, key, "cache", 0.0, result)
+                    return result
+            started = time.perf_counter()
+            with http_calls() as http:
+                result = fn(session, *args, **kwargs)
+            self.record_resolver(resolver, key, "network", (time.perf_counter() - started) * 1000, result, http)
+            if cache is not None and result is not None:
+                cache.put(resolver, key, encode_resolver_result(result))
+            return result
+
+        return self.submit(run)
+
+    def record_resolver(
+        self, resolver: str, key: str, source: str, latency_ms: float, result: Any, http: Sequence[Dict[str, Any]] = ()
+    ) -> None:
+        if self.telemetry is not None:
+            self.telemetry.resolver(resolver, key, source, latency_ms, result, http)
+
+
+def encode_resolver_result(result: Any) -> Any:
+    if isinstance(result, list):
+        return [asdict(c) for c in result]
+    return result
+
+
+def decode_resolver_result(payload: Any) -> Any:
+    if isinstance(payload, list):
+        return [ResolutionCandidate(**c) for c in payload]
+    return payload
+
+
+def chunked(items: Sequence[str], size: int) -> Iterator[List[str]]:
+    for start in range(0, len(items), size):
+        yield list(items[start : start + size])
+
+
+def post_json(session: requests.Session, url: str, data: Dict[str, str]) -> Optional[dict]:
+    try:
+        resp = session.post(url, data=data, timeout=REQUEST_TIMEOUT)
+    except Exception:
+        record_http(url, None)
+        return None
+    record_response(resp)
+    try:
+        resp.raise_for_status()
+        return resp.json()
+    except Exception:
+        return None
 
+
+def bulk_pubmed_article_ids(pmids: Sequence[str]) -> Optional[Dict[str, Dict[str, str]]]:
+    result = esummary_sync("pubmed", pmids)
+    if result is None:
+        return None
+    return {pmid: esummary_article_ids(result.get(pmid, {}) or {}) for pmid in pmids}
+
+
+def bulk_europe_pmc(
+    session: requests.Session, field: str, values: Sequence[str]
+) -> Optional[Dict[str, List[ResolutionCandidate]]]:
+    """
+    One OR-ed Europe PMC query for a batch of PMIDs (field="pmid") or DOIs
+    (field="doi"). Returns candidates per lower-cased identifier; identifiers
+    with no match map to [] and the whole batch maps to None if a page fails.
+    """
+    if field == "pmid":
+        query = "(" + " OR ".join(f"EXT_ID:{v}" for v in values) + ") AND SRC:MED"
+    else:
+        query = " OR ".join(f'DOI:"{v}"' for v in values)
+    found: Dict[str, List[ResolutionCandidate]] = {v.lower(): [] for v in values}
+    matched: set[str] = set()
+    cursor = "*"
+    while True:
+        data = post_json(
+            session,
+            EUROPE_PMC_SEARCH_POST_URL,
+            {"query": query, "format": "json", "pageSize": str(EUROPE_PMC_PAGE_SIZE), "cursorMark": cursor},
+        )
+        if data is None:
+            return None
+        results = (data.get("resultList") or {}).get("result", []) or []
+        for result in results:
+            key = normalize_ws((result or {}).get(field, "")).lower()
+            # First hit per identifier wins, matching the single lookups (pageSize=1).
+            if key in found and key not in matched:
+                matched.add(key)
+                found[key] = unique_candidates(europe_pmc_result_candidates(result))
+        next_cursor = data.get("nextCursorMark") or ""
+        if not results or not next_cursor or next_cursor == cursor:
+            return found
+        cursor = next_cursor
+
+
+def prefetch_identifiers(ctx: ResolverContext, citations: Sequence[Citation]) -> Dict[str, int]:
+    """
+    Bulk pre-resolution phase: batched esummary calls and OR-ed Europe PMC
+    searches for every PMID/DOI that is neither prefetched nor cached yet.
+    Answers land in ctx.prefetched (and the cache), so iter_candidates only goes
+    to the network per citation for batches that failed.
+    """
+    session = ctx.session()
+    stats = {"esummary_requests": 0, "europepmc_requests": 0, "answers": 0}
+
+    def missing(resolver: str, keys: Iterable[str]) -> List[str]:
+        return sorted({k for k in keys if k and not ctx.known(resolver, k)})
+
+    for batch in chunked(missing("esummary", (c.pmid for c in citations)), ESUMMARY_BATCH_SIZE):
+        stats["esummary_requests"] += 1
+        started = time.perf_counter()
+        answers = bulk_pubmed_article_ids(batch)
+        if ctx.telemetry is not None:
+            ctx.telemetry.batch("esummary", len(batch), (time.perf_counter() - started) * 1000, answers is not None)
+        for pmid, ids in (answers or {}).items():
+            ctx.remember("esummary", pmid, ids)
+            stats["answers"] += 1
+
+    dois: List[str] = []
+    for c in citations:
+        doi = c.doi
+        if not doi and c.pmid:
+            doi = normalize_doi((ctx.prefetched.get(("esummary", c.pmid)) or {}).get("doi", ""))
+        # Quotes would break the OR-ed phrase query; such DOIs fall back to single lookups.
+        if doi and '"' not in doi:
+            dois.append(doi.lower())
+
+    for resolver, field, keys in (
+        ("europepmc.pmid", "pmid", missing("europepmc.pmid", (c.pmid for c in citations))),
+        ("europepmc.doi", "doi", missing("europepmc.doi", dois)),
+    ):
+        for batch in chunked(keys, EUROPE_PMC_BATCH_SIZE):
+            stats["europepmc_requests"] += 1
+            started = time.perf_counter()
+            with http_calls() as http:
+                answers = bulk_europe_pmc(session, field, batch)
+            if ctx.telemetry is not None:
+                latency_ms = (time.perf_counter() - started) * 1000
+                ctx.telemetry.batch(resolver, len(batch), latency_ms, answers is not None, http)
+            for key, candidates in (answers or {}).items():
+                ctx.remember(resolver, key, candidates)
+                stats["answers"] += 1
+    return stats
+
+
+def iter_candidates(ctx: ResolverContext, citation: Citation, meta: Dict[str, str]) -> Iterator[ResolutionCandidate]:
+    """
+    Fan out to the resolvers concurrently and yield their candidates in priority
+    order (PubMed esummary PMC link, Europe PMC, Unpaywall, Crossref, DOI landing
+    page) as soon as each one is available. The landing-page scrape is only
+    started once every cheaper resolver is exhausted. Closing the generator
+    (the caller stops after a successful download) cancels pending resolver calls.
+    """
     pmid = citation.pmid
     doi = citation.doi
+    pending: List[Future] = []
+    seen: set[str] = set()
 
-    if pmid:
-        ids = get_pubmed_article_ids(session, pmid)
-        if not doi and ids.get("doi"):
-            doi = normalize_doi(ids.get("doi", ""))
-            meta["resolved_doi_from_pmid"] = doi
-        pmcid = normalize_ws(ids.get("pmc", "")) or normalize_ws(ids.get("pmcid", ""))
-        if pmcid:
-            candidates.append(ResolutionCandidate(pmcid_to_pdf_url(pmcid), "pubmed.esummary.pmcid"))
-            meta["pmcid"] = pmcid
-
-    candidates.extend(resolve_from_europe_pmc(session, pmid=pmid, doi=doi))
-
-    if doi and unpaywall_email:
-        candidates.extend(resolve_from_unpaywall(session, doi, unpaywall_email))
-
-    if doi:
-        candidates.extend(resolve_from_crossref(session, doi))
-        candidates.extend(resolve_from_doi_landing(session, doi))
+    def submit(resolver: str, key: str, fn, *args, **kwargs) -> Future:
+        future = ctx.resolve(resolver, key, fn, *args, **kwargs)
+        pending.append(future)
+        return future
+
+    def submit_doi_resolvers(doi_value: str) -> List[Future]:
+        key = doi_value.lower()
+        futures = [submit("europepmc.doi", key, resolve_from_europe_pmc, doi=doi_value)]
+        if ctx.unpaywall_email:
+            futures.append(submit("unpaywall", key, resolve_from_unpaywall, doi_value, ctx.unpaywall_email))
+        futures.append(submit("crossref", key, resolve_from_crossref, doi_value))
+        return futures
+
+    def fresh(candidates: Optional[Iterable[ResolutionCandidate]]) -> Iterator[ResolutionCandidate]:
+        for cand in candidates or []:
+            key = cand.url.strip()
+            if key and key not in seen:
+                seen.add(key)
+                yield cand
 
-    return unique_candidates(candidates), meta
+    try:
+        esummary = submit("esummary", pmid, lambda _session, p: get_pubmed_article_ids(p), pmid) if pmid else None
+        europe_pmc_by_pmid = submit("europepmc.pmid", pmid, resolve_from_europe_pmc, pmid=pmid) if pmid else None
+        doi_futures = submit_doi_resolvers(doi) if doi else []
+
+        if esummary is not None:
+            ids = esummary.result() or {}
+            if not doi and ids.get("doi"):
+                doi = normalize_doi(ids.get("doi", ""))
+                meta["resolved_doi_from_pmid"] = doi
+                doi_futures = submit_doi_resolvers(doi)
+            pmcid = normalize_ws(ids.get("pmc", "")) or normalize_ws(ids.get("pmcid", ""))
+            if pmcid:
+                meta["pmcid"] = pmcid
+                yield from fresh([ResolutionCandidate(pmcid_to_pdf_url(pmcid), "pubmed.esummary.pmcid")])
+
+        if europe_pmc_by_pmid is not None:
+            yield from fresh(europe_pmc_by_pmid.result())
+        for future in doi_futures:
+            yield from fresh(future.result())
+
+        if doi:
+            yield from fresh(submit("doi_landing", doi.lower(), resolve_from_doi_landing, doi).result())
+    finally:
+        for future in pending:
+            future.cancel()
 
 
 MANIFEST_FIELDS = [
@@ -412,7 +776,7 @@ MANIFEST_FIELDS = [
     "content_type",
     "bytes",
     "sha256",
-    "candidate_count",
+    "candidates_tried",
     "notes",
 ]
 
@@ -435,85 +799,232 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--manifest-csv", type=Path, default=DEFAULT_MANIFEST)
     p.add_argument("--unpaywall-email", default="", help="Email for Unpaywall API (improves OA resolution for DOI rows).")
     p.add_argument("--overwrite", action="store_true")
-    p.add_argument("--sleep-seconds", type=float, default=0.3, help="Pause between records.")
+    p.add_argument(
+        "--sleep-seconds",
+        type=float,
+        default=0.3,
+        help="Pause between records in serial mode (--workers 1). Per-host rate limits always apply.",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of citations resolved and downloaded concurrently (default: 1, serial).",
+    )
+    p.add_argument(
+        "--pool-size",
+        type=int,
+        default=DEFAULT_POOL_SIZE,
+        help="Keep-alive connections kept per host, shared by all workers.",
+    )
+    p.add_argument(
+        "--max-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help="Retries with backoff for connection errors and HTTP 429/5xx (Retry-After is honoured).",
+    )
+    p.add_argument(
+        "--http2",
+        action="store_true",
+        help="Use one shared HTTP/2 client (requires httpx[http2]) so concurrent requests per host multiplex.",
+    )
+    p.add_argument(
+        "--telemetry-jsonl",
+        type=Path,
+        default=None,
+        help="Per-request telemetry JSONL (default: download_telemetry.jsonl next to the manifest).",
+    )
     p.add_argument("--limit", type=int, default=0, help="Optional max number of unique records to process.")
     p.add_argument("--print-candidates", action="store_true", help="Print candidate URLs before download attempts.")
+    p.add_argument(
+        "--cache-db",
+        type=Path,
+        default=DEFAULT_CACHE_DB,
+        help="SQLite cache of resolver answers and recently failed PDF URLs.",
+    )
+    p.add_argument(
+        "--loose-files",
+        action="store_true",
+        help="Write <doi/pmid slug>.pdf files instead of the content-addressed store (objects/<sha256>.pdf + aliases.json).",
+    )
+    p.add_argument(
+        "--no-prefetch",
+        action="store_true",
+        help="Skip the bulk esummary/Europe PMC phase and resolve every citation individually.",
+    )
+    p.add_argument("--no-cache", action="store_true", help="Do not read or write the resolution cache.")
+    p.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Ignore cached entries (re-query every resolver) but store the fresh answers.",
+    )
+    add_metrics_args(p)
     return p.parse_args()
 
 
+def citation_aliases(citation: Citation, meta: Dict[str, str]) -> List[str]:
+    aliases = [f"stem:{file_stem_for(citation)}"]
+    for doi in (citation.doi, meta.get("resolved_doi_from_pmid", "")):
+        if doi:
+            aliases.append(f"doi:{doi.lower()}")
+    if citation.pmid:
+        aliases.append(f"pmid:{citation.pmid}")
+    return aliases
+
+
+def process_citation(
+    ctx: ResolverContext, citation: Citation, args: argparse.Namespace, store: Optional[PdfStore] = None
+) -> Dict[str, str]:
+    meta: Dict[str, str] = {}
+    base = {
+        "row_num": str(citation.row_num),
+        "id": citation.source_id,
+        "doi": citation.doi,
+        "pmid": citation.pmid,
+        "title": citation.title,
+    }
+
+    result: Dict[str, str] = {
+        "status": "unresolved",
+        "reason": "no_pdf_candidate_found",
+    }
+    dest = args.output_dir / f"{file_stem_for(citation)}.pdf"
+    if store is not None and not args.overwrite:
+        stored = store.lookup(citation_aliases(citation, meta))
+        if stored is not None:
+            # Already in the store under one of this citation's identifiers: no resolver calls needed.
+            return {**base, "status": "skipped_exists", "reason": "in_store", "pdf_path": str(stored)}
+    session = ctx.session()
+    tried = 0
+    skipped_failed = 0
+    candidates = iter_candidates(ctx, citation, meta)
+    try:
+        for cand in candidates:
+            failed_reason = ctx.cache.failed_reason(cand.url) if ctx.cache is not None else ""
+            if failed_reason:
+                skipped_failed += 1
+                continue
+            tried += 1
+            if args.print_candidates:
+                print(f"  - row={citation.row_num} {cand.method}: {cand.url}")
+            started = time.perf_counter()
+            try:
+                result = download_pdf(
+                    session, cand, dest, overwrite=args.overwrite, store=store, aliases=citation_aliases(citation, meta)
+                )
+            except Exception as e:
+                # A failed download must not end resolution; move on to the next candidate.
+                result = {"status": "download_error", "reason": f"download_exception:{type(e).__name__}"}
+            if ctx.telemetry is not None:
+                ctx.telemetry.download(cand.method, cand.url, (time.perf_counter() - started) * 1000, result)
+            if result.get("status") in {"downloaded", "skipped_exists"}:
+                break
+            if ctx.cache is not None and is_cacheable_failure(result):
+                ctx.cache.mark_failed(cand.url, result.get("reason", ""))
+    except Exception as e:
+        result = {
+            "status": "error",
+            "reason": f"resolution_exception:{type(e).__name__}",
+        }
+    finally:
+        candidates.close()
+    if skipped_failed:
+        meta["skipped_recently_failed_urls"] = str(skipped_failed)
+        if not tried:
+            result = {"status": "unresolved", "reason": "candidates_recently_failed"}
+
+    return {
+        **base,
+        "candidates_tried": str(tried),
+        "notes": json.dumps(meta, sort_keys=True) if meta else "",
+        **result,
+    }
+
+
 def main() -> None:
     args = parse_args()
+    metrics = metrics_from_args("download_study_pdfs", args)
     if not args.input_csv.exists():
         raise SystemExit(f"Input CSV not found: {args.input_csv}")
 
-    citations = dedupe_citations(iter_citations(args.input_csv))
+    with metrics.span("load_citations"):
+        citations = dedupe_citations(iter_citations(args.input_csv))
     if args.limit and args.limit > 0:
         citations = citations[: args.limit]
 
-    session = build_session()
-    manifest_rows: List[Dict[str, str]] = []
-
-    total = len(citations)
-    for i, citation in enumerate(citations, start=1):
-        notes: List[str] = []
-        print(f"[{i}/{total}] row={citation.row_num} doi={citation.doi or '-'} pmid={citation.pmid or '-'}")
-
-        try:
-            candidates, meta = resolve_candidates(session, citation, args.unpaywall_email)
-            if meta:
-                notes.append(json.dumps(meta, sort_keys=True))
-        except Exception as e:
-            manifest_rows.append(
-                {
-                    "row_num": str(citation.row_num),
-                    "id": citation.source_id,
-                    "doi": citation.doi,
-                    "pmid": citation.pmid,
-                    "title": citation.title,
-                    "status": "error",
-                    "reason": f"resolution_exception:{type(e).__name__}",
-                    "candidate_count": "0",
-                    "notes": "; ".join(notes),
-                }
-            )
-            continue
-
-        if args.print_candidates:
-            for cand in candidates:
-                print(f"  - {cand.method}: {cand.url}")
-
-        result: Dict[str, str] = {
-            "status": "unresolved",
-            "reason": "no_pdf_candidate_found",
-        }
-        dest = args.output_dir / f"{file_stem_for(citation)}.pdf"
-        for cand in candidates:
-            result = download_pdf(session, cand, dest, overwrite=args.overwrite)
-            if result.get("status") in {"downloaded", "skipped_exists"}:
-                break
-
-        manifest_rows.append(
-            {
-                "row_num": str(citation.row_num),
-                "id": citation.source_id,
-                "doi": citation.doi,
-                "pmid": citation.pmid,
-                "title": citation.title,
-                "candidate_count": str(len(candidates)),
-                "notes": "; ".join(notes),
-                **result,
-            }
+    store = None if args.loose_files else PdfStore(args.output_dir)
+    telemetry_path = args.telemetry_jsonl or args.manifest_csv.with_name("download_telemetry.jsonl")
+    telemetry = Telemetry(telemetry_path)
+    limiter = HostRateLimiter()
+    resolver_pool = ThreadPoolExecutor(max_workers=max(6, args.workers * 4))
+    cache = None if args.no_cache else ResolutionCache(args.cache_db, refresh=args.refresh_cache)
+    ctx = ResolverContext(
+        resolver_pool,
+        limiter,
+        unpaywall_email=args.unpaywall_email,
+        cache=cache,
+        session=shared_session(limiter, pool_size=args.pool_size, max_retries=args.max_retries, http2=args.http2),
+        telemetry=telemetry,
+    )
+    if not args.no_prefetch:
+        to_resolve = [
+            c for c in citations if store is None or args.overwrite or store.lookup(citation_aliases(c, {})) is None
+        ]
+        with metrics.span("prefetch"):
+            stats = prefetch_identifiers(ctx, to_resolve)
+        print(
+            f"Prefetch: {stats['esummary_requests']} esummary + {stats['europepmc_requests']} Europe PMC "
+            f"batch requests, {stats['answers']} identifier answers"
         )
-        if args.sleep_seconds > 0:
-            time.sleep(args.sleep_seconds)
-
-    write_manifest(args.manifest_csv, manifest_rows)
-    downloaded = sum(1 for r in manifest_rows if r.get("status") == "downloaded")
-    skipped = sum(1 for r in manifest_rows if r.get("status") == "skipped_exists")
-    unresolved = sum(1 for r in manifest_rows if r.get("status") not in {"downloaded", "skipped_exists"})
+    total = len(citations)
+    # Rows are stored by input position so the manifest order does not depend on completion order.
+    manifest_rows: List[Optional[Dict[str, str]]] = [None] * total
+
+    # cProfile sees only this thread, so --profile is most useful together with --workers 1.
+    with metrics.span("resolve_and_download", profile=True):
+        if args.workers <= 1:
+            for i, citation in enumerate(citations, start=1):
+                print(f"[{i}/{total}] row={citation.row_num} doi={citation.doi or '-'} pmid={citation.pmid or '-'}")
+                manifest_rows[i - 1] = process_citation(ctx, citation, args, store)
+                if args.sleep_seconds > 0:
+                    time.sleep(args.sleep_seconds)
+        else:
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                futures = {pool.submit(process_citation, ctx, c, args, store): idx for idx, c in enumerate(citations)}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    idx = futures[future]
+                    citation = citations[idx]
+                    row = future.result()
+                    manifest_rows[idx] = row
+                    print(
+                        f"[{done}/{total}] row={citation.row_num} doi={citation.doi or '-'} "
+                        f"pmid={citation.pmid or '-'} -> {row.get('status')}"
+                    )
+    resolver_pool.shutdown(wait=False, cancel_futures=True)
+
+    rows = [r for r in manifest_rows if r is not None]
+    with metrics.span("write_manifest"):
+        write_manifest(args.manifest_csv, rows)
+    downloaded = sum(1 for r in rows if r.get("status") == "downloaded")
+    skipped = sum(1 for r in rows if r.get("status") == "skipped_exists")
+    unresolved = sum(1 for r in rows if r.get("status") not in {"downloaded", "skipped_exists"})
     print(f"Completed: {total} studies | downloaded={downloaded} | skipped_exists={skipped} | unresolved={unresolved}")
     print(f"Manifest: {args.manifest_csv}")
+    if cache is not None:
+        print(f"Resolution cache: {cache.path} (hits={cache.hits}, misses={cache.misses})")
+
+    summary = telemetry.summary()
+    telemetry.close()
+    summary_path = telemetry_path.with_name(f"{telemetry_path.stem}_summary.json")
+    summary_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    for line in format_summary(summary):
+        print(line)
+    print(f"Telemetry: {telemetry_path} (summary: {summary_path})")
     print(f"PDF dir:   {args.output_dir}")
+    metrics.count("citations", total)
+    metrics.count("downloaded", downloaded)
+    metrics.count("unresolved", unresolved)
+    print("\n".join(metrics.close()))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+import httpx
+
+EUTILS_BASE = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+USER_AGENT = "QoL-cardiac-arrest-eutils/1.0 (+https://github.com/)"
+TOOL_NAME = "qol-cardiac-arrest"
+
+# NCBI allows 3 requests/second per IP without an API key and 10 with one.
+RATE_WITHOUT_KEY = 3.0
+RATE_WITH_KEY = 10.0
+REQUEST_TIMEOUT = 60.0
+MAX_RETRIES = 5
+RETRY_BACKOFF_SECONDS = 1.5
+MAX_RETRY_AFTER_SECONDS = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Above this many IDs esummary/efetch are sent as POST (NCBI recommendation).
+POST_ID_THRESHOLD = 200
+
+T = TypeVar("T")
+
+
+class RateLimiter:
+    """
+    Spaces requests evenly at `rate` per second. Slots are handed out under a
+    threading lock, so one limiter can be shared by worker threads and by
+    coroutines running in any of their event loops.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        return slot - now
+
+    def wait(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_LIMITERS: Dict[float, RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def shared_limiter(api_key: str = "") -> RateLimiter:
+    """The process-wide limiter for the applicable NCBI rate (one per key/no-key tier)."""
+    rate = RATE_WITH_KEY if api_key else RATE_WITHOUT_KEY
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(rate)
+        if limiter is None:
+            limiter = _LIMITERS[rate] = RateLimiter(rate)
+        return limiter
+
+
+def retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    if retry_after:
+        value = retry_after.strip()
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                seconds = -1.0
+        if seconds >= 0:
+            return min(seconds, MAX_RETRY_AFTER_SECONDS)
+    return RETRY_BACKOFF_SECONDS * (2**attempt)
+
+
+@dataclass
+class SearchResult:
+    count: int
+    webenv: str
+    query_key: str
+    ids: List[str]
+
+
+class EutilsClient:
+    """
+    Async NCBI E-utilities client: one httpx connection pool with gzip, the
+    shared per-process rate limiter, retries with backoff on 429/5xx (honouring
+    Retry-After and NCBI's "API rate limit exceeded" bodies), and history-server
+    (WebEnv) paging for esearch/efetch. Use as `async with EutilsClient() as c:`.
+    NCBI_API_KEY and NCBI_EMAIL are read from the environment.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        email: Optional[str] = None,
+        limiter: Optional[RateLimiter] = None,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.api_key = os.getenv("NCBI_API_KEY", "") if api_key is None else api_key
+        self.email = os.getenv("NCBI_EMAIL", "") if email is None else email
+        self.limiter = limiter or shared_limiter(self.api_key)
+        self.max_retries = max_retries
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def rate(self) -> float:
+        return 1.0 / self.limiter.interval
+
+    async def __aenter__(self) -> "EutilsClient":
+        self._client = httpx.AsyncClient(
+            base_url=EUTILS_BASE,
+            headers={"User-Agent": USER_AGENT, "Accept-Encoding": "gzip"},
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=int(self.rate) + 1),
+        )
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _params(self, params: Dict[str, str]) -> Dict[str, str]:
+        out = {"tool": TOOL_NAME, **params}
+        if self.email:
+            out["email"] = self.email
+        if self.api_key:
+            out["api_key"] = self.api_key
+        return out
+
+    async def request(self, endpoint: str, params: Dict[str, str], post: bool = False) -> bytes:
+        assert self._client is not None, "use EutilsClient as an async context manager"
+        params = self._params(params)
+        attempt = 0
+        while True:
+            await self.limiter.wait_async()
+            try:
+                if post:
+                    resp = await self._client.post(f"/{endpoint}", data=params)
+                else:
+                    resp = await self._client.get(f"/{endpoint}", params=params)
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(retry_delay(attempt))
+                attempt += 1
+                continue
+            rate_limited = resp.status_code == 200 and b"API rate limit exceeded" in resp.content[:300]
+            if (resp.status_code in RETRY_STATUSES or rate_limited) and attempt < self.max_retries:
+                await asyncio.sleep(retry_delay(attempt, resp.headers.get("retry-after")))
+                attempt += 1
+                continue
+            resp.raise_for_status()
+            return resp.content
+
+    async def esearch(self, db: str, term: str, retmax: int = 0, usehistory: bool = True) -> SearchResult:
+        params = {"db": db, "term": term, "retmax": str(retmax), "retmode": "xml"}
+        if usehistory:
+            params["usehistory"] = "y"
+        root = ET.fromstring(await self.request("esearch.fcgi", params, post=len(term) > 2000))
+        return SearchResult(
+            count=int((root.findtext("Count") or "0").strip() or 0),
+            webenv=(root.findtext("WebEnv") or "").strip(),
+            query_key=(root.findtext("QueryKey") or "").strip(),
+            ids=[(e.text or "").strip() for e in root.findall("IdList/Id")],
+        )
+
+    async def efetch_history(
+        self,
+        db: str,
+        search: SearchResult,
+        start: int,
+        batch_size: int,
+        rettype: str = "",
+        retmode: str = "xml",
+    ) -> bytes:
+        params = {
+            "db": db,
+            "query_key": search.query_key,
+            "WebEnv": search.webenv,
+            "retstart": str(start),
+            "retmax": str(batch_size),
+            "retmode": retmode,
+        }
+        if rettype:
+            params["rettype"] = rettype
+        return await self.request("efetch.fcgi", params)
+
+    async def iter_history_pages(
+        self,
+        db: str,
+        search: SearchResult,
+        batch_size: int,
+        rettype: str = "",
+        retmode: str = "xml",
+        concurrency: Optional[int] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield efetch pages of a history-server result in order. Up to
+        `concurrency` pages (default: the rate limit) are in flight at once so the
+        limiter, not round-trip latency, sets the pace.
+        """
+        starts = list(range(0, search.count, batch_size))
+        window = max(1, concurrency or int(self.rate))
+        pending: List[asyncio.Task] = []
+        try:
+            for start in starts:
+                pending.append(
+                    asyncio.create_task(self.efetch_history(db, search, start, batch_size, rettype, retmode))
+                )
+                if len(pending) >= window:
+                    yield await pending.pop(0)
+            while pending:
+                yield await pending.pop(0)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def esummary(self, db: str, ids: Sequence[str]) -> Dict[str, Any]:
+        """JSON esummary "result" object for `ids` (POST for large batches)."""
+        params = {"db": db, "id": ",".join(ids), "retmode": "json"}
+        data = json.loads(await self.request("esummary.fcgi", params, post=len(ids) > POST_ID_THRESHOLD))
+        return data.get("result", {}) or {}
+
+
+class BackgroundEutilsClient:
+    """
+    One EutilsClient (and so one httpx connection pool) owned by an event loop on a
+    daemon thread. Synchronous callers, including many worker threads at once,
+    submit coroutines to it, so keep-alive connections are reused across calls.
+    """
+
+    def __init__(self, **client_kwargs: Any):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="eutils-client", daemon=True)
+        self._thread.start()
+        self.client = EutilsClient(**client_kwargs)
+        asyncio.run_coroutine_threadsafe(self.client.__aenter__(), self._loop).result()
+
+    def run(self, fn: Callable[[EutilsClient], Awaitable[T]]) -> T:
+        """Run `fn(client)` on the client's loop and block until it finishes."""
+        return asyncio.run_coroutine_threadsafe(fn(self.client), self._loop).result()
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.client.__aexit__(None, None, None), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+_BACKGROUND: Optional[BackgroundEutilsClient] = None
+_BACKGROUND_LOCK = threading.Lock()
+
+
+def background_client() -> BackgroundEutilsClient:
+    """The process-wide background client (created on first use, closed at exit)."""
+    global _BACKGROUND
+    with _BACKGROUND_LOCK:
+        if _BACKGROUND is None:
+            _BACKGROUND = BackgroundEutilsClient()
+            atexit.register(_BACKGROUND.close)
+        return _BACKGROUND
+
+
+def run_with_client(fn: Callable[[EutilsClient], Awaitable[T]]) -> T:
+    """Run `fn(client)` to completion from synchronous code (e.g. a worker thread) on the shared client."""
+    return background_client().run(fn)
+
+
+def esummary_sync(db: str, ids: Sequence[str]) -> Optional[Dict[str, Any]]:
+    """Blocking esummary for thread-based callers; None if the request ultimately failed."""
+    try:
+        return run_with_client(lambda client: client.esummary(db, ids))
+    except (httpx.HTTPError, ValueError):
+        return None
@@ -1,17 +1,16 @@
 #!/usr/bin/env python3
+import asyncio
 import csv
 import json
 import re
-import time
 from datetime import datetime, timezone
 from html import unescape
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
-from urllib.parse import urlencode
-from urllib.request import urlopen
 import xml.etree.ElementTree as ET
 
-EUTILS_BASE = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+from eutils_client import EutilsClient
+
 DB = "pubmed"
 BATCH_SIZE = 200
 
@@ -173,20 +172,6 @@ TIMEPOINT_PATTERN = re.compile(
 )
 
 
-def request_xml(endpoint: str, params: Dict[str, str], retries: int = 3) -> ET.Element:
-    url = f"{EUTILS_BASE}/{endpoint}?{urlencode(params)}"
-    for attempt in range(1, retries + 1):
-        try:
-            with urlopen(url, timeout=60) as resp:
-                data = resp.read()
-            return ET.fromstring(data)
-        except Exception:
-            if attempt == retries:
-                raise
-            time.sleep(1.5 * attempt)
-    raise RuntimeError("unreachable")
-
-
 def text_of(elem: Optional[ET.Element]) -> str:
     if elem is None:
         return ""
@@ -277,45 +262,23 @@ def parse_article(pubmed_article: ET.Element, query_id: str, date_retrieved: str
     }
 
 
-def run_query(query: str, query_id: str, out_dir: Path) -> List[Dict[str, str]]:
-    date_retrieved = datetime.now(timezone.utc).date().isoformat()
-
-    root = request_xml(
-        "esearch.fcgi",
-        {
-            "db": DB,
-            "term": query,
-            "retmax": "0",
-            "usehistory": "y",
-            "retmode": "xml",
-        },
-    )
-
-    count = int(text_of(root.find("Count")) or "0")
-    webenv = text_of(root.find("WebEnv"))
-    query_key = text_of(root.find("QueryKey"))
-
+async def fetch_query(query: str, query_id: str, date_retrieved: str) -> Tuple[int, List[Dict[str, str]], List[str]]:
+    """esearch into the history server, then page XML and MEDLINE records at the NCBI rate ceiling."""
     rows: List[Dict[str, str]] = []
     nbib_chunks: List[str] = []
+    async with EutilsClient() as client:
+        search = await client.esearch(DB, query)
+        async for page in client.iter_history_pages(DB, search, BATCH_SIZE):
+            for article in ET.fromstring(page).findall("PubmedArticle"):
+                rows.append(parse_article(article, query_id=query_id, date_retrieved=date_retrieved))
+        async for page in client.iter_history_pages(DB, search, BATCH_SIZE, rettype="medline", retmode="text"):
+            nbib_chunks.append(page.decode("utf-8", errors="replace"))
+    return search.count, rows, nbib_chunks
 
-    for start in range(0, count, BATCH_SIZE):
-        fetch_root = request_xml(
-            "efetch.fcgi",
-            {
-                "db": DB,
-                "query_key": query_key,
-                "WebEnv": webenv,
-                "retstart": str(start),
-                "retmax": str(BATCH_SIZE),
-                "retmode": "xml",
-            },
-        )
-        for article in fetch_root.findall("PubmedArticle"):
-            rows.append(parse_article(article, query_id=query_id, date_retrieved=date_retrieved))
-
-        nbib_url = f"{EUTILS_BASE}/efetch.fcgi?{urlencode({'db': DB, 'query_key': query_key, 'WebEnv': webenv, 'retstart': str(start), 'retmax': str(BATCH_SIZE), 'rettype': 'medline', 'retmode': 'text'})}"
-        with urlopen(nbib_url, timeout=60) as resp:
-            nbib_chunks.append(resp.read().decode("utf-8", errors="replace"))
+
+def run_query(query: str, query_id: str, out_dir: Path) -> List[Dict[str, str]]:
+    date_retrieved = datetime.now(timezone.utc).date().isoformat()
+    count, rows, nbib_chunks = asyncio.run(fetch_query(query, query_id, date_retrieved))
 
     raw_path = out_dir / f"pubmed_{query_id}_raw.jsonl"
     nbib_path = out_dir / f"pubmed_{query_id}.nbib"
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+DAY = 24 * 60 * 60
+
+# How long a resolver answer is trusted. PubMed article IDs and Crossref links rarely change;
+# OA availability (Europe PMC, Unpaywall) and landing pages move faster.
+RESOLVER_TTLS = {
+    "esummary": 90 * DAY,
+    "europepmc.pmid": 14 * DAY,
+    "europepmc.doi": 14 * DAY,
+    "unpaywall": 14 * DAY,
+    "crossref": 30 * DAY,
+    "doi_landing": 14 * DAY,
+}
+DEFAULT_TTL = 14 * DAY
+
+# Candidate URLs that failed with one of these are not retried until the cooldown expires.
+FAILED_URL_COOLDOWN = 30 * DAY
+CACHEABLE_HTTP_FAILURES = {"401", "403", "404", "410"}
+CACHEABLE_FAILURE_REASONS = {"not_pdf", "response_too_small", "file_too_large"}
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resolver_results (
+    resolver TEXT NOT NULL,
+    lookup_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (resolver, lookup_key)
+);
+CREATE TABLE IF NOT EXISTS failed_urls (
+    url TEXT PRIMARY KEY,
+    reason TEXT NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+
+def is_cacheable_failure(result: Dict[str, str]) -> bool:
+    if result.get("status") != "error":
+        return False
+    reason = result.get("reason", "")
+    if reason == "http_error":
+        return result.get("http_status", "") in CACHEABLE_HTTP_FAILURES
+    return reason in CACHEABLE_FAILURE_REASONS
+
+
+class ResolutionCache:
+    """
+    SQLite cache of resolver answers keyed by (resolver, DOI/PMID) plus a negative
+    cache of candidate URLs that did not yield a PDF. Safe to share across threads.
+    With refresh=True existing entries are ignored but new answers are still stored.
+    """
+
+    def __init__(self, path: Path, refresh: bool = False, ttls: Optional[Dict[str, float]] = None):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.refresh = refresh
+        self.ttls = dict(RESOLVER_TTLS if ttls is None else ttls)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def get(self, resolver: str, key: str) -> Optional[Any]:
+        if self.refresh:
+            with self._lock:
+                self.misses += 1
+            return None
+        cutoff = time.time() - self.ttls.get(resolver, DEFAULT_TTL)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM resolver_results WHERE resolver = ? AND lookup_key = ? AND fetched_at >= ?",
+                (resolver, key, cutoff),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, resolver: str, key: str, payload: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resolver_results (resolver, lookup_key, payload, fetched_at) VALUES (?, ?, ?, ?)",
+                (resolver, key, json.dumps(payload, sort_keys=True), time.time()),
+            )
+            self._conn.commit()
+
+    def failed_reason(self, url: str) -> str:
+        if self.refresh:
+            return ""
+        cutoff = time.time() - FAILED_URL_COOLDOWN
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT reason FROM failed_urls WHERE url = ? AND failed_at >= ?", (url, cutoff)
+            ).fetchone()
+        return row[0] if row else ""
+
+    def mark_failed(self, url: str, reason: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO failed_urls (url, reason, failed_at) VALUES (?, ?, ?)",
+                (url, reason, time.time()),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
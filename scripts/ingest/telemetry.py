@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import math
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from urllib.parse import urlparse
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty sequence."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url or "").hostname or "").lower()
+
+
+_http_local = threading.local()
+
+
+@contextmanager
+def http_calls() -> Iterator[List[Dict[str, Any]]]:
+    """Collect the HTTP responses this thread reports via record_http while the block runs."""
+    calls: List[Dict[str, Any]] = []
+    outer = getattr(_http_local, "calls", None)
+    _http_local.calls = calls
+    try:
+        yield calls
+    finally:
+        _http_local.calls = outer
+
+
+def record_http(url: str, status: Optional[int], n_bytes: int = 0) -> None:
+    """One resolver HTTP response (status None: no response at all); a no-op outside http_calls()."""
+    calls = getattr(_http_local, "calls", None)
+    if calls is not None:
+        calls.append({"host": host_of(url), "http_status": status, "bytes": n_bytes})
+
+
+def http_failed(status: Optional[int]) -> bool:
+    """404 is an answer from the resolver APIs ("no record"); no response, 429/5xx and other 4xx are failures."""
+    return status is None or (status >= 400 and status != 404)
+
+
+class Telemetry:
+    """
+    Per-request telemetry for the PDF downloader. Every event is appended to a
+    JSONL file as it happens (kind: "resolver", "batch" or "download") and kept
+    in small in-memory aggregates for the end-of-run summary; the per-host
+    aggregate counts resolver HTTP calls as well as download attempts. Thread-safe.
+    """
+
+    def __init__(self, jsonl_path: Optional[Path] = None):
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._fh = None
+        if jsonl_path is not None:
+            jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = jsonl_path.open("w", encoding="utf-8")
+        self._resolvers: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {"calls": 0, "cached": 0, "failed": 0, "with_candidates": 0, "latencies_ms": []}
+        )
+        self._methods: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {"attempts": 0, "downloaded": 0, "bytes": 0, "latencies_ms": [], "reasons": defaultdict(int)}
+        )
+        self._hosts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"attempts": 0, "failures": 0})
+
+    def _write(self, event: Dict[str, Any]) -> None:
+        if self._fh is not None:
+            self._fh.write(json.dumps(event, ensure_ascii=True) + "\n")
+
+    def _http_fields(self, http: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+        """Event fields for a lookup's HTTP calls: the last response's host/status, total bytes, every call."""
+        last = http[-1] if http else {}
+        return {
+            "host": last.get("host", ""),
+            "http_status": last.get("http_status"),
+            "bytes": sum(call["bytes"] for call in http),
+            "http": list(http),
+        }
+
+    def _count_hosts(self, http: Sequence[Dict[str, Any]]) -> None:
+        for call in http:
+            host_agg = self._hosts[call["host"]]
+            host_agg["attempts"] += 1
+            if http_failed(call["http_status"]):
+                host_agg["failures"] += 1
+
+    def resolver(
+        self, name: str, key: str, source: str, latency_ms: float, result: Any, http: Sequence[Dict[str, Any]] = ()
+    ) -> None:
+        """
+        source is "network", "cache" or "prefetch"; result None means the lookup
+        failed. `http` holds the lookup's HTTP calls as collected by http_calls().
+        """
+        n_candidates = len(result) if isinstance(result, list) else (1 if result else 0)
+        event = {
+            "kind": "resolver",
+            "resolver": name,
+            "key": key,
+            "source": source,
+            "latency_ms": round(latency_ms, 1),
+            "outcome": "failed" if result is None else "found" if n_candidates else "empty",
+            "candidates": n_candidates,
+            **self._http_fields(http),
+        }
+        with self._lock:
+            self._write(event)
+            self._count_hosts(http)
+            agg = self._resolvers[name]
+            agg["calls"] += 1
+            if source != "network":
+                agg["cached"] += 1
+            else:
+                agg["latencies_ms"].append(latency_ms)
+            if result is None:
+                agg["failed"] += 1
+            elif n_candidates:
+                agg["with_candidates"] += 1
+
+    def batch(self, name: str, size: int, latency_ms: float, ok: bool, http: Sequence[Dict[str, Any]] = ()) -> None:
+        event = {
+            "kind": "batch",
+            "resolver": name,
+            "size": size,
+            "latency_ms": round(latency_ms, 1),
+            "ok": ok,
+            **self._http_fields(http),
+        }
+        with self._lock:
+            self._write(event)
+            self._count_hosts(http)
+
+    def download(self, method: str, url: str, latency_ms: float, result: Dict[str, str]) -> None:
+        status = result.get("status", "")
+        host = host_of(result.get("source_url") or url)
+        event = {
+            "kind": "download",
+            "resolution_method": method,
+            "host": host,
+            "url": url,
+            "latency_ms": round(latency_ms, 1),
+            "bytes": int(result.get("bytes") or 0),
+            "http_status": result.get("http_status", ""),
+            "status": status,
+            "reason": result.get("reason", ""),
+        }
+        with self._lock:
+            self._write(event)
+            agg = self._methods[method]
+            agg["attempts"] += 1
+            agg["latencies_ms"].append(latency_ms)
+            if status in {"downloaded", "skipped_exists"}:
+                agg["downloaded"] += 1
+                agg["bytes"] += event["bytes"]
+            else:
+                agg["reasons"][event["reason"] or status] += 1
+            host_agg = self._hosts[host]
+            host_agg["attempts"] += 1
+            if status not in {"downloaded", "skipped_exists"}:
+                host_agg["failures"] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            resolvers = {
+                name: {
+                    "calls": agg["calls"],
+                    "cached": agg["cached"],
+                    "failed": agg["failed"],
+                    "yield_rate": round(agg["with_candidates"] / agg["calls"], 3) if agg["calls"] else 0.0,
+                    "p50_ms": round(percentile(agg["latencies_ms"], 50), 1),
+                    "p95_ms": round(percentile(agg["latencies_ms"], 95), 1),
+                }
+                for name, agg in sorted(self._resolvers.items())
+            }
+            methods = {
+                name: {
+                    "attempts": agg["attempts"],
+                    "downloaded": agg["downloaded"],
+                    "success_rate": round(agg["downloaded"] / agg["attempts"], 3) if agg["attempts"] else 0.0,
+                    "p50_ms": round(percentile(agg["latencies_ms"], 50), 1),
+                    "p95_ms": round(percentile(agg["latencies_ms"], 95), 1),
+                    "bytes": agg["bytes"],
+                    "failure_reasons": dict(sorted(agg["reasons"].items())),
+                }
+                for name, agg in sorted(self._methods.items())
+            }
+            hosts = sorted(
+                (
+                    {"host": host, **agg, "failure_rate": round(agg["failures"] / agg["attempts"], 3)}
+                    for host, agg in self._hosts.items()
+                    if agg["failures"]
+                ),
+                key=lambda h: (-h["failures"], h["host"]),
+            )
+        return {"resolvers": resolvers, "resolution_methods": methods, "failing_hosts": hosts}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+def format_summary(summary: Dict[str, Any], max_hosts: int = 10) -> List[str]:
+    lines = ["Resolvers (network latency):"]
+    for name, r in summary["resolvers"].items():
+        lines.append(
+            f"  {name:<16} calls={r['calls']:<5} cached={r['cached']:<5} failed={r['failed']:<4} "
+            f"yield={r['yield_rate']:.0%} p50={r['p50_ms']:.0f}ms p95={r['p95_ms']:.0f}ms"
+        )
+    lines.append("Downloads by resolution_method:")
+    for name, m in summary["resolution_methods"].items():
+        lines.append(
+            f"  {name:<40} attempts={m['attempts']:<5} success={m['success_rate']:.0%} "
+            f"p50={m['p50_ms']:.0f}ms p95={m['p95_ms']:.0f}ms"
+        )
+    if summary["failing_hosts"]:
+        lines.append("Most failing hosts:")
+        for h in summary["failing_hosts"][:max_hosts]:
+            lines.append(f"  {h['host']:<40} failures={h['failures']}/{h['attempts']}")
+    return lines
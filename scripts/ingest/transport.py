@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # optional: --http2 falls back to requests when httpx[http2] is not installed
+    httpx = None  # type: ignore[assignment]
+
+
+USER_AGENT = "QoL-cardiac-arrest-pdf-downloader/1.0 (+https://github.com/)"
+
+# Minimum seconds between requests to the same host. NCBI allows 3 req/s without an API key;
+# EBI, Unpaywall and Crossref are documented as tolerant of ~10+ req/s; unknown publisher hosts
+# get a conservative 1 req/s.
+HOST_MIN_INTERVALS = {
+    "eutils.ncbi.nlm.nih.gov": 0.34,
+    "pmc.ncbi.nlm.nih.gov": 0.34,
+    "www.ncbi.nlm.nih.gov": 0.34,
+    "www.ebi.ac.uk": 0.1,
+    "europepmc.org": 0.1,
+    "api.unpaywall.org": 0.1,
+    "api.crossref.org": 0.1,
+    "doi.org": 0.2,
+}
+DEFAULT_HOST_INTERVAL = 1.0
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 0.5
+MAX_RETRY_AFTER_SECONDS = 60.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HostRateLimiter:
+    """Thread-safe per-host spacing of requests (replaces a global sleep between records)."""
+
+    def __init__(self, intervals: Optional[Dict[str, float]] = None, default_interval: float = DEFAULT_HOST_INTERVAL):
+        self.intervals = dict(HOST_MIN_INTERVALS if intervals is None else intervals)
+        self.default_interval = default_interval
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def interval_for(self, host: str) -> float:
+        return self.intervals.get(host, self.default_interval)
+
+    def wait(self, url: str) -> None:
+        host = (urlparse(url).hostname or "").lower()
+        if not host:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.interval_for(host)
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Seconds to wait before retry `attempt` (0-based): Retry-After if given, else exponential backoff."""
+    if retry_after:
+        value = retry_after.strip()
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                seconds = -1.0
+        if seconds >= 0:
+            return min(seconds, MAX_RETRY_AFTER_SECONDS)
+    return RETRY_BACKOFF_SECONDS * (2**attempt)
+
+
+class ThrottledSession(requests.Session):
+    """
+    requests session that takes a host limiter slot before every attempt. 429/5xx
+    are retried here rather than by urllib3, so retries are spaced like any other
+    request to the host; the adapter only retries connection errors.
+    """
+
+    def __init__(self, limiter: Optional[HostRateLimiter] = None, max_retries: int = DEFAULT_MAX_RETRIES):
+        super().__init__()
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    def request(self, method, url, *args, **kwargs):  # type: ignore[override]
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.wait(str(url))
+            resp = super().request(method, url, *args, **kwargs)
+            if resp.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                return resp
+            delay = retry_delay(attempt, resp.headers.get("Retry-After"))
+            resp.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+def build_session(
+    limiter: Optional[HostRateLimiter] = None,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+) -> requests.Session:
+    s = ThrottledSession(limiter, max_retries=max_retries)
+    s.headers.update({"User-Agent": USER_AGENT})
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=RETRY_BACKOFF_SECONDS,
+        # Status retries happen in ThrottledSession.request, behind the limiter.
+        respect_retry_after_header=False,
+        # The POSTs here are batched read-only lookups (esummary, Europe PMC), safe to repeat.
+        allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+        raise_on_status=False,
+    )
+    # pool_maxsize caps the connections per host; with pool_block, threads beyond it wait
+    # for a free keep-alive connection instead of opening (and discarding) extra ones.
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+class HttpxResponse:
+    """The subset of requests.Response the downloader uses, backed by an httpx response."""
+
+    def __init__(self, resp: "httpx.Response"):
+        self._resp = resp
+
+    @property
+    def status_code(self) -> int:
+        return self._resp.status_code
+
+    @property
+    def headers(self):
+        return self._resp.headers
+
+    @property
+    def url(self) -> str:
+        return str(self._resp.url)
+
+    @property
+    def content(self) -> bytes:
+        return self._resp.read()
+
+    @property
+    def text(self) -> str:
+        self._resp.read()
+        return self._resp.text
+
+    def json(self) -> Any:
+        self._resp.read()
+        return self._resp.json()
+
+    def raise_for_status(self) -> None:
+        if self._resp.status_code >= 400:
+            raise requests.HTTPError(f"{self._resp.status_code} for url: {self._resp.url}", response=None)
+
+    def iter_content(self, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        try:
+            yield from self._resp.iter_bytes(chunk_size)
+        except httpx.HTTPError as e:
+            raise requests.ConnectionError(str(e)) from e
+
+    def close(self) -> None:
+        self._resp.close()
+
+
+class HttpxSession:
+    """
+    requests-compatible session over one shared httpx client with HTTP/2, so
+    concurrent requests to the same host multiplex over a single connection.
+    Retries 429/5xx and transport errors like the requests adapter does.
+    """
+
+    def __init__(
+        self,
+        limiter: Optional[HostRateLimiter] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+    ):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.headers = {"User-Agent": USER_AGENT}
+        self._client = httpx.Client(
+            http2=True,
+            headers=self.headers,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_size),
+        )
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        data: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        allow_redirects: bool = True,
+        stream: bool = False,
+    ) -> HttpxResponse:
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.wait(url)
+            try:
+                req = self._client.build_request(method, url, params=params, data=data, timeout=timeout)
+                resp = self._client.send(req, stream=stream, follow_redirects=allow_redirects)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise requests.ConnectionError(str(e)) from e
+                time.sleep(retry_delay(attempt))
+                attempt += 1
+                continue
+            if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = retry_delay(attempt, resp.headers.get("retry-after"))
+                resp.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+            return HttpxResponse(resp)
+
+    def get(self, url: str, **kwargs) -> HttpxResponse:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> HttpxResponse:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def http2_available() -> bool:
+    if httpx is None:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def shared_session(
+    limiter: Optional[HostRateLimiter],
+    pool_size: int = DEFAULT_POOL_SIZE,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    http2: bool = False,
+) -> Any:
+    """
+    One session shared by every worker and resolver thread, so `pool_size` caps
+    the keep-alive connections per host across all of them: a tuned requests
+    session, or an HTTP/2 client that multiplexes requests per host.
+    """
+    if http2:
+        if http2_available():
+            return HttpxSession(limiter, pool_size=pool_size, max_retries=max_retries)
+        print("WARNING: --http2 needs httpx[http2]; falling back to requests (HTTP/1.1).")
+    return build_session(limiter, pool_size=pool_size, max_retries=max_retries)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-/][a-z0-9]+)*")
+_JOINER_RE = re.compile(r"[-/]")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lower-cased word tokens. Hyphenated/slashed tokens are kept whole and also
+    emitted as their parts and joined prefixes, so "EQ-5D-5L" matches queries
+    for "EQ-5D-5L", "EQ5D5L", "EQ5D" and "5L", and "SF-36" matches "SF36".
+    """
+    tokens: list[str] = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group(0)
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "-" in token or "/" in token:
+            parts = [p for p in _JOINER_RE.split(token) if p]
+            tokens.extend(p for p in parts if p not in STOPWORDS)
+            tokens.extend("".join(parts[:n]) for n in range(2, len(parts) + 1))
+    return tokens
+
+
+def lexical_dir_for(index_dir: Path) -> Path:
+    return index_dir / "lexical"
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk texts stored as flat NumPy postings: for term
+    id t, doc_ids/tfs[term_offsets[t]:term_offsets[t + 1]] are the chunk rows
+    (in chunk_ids order) containing it and their term frequencies.
+    """
+
+    def __init__(
+        self,
+        terms: dict[str, int],
+        term_offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lens: np.ndarray,
+        chunk_ids: list[str],
+        meta: dict,
+    ):
+        self.terms = terms
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.chunk_ids = chunk_ids
+        self.meta = meta
+        self.avg_doc_len = float(doc_lens.mean()) if len(doc_lens) else 0.0
+
+    @classmethod
+    def build(cls, chunks: Iterable[tuple[str, str]]) -> "LexicalIndex":
+        """Index (chunk_id, text) pairs; rows follow the iteration order."""
+        terms: dict[str, int] = {}
+        postings: list[list[tuple[int, int]]] = []
+        chunk_ids: list[str] = []
+        doc_lens: list[int] = []
+        for row, (chunk_id, text) in enumerate(chunks):
+            counts = Counter(tokenize(text))
+            chunk_ids.append(chunk_id)
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_id = terms.get(term)
+                if term_id is None:
+                    term_id = terms[term] = len(postings)
+                    postings.append([])
+                postings[term_id].append((row, tf))
+
+        sizes = np.fromiter((len(p) for p in postings), dtype=np.int64, count=len(postings))
+        term_offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        flat = [entry for plist in postings for entry in plist]
+        doc_ids = np.fromiter((d for d, _ in flat), dtype=np.int32, count=len(flat))
+        tfs = np.fromiter((min(tf, 65535) for _, tf in flat), dtype=np.uint16, count=len(flat))
+        meta = {
+            "doc_count": len(chunk_ids),
+            "term_count": len(terms),
+            "posting_count": len(flat),
+            "bm25_k1": BM25_K1,
+            "bm25_b": BM25_B,
+            "built_at_utc": datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+        }
+        return cls(terms, term_offsets, doc_ids, tfs, np.asarray(doc_lens, dtype=np.int32), chunk_ids, meta)
+
+    def save(self, lexical_dir: Path) -> None:
+        lexical_dir.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            lexical_dir / "postings.npz",
+            term_offsets=self.term_offsets,
+            doc_ids=self.doc_ids,
+            tfs=self.tfs,
+            doc_lens=self.doc_lens,
+        )
+        vocab = sorted(self.terms, key=self.terms.__getitem__)
+        (lexical_dir / "terms.json").write_text(json.dumps(vocab), encoding="utf-8")
+        (lexical_dir / "chunk_ids.json").write_text(json.dumps(self.chunk_ids), encoding="utf-8")
+        (lexical_dir / "meta.json").write_text(json.dumps(self.meta, indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, lexical_dir: Path) -> "LexicalIndex":
+        if not (lexical_dir / "meta.json").exists():
+            raise FileNotFoundError(f"Missing lexical index: {lexical_dir}. Run scripts/build_index.py first.")
+        arrays = np.load(lexical_dir / "postings.npz")
+        vocab = json.loads((lexical_dir / "terms.json").read_text(encoding="utf-8"))
+        return cls(
+            terms={term: i for i, term in enumerate(vocab)},
+            term_offsets=arrays["term_offsets"],
+            doc_ids=arrays["doc_ids"],
+            tfs=arrays["tfs"],
+            doc_lens=arrays["doc_lens"],
+            chunk_ids=json.loads((lexical_dir / "chunk_ids.json").read_text(encoding="utf-8")),
+            meta=json.loads((lexical_dir / "meta.json").read_text(encoding="utf-8")),
+        )
+
+    def score_all(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk row for `query` (0 where no query term occurs)."""
+        n_docs = len(self.chunk_ids)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        if n_docs == 0:
+            return scores
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lens / (self.avg_doc_len or 1.0))
+        for term in set(tokenize(query)):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.term_offsets[term_id]), int(self.term_offsets[term_id + 1])
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm[docs])
+        return scores
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import io
+from pathlib import Path
+from typing import Callable
+
+import pdfplumber
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+
+try:
+    import pypdfium2
+except ImportError:  # optional: only needed for the pypdfium2 backend
+    pypdfium2 = None
+
+DEFAULT_BACKEND = "pdfplumber"
+DEFAULT_FALLBACK = "pdfplumber"
+
+
+def _normalize(text: str) -> str:
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def pdfplumber_pages(pdf_path: Path) -> list[str]:
+    """Layout-aware text per page (slow; the historical default)."""
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+def pypdfium2_pages(pdf_path: Path) -> list[str]:
+    """Text per page from PDFium's text layer (C++, no layout analysis)."""
+    if pypdfium2 is None:
+        raise RuntimeError("The pypdfium2 backend needs `pip install pypdfium2`.")
+    texts: list[str] = []
+    pdf = pypdfium2.PdfDocument(str(pdf_path))
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            try:
+                texts.append(_normalize(textpage.get_text_range()))
+            finally:
+                textpage.close()
+                page.close()
+    finally:
+        pdf.close()
+    return texts
+
+
+def pdfminer_pages(pdf_path: Path) -> list[str]:
+    """
+    Text per page from pdfminer (pdfplumber's parser) in low-layout mode: word
+    spacing and line grouping only, without the costly boxes_flow reading-order
+    analysis (laparams=None would also drop the spaces between words).
+    """
+    texts: list[str] = []
+    manager = PDFResourceManager()
+    buffer = io.StringIO()
+    device = TextConverter(manager, buffer, laparams=LAParams(boxes_flow=None))
+    interpreter = PDFPageInterpreter(manager, device)
+    try:
+        with pdf_path.open("rb") as f:
+            for page in PDFPage.get_pages(f):
+                interpreter.process_page(page)
+                # TextConverter ends every page with a form feed; drop it so pages match the other backends.
+                texts.append(_normalize(buffer.getvalue().rstrip()))
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        device.close()
+    return texts
+
+
+EXTRACTORS: dict[str, Callable[[Path], list[str]]] = {
+    "pdfplumber": pdfplumber_pages,
+    "pypdfium2": pypdfium2_pages,
+    "pdfminer": pdfminer_pages,
+}
+
+
+def extract_page_texts(pdf_path: Path, backend: str = DEFAULT_BACKEND, fallback: str | None = DEFAULT_FALLBACK) -> list[tuple[str, str]]:
+    """
+    (text, backend used) for every page. Pages where `backend` finds no text are
+    re-extracted with `fallback` (pdfplumber by default), one page at a time;
+    a backend that fails on the whole file falls back for the whole file.
+    """
+    if backend not in EXTRACTORS:
+        raise ValueError(f"Unknown PDF text backend {backend!r}; expected one of {sorted(EXTRACTORS)}")
+    if fallback and fallback not in EXTRACTORS:
+        raise ValueError(f"Unknown PDF text fallback {fallback!r}; expected one of {sorted(EXTRACTORS)}")
+    try:
+        texts = EXTRACTORS[backend](pdf_path)
+    except Exception:
+        if not fallback or fallback == backend:
+            raise
+        return [(text, fallback) for text in EXTRACTORS[fallback](pdf_path)]
+
+    pages = [(text, backend) for text in texts]
+    if not fallback or fallback == backend:
+        return pages
+    empty = [i for i, (text, _) in enumerate(pages) if not text.strip()]
+    if empty:
+        if fallback == "pdfplumber":
+            with pdfplumber.open(str(pdf_path)) as pdf:
+                for i in empty:
+                    pages[i] = (pdf.pages[i].extract_text() or "", fallback)
+        else:
+            fallback_texts = EXTRACTORS[fallback](pdf_path)
+            for i in empty:
+                if i < len(fallback_texts):
+                    pages[i] = (fallback_texts[i], fallback)
+    return pages
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator
+
+OBJECTS_DIR = "objects"
+ALIASES_FILE = "aliases.json"
+
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PdfStore:
+    """
+    Content-addressed PDF store: every distinct file lives once under
+    objects/<sha256>.pdf and aliases.json maps identifiers ("doi:...", "pmid:...",
+    "stem:<file stem>") to its hash. The first stem registered for a hash is its
+    paper_id, so the same article downloaded via DOI and via PMID is indexed once.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.objects_dir = root / OBJECTS_DIR
+        self.aliases_path = root / ALIASES_FILE
+        self._lock = threading.Lock()
+        self.aliases: dict[str, str] = {}
+        self.paper_ids: dict[str, str] = {}
+        if self.aliases_path.exists():
+            data = json.loads(self.aliases_path.read_text(encoding="utf-8"))
+            self.aliases = dict(data.get("aliases", {}))
+            self.paper_ids = dict(data.get("paper_ids", {}))
+
+    @staticmethod
+    def exists_at(root: Path) -> bool:
+        return (root / ALIASES_FILE).exists()
+
+    def object_path(self, sha256: str) -> Path:
+        return self.objects_dir / f"{sha256}.pdf"
+
+    def lookup(self, aliases: Iterable[str]) -> Path | None:
+        with self._lock:
+            for alias in aliases:
+                sha256 = self.aliases.get(alias)
+                if sha256 and self.object_path(sha256).exists():
+                    return self.object_path(sha256)
+        return None
+
+    def add_file(self, src: Path, sha256: str, aliases: Iterable[str], paper_id: str) -> Path:
+        """Move a finished download into the store (or drop it if the bytes are already stored)."""
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        dest = self.object_path(sha256)
+        with self._lock:
+            if dest.exists():
+                src.unlink(missing_ok=True)
+            else:
+                os.replace(src, dest)
+            for alias in aliases:
+                if alias:
+                    self.aliases[alias] = sha256
+            self.paper_ids.setdefault(sha256, paper_id)
+            self._save()
+        return dest
+
+    def paper_id(self, sha256: str) -> str:
+        return self.paper_ids.get(sha256, sha256[:16])
+
+    def iter_objects(self) -> Iterator[tuple[str, Path]]:
+        """(paper_id, path) for every stored PDF, ordered by paper_id."""
+        if not self.objects_dir.exists():
+            return
+        objects = [(self.paper_id(p.stem), p) for p in self.objects_dir.glob("*.pdf") if p.is_file()]
+        yield from sorted(objects)
+
+    def _save(self) -> None:
+        tmp_path = self.aliases_path.with_name(f"{ALIASES_FILE}.tmp")
+        payload = {"aliases": dict(sorted(self.aliases.items())), "paper_ids": dict(sorted(self.paper_ids.items()))}
+        tmp_path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.aliases_path)
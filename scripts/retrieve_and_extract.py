@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
 import math
 import re
+import time
 from collections import defaultdict
 from datetime import datetime, timezone
 from pathlib import Path
@@ -11,13 +13,20 @@ from typing import Literal
 
 from openai import OpenAI
 
+from batch_api import RESPONSES_ENDPOINT, StubBatchClient, add_batch_args, batch_dir_for, output_text_of, run_batch
+from lexical_index import LexicalIndex, lexical_dir_for
+from text_store import TextStore, text_store_dir_for
+from usage_ledger import UsageLedger, load_pricing
 from shared import (
+    PAGE_SEPARATOR,
+    add_metrics_args,
     build_openai_client,
     call_with_retries,
     jsonl_append,
     jsonl_read,
     jsonl_write,
     load_pipeline_config,
+    metrics_from_args,
 )
 from pydantic import BaseModel, ConfigDict, Field, ValidationError
 
@@ -26,6 +35,10 @@ EXTRACTION_MODEL = "gpt-5"
 PROMPT_VERSION = "qol_extract_v1"
 DEFAULT_TOP_K_PER_QUERY = 4
 DEFAULT_MAX_CHUNKS_SENT = 20
+RETRIEVAL_MODES = ("vector", "hybrid")
+DEFAULT_RETRIEVAL_MODE = "hybrid"
+# Reciprocal rank fusion constant (Cormack et al.); 60 is the customary default.
+RRF_K = 60
 
 RETRIEVAL_QUERIES = [
     "health related quality of life instrument questionnaire PROM EQ-5D SF-36 SF12 SF-12 RAND HUI QLQ",
@@ -148,14 +161,55 @@ def make_openai_strict_json_schema(schema: dict) -> dict:
     return _walk(schema)
 
 
-def embed_queries(client: OpenAI, queries: list[str]) -> list[list[float]]:
+def embed_queries(client: OpenAI, queries: list[str], ledger: UsageLedger | None = None) -> list[list[float]]:
     def _call():
         return client.embeddings.create(model=EMBEDDING_MODEL, input=queries)
 
+    started = time.perf_counter()
     resp = call_with_retries(_call)
+    if ledger is not None:
+        ledger.record("embed_queries", EMBEDDING_MODEL, resp.usage, time.perf_counter() - started)
     return [item.embedding for item in resp.data]
 
 
+def query_cache_path(index_dir: Path) -> Path:
+    return index_dir / f"query_embeddings_{EMBEDDING_MODEL}.jsonl"
+
+
+def query_key(query: str, stub: bool = False) -> str:
+    """Cache key for a query's vector: model + exact query text (+ stub marker for --batch-stub vectors)."""
+    tag = f"{EMBEDDING_MODEL}+stub" if stub else EMBEDDING_MODEL
+    return hashlib.sha256(f"{tag}\n{query}".encode("utf-8")).hexdigest()
+
+
+def cached_query_vectors(
+    cache_path: Path,
+    queries: list[str],
+    client: OpenAI,
+    ledger: UsageLedger | None = None,
+    stub: bool = False,
+) -> tuple[list[list[float]], int]:
+    """
+    Vectors for `queries`, read from the index's query cache; only queries missing
+    from it are embedded and written back.
+    Returns (vectors, number embedded now).
+    """
+    cache = {row["key"]: row for row in jsonl_read(cache_path)}
+    missing = [q for q in dict.fromkeys(queries) if query_key(q, stub) not in cache]
+    if missing:
+        for query, vector in zip(missing, embed_queries(client, missing, ledger)):
+            cache[query_key(query, stub)] = {
+                "key": query_key(query, stub),
+                "model": EMBEDDING_MODEL,
+                "query": query,
+                "stub": stub,
+                "vector": vector,
+                "updated_at": utc_now_iso(),
+            }
+        jsonl_write(cache_path, cache.values())
+    return [cache[query_key(q, stub)]["vector"] for q in queries], len(missing)
+
+
 def load_index(index_dir: Path) -> dict[str, list[dict]]:
     chunks_path = index_dir / "chunks.jsonl"
     embeddings_path = index_dir / f"embeddings_{EMBEDDING_MODEL}.jsonl"
@@ -169,7 +223,13 @@ def load_index(index_dir: Path) -> dict[str, list[dict]]:
 
     papers: dict[str, list[dict]] = defaultdict(list)
     for chunk_id, chunk in chunks_by_id.items():
-        emb = embeddings_by_id.get(chunk_id)
+        original_id = chunk.get("duplicate_of")
+        if original_id:
+            # A duplicate within the same paper adds nothing; across papers it borrows the original's vector.
+            original = chunks_by_id.get(original_id)
+            if original is None or original["paper_id"] == chunk["paper_id"]:
+                continue
+        emb = embeddings_by_id.get(original_id or chunk_id)
         if not emb:
             continue
         record = {
@@ -184,6 +244,19 @@ def load_index(index_dir: Path) -> dict[str, list[dict]]:
     return papers
 
 
+def open_text_store(index_dir: Path) -> TextStore | None:
+    """The index's text store, or None for older indexes whose chunk rows carry their text inline."""
+    store_dir = text_store_dir_for(index_dir)
+    return TextStore(store_dir) if (store_dir / "corpus.txt").exists() else None
+
+
+def materialize_text(chunks: list[dict], text_store: TextStore | None) -> None:
+    """Fill in chunk["text"] from the text store, only for the chunks about to be used."""
+    for chunk in chunks:
+        if "text" not in chunk and text_store is not None:
+            chunk["text"] = text_store.text(chunk)
+
+
 def load_existing_paper_ids(extractions_path: Path) -> set[str]:
     paper_ids: set[str] = set()
     if not extractions_path.exists():
@@ -195,32 +268,65 @@ def load_existing_paper_ids(extractions_path: Path) -> set[str]:
     return paper_ids
 
 
+def paper_lexical_scores(query_scores: list, row_of: dict[str, int], paper_chunks: list[dict]) -> list[list[float]]:
+    """Slice corpus-wide BM25 score arrays (one per query) down to this paper's chunks, in order."""
+    rows = [row_of.get(chunk.get("duplicate_of") or chunk["chunk_id"]) for chunk in paper_chunks]
+    return [[float(scores[r]) if r is not None else 0.0 for r in rows] for scores in query_scores]
+
+
+def rrf_fuse(rankings: list[list[int]], k: int = RRF_K) -> dict[int, float]:
+    """Reciprocal rank fusion: sum of 1 / (k + rank) over every ranking an item appears in."""
+    fused: dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] += 1.0 / (k + rank)
+    return fused
+
+
 def retrieve_chunks_for_paper(
     paper_chunks: list[dict],
     query_vectors: list[list[float]],
     *,
     top_k_per_query: int,
     max_chunks_sent: int,
+    lexical_scores: list[list[float]] | None = None,
 ) -> list[dict]:
+    """
+    Per query, keep the top-k chunks and then the best-scoring union. With
+    `lexical_scores` (BM25 per query per chunk), chunks are ranked by RRF of the
+    cosine and BM25 rankings instead of cosine alone. `retrieval_score` is always
+    the cosine; hybrid ranking records the fused value as `rrf_score`.
+    """
     selected: dict[str, dict] = {}
+    rank_scores: dict[str, float] = {}
 
-    for qv in query_vectors:
-        scored = []
+    for qi, qv in enumerate(query_vectors):
         q_norm = vector_norm(qv)
-        for chunk in paper_chunks:
-            score = cosine_sim(qv, chunk["vector"], norm_a=q_norm, norm_b=chunk.get("vector_norm"))
-            scored.append((score, chunk))
+        cosines = [
+            cosine_sim(qv, chunk["vector"], norm_a=q_norm, norm_b=chunk.get("vector_norm")) for chunk in paper_chunks
+        ]
+        fused: dict[int, float] | None = None
+        if lexical_scores is not None:
+            bm25 = lexical_scores[qi]
+            vector_rank = sorted(range(len(cosines)), key=lambda i: cosines[i], reverse=True)
+            lexical_rank = sorted((i for i in range(len(bm25)) if bm25[i] > 0), key=lambda i: bm25[i], reverse=True)
+            fused = rrf_fuse([vector_rank, lexical_rank])
+        scored = [(fused[i] if fused is not None else cosines[i], i) for i in range(len(paper_chunks))]
         scored.sort(key=lambda x: x[0], reverse=True)
-        for score, chunk in scored[:top_k_per_query]:
-            chosen = dict(chunk)
-            chosen["retrieval_score"] = score
-            prior = selected.get(chunk["chunk_id"])
-            if prior is None or score > prior.get("retrieval_score", -1):
+        for score, i in scored[:top_k_per_query]:
+            chunk = paper_chunks[i]
+            prior = rank_scores.get(chunk["chunk_id"])
+            if prior is None or score > prior:
+                chosen = dict(chunk)
+                chosen["retrieval_score"] = cosines[i]
+                if fused is not None:
+                    chosen["rrf_score"] = score
                 selected[chunk["chunk_id"]] = chosen
+                rank_scores[chunk["chunk_id"]] = score
 
     top_scored = sorted(
         selected.values(),
-        key=lambda r: r.get("retrieval_score", 0.0),
+        key=lambda r: rank_scores[r["chunk_id"]],
         reverse=True,
     )[:max_chunks_sent]
     ordered = sorted(
@@ -230,11 +336,22 @@ def retrieve_chunks_for_paper(
     return ordered
 
 
+def chunk_prompt_text(chunk: dict) -> tuple[str, str]:
+    """(page label, text) for a chunk; chunks spanning page breaks get inline [page N] markers."""
+    page, page_end = chunk["page"], chunk.get("page_end") or chunk["page"]
+    if page_end == page:
+        return str(page), chunk["text"]
+    parts = chunk["text"].split(PAGE_SEPARATOR)
+    text = "\n".join(f"[page {page + i}]\n{part}" for i, part in enumerate(parts))
+    return f"{page}-{page_end}", text
+
+
 def build_extraction_prompt(paper_id: str, chunks: list[dict]) -> list[dict]:
     context_blocks = []
     for idx, chunk in enumerate(chunks, start=1):
+        page_label, text = chunk_prompt_text(chunk)
         context_blocks.append(
-            f"[Chunk {idx}] paper_id={paper_id} page={chunk['page']} chunk_id={chunk['chunk_id']}\n{chunk['text']}"
+            f"[Chunk {idx}] paper_id={paper_id} page={page_label} chunk_id={chunk['chunk_id']}\n{text}"
         )
     joined_context = "\n\n".join(context_blocks)
 
@@ -243,7 +360,7 @@ def build_extraction_prompt(paper_id: str, chunks: list[dict]) -> list[dict]:
         "Return only JSON matching the provided schema. "
         "Do not infer beyond explicit evidence. "
         "If evidence quote/page is missing, omit that instrument or timepoint item entirely. "
-        "Evidence quotes must be short verbatim excerpts (<=25 words) from the provided chunks and page numbers must match the chunk page. "
+        "Evidence quotes must be short verbatim excerpts (<=25 words) from the provided chunks and page numbers must match the chunk page (or the [page N] marker above the quote when a chunk spans pages). "
         "If time anchor is not explicit, use 'unclear'."
     )
     user = (
@@ -263,27 +380,50 @@ def build_extraction_prompt(paper_id: str, chunks: list[dict]) -> list[dict]:
     ]
 
 
-def call_extraction(client: OpenAI, paper_id: str, chunks: list[dict]) -> ExtractionPayload:
+def extraction_request(paper_id: str, chunks: list[dict]) -> dict:
+    """responses.create arguments for one paper (also the body of its Batch API request)."""
     schema = make_openai_strict_json_schema(ExtractionPayload.model_json_schema())
-    prompt = build_extraction_prompt(paper_id, chunks)
+    return {
+        "model": EXTRACTION_MODEL,
+        "input": build_extraction_prompt(paper_id, chunks),
+        "text": {
+            "format": {
+                "type": "json_schema",
+                "name": "qol_extraction_payload",
+                "schema": schema,
+                "strict": True,
+            }
+        },
+        "store": False,
+    }
+
+
+def call_extraction(
+    client: OpenAI, paper_id: str, chunks: list[dict], ledger: UsageLedger | None = None
+) -> ExtractionPayload:
+    request = extraction_request(paper_id, chunks)
 
     def _call():
-        return client.responses.create(
-            model=EXTRACTION_MODEL,
-            input=prompt,
-            text={
-                "format": {
-                    "type": "json_schema",
-                    "name": "qol_extraction_payload",
-                    "schema": schema,
-                    "strict": True,
-                }
-            },
-            store=False,
-        )
+        return client.responses.create(**request)
 
+    started = time.perf_counter()
     resp = call_with_retries(_call)
-    payload_text = extract_response_text(resp)
+    if ledger is not None:
+        # Recorded before parsing: a response that fails validation was still billed.
+        ledger.record("extract", EXTRACTION_MODEL, resp.usage, time.perf_counter() - started, paper_id=paper_id)
+    return parse_extraction(extract_response_text(resp), paper_id)
+
+
+def batch_extraction(result: dict, paper_id: str, ledger: UsageLedger) -> ExtractionPayload:
+    """Payload from one Batch API result ({"body": ...} or {"error": ...}), validated like a synchronous call."""
+    if "error" in result:
+        raise RuntimeError(f"Batch request failed: {result['error']}")
+    body = result["body"]
+    ledger.record("extract", EXTRACTION_MODEL, body.get("usage"), 0.0, paper_id=paper_id, batch=True)
+    return parse_extraction(output_text_of(body), paper_id)
+
+
+def parse_extraction(payload_text: str, paper_id: str) -> ExtractionPayload:
     payload_json = parse_json_object(payload_text)
     payload = ExtractionPayload.model_validate(payload_json)
 
@@ -322,17 +462,30 @@ def main() -> None:
     parser.add_argument("--paper-id", default=None, help="Optional single paper_id to process.")
     parser.add_argument("--top-k-per-query", type=int, default=DEFAULT_TOP_K_PER_QUERY)
     parser.add_argument("--max-chunks-sent", type=int, default=DEFAULT_MAX_CHUNKS_SENT)
+    parser.add_argument(
+        "--retrieval-mode",
+        choices=RETRIEVAL_MODES,
+        default=DEFAULT_RETRIEVAL_MODE,
+        help="vector = cosine only; hybrid = reciprocal rank fusion of cosine and BM25 (needs the lexical index).",
+    )
     parser.add_argument("--limit", type=int, default=None, help="Optional max number of papers.")
     parser.add_argument("--resume", action="store_true", help="Skip papers already present in outputs/extractions.jsonl and append new results.")
+    add_batch_args(parser)
+    add_metrics_args(parser)
     args = parser.parse_args()
+    metrics = metrics_from_args("retrieve_and_extract", args)
+    batch_mode = args.batch_mode or args.batch_stub
 
     cfg = load_pipeline_config(args.config)
     cfg_paths = cfg.get("paths", {})
     out_dir = Path(args.out_dir or cfg_paths.get("out_dir", "outputs"))
     index_dir = out_dir / "index"
     extractions_path = out_dir / "extractions.jsonl"
+    manifest_path = out_dir / "extraction_manifest.json"
 
-    papers = load_index(index_dir)
+    with metrics.span("load_index", profile=True):
+        papers = load_index(index_dir)
+        text_store = open_text_store(index_dir)
     paper_ids = sorted(papers)
     if args.paper_id:
         paper_ids = [pid for pid in paper_ids if pid == args.paper_id]
@@ -354,28 +507,81 @@ def main() -> None:
             return
         raise RuntimeError("No papers selected for extraction.")
 
-    client = build_openai_client()
-    query_vectors = embed_queries(client, RETRIEVAL_QUERIES)
+    retrieval_mode = args.retrieval_mode
+    lexical_query_scores: list = []
+    row_of: dict[str, int] = {}
+    if retrieval_mode == "hybrid":
+        try:
+            lexical = LexicalIndex.load(lexical_dir_for(index_dir))
+        except FileNotFoundError as exc:
+            print(f"{exc} Falling back to --retrieval-mode vector.")
+            retrieval_mode = "vector"
+        else:
+            with metrics.span("lexical_scores"):
+                # Score the whole corpus once per query; each paper then just indexes its rows.
+                lexical_query_scores = [lexical.score_all(q) for q in RETRIEVAL_QUERIES]
+                row_of = {cid: row for row, cid in enumerate(lexical.chunk_ids)}
+
+    client = StubBatchClient(batch_dir_for(out_dir) / "stub") if args.batch_stub else build_openai_client()
+    ledger = UsageLedger(load_pricing(cfg))
+    with metrics.span("embed_queries"):
+        query_vectors, queries_embedded = cached_query_vectors(
+            query_cache_path(index_dir), RETRIEVAL_QUERIES, client, ledger, stub=args.batch_stub
+        )
+    metrics.count("query_cache_hits", len(RETRIEVAL_QUERIES) - queries_embedded)
+
+    def retrieve(paper_id: str) -> list[dict]:
+        paper_chunks = papers[paper_id]
+        with metrics.span("retrieve"):
+            retrieved = retrieve_chunks_for_paper(
+                paper_chunks,
+                query_vectors,
+                top_k_per_query=args.top_k_per_query,
+                max_chunks_sent=args.max_chunks_sent,
+                lexical_scores=(
+                    paper_lexical_scores(lexical_query_scores, row_of, paper_chunks)
+                    if retrieval_mode == "hybrid"
+                    else None
+                ),
+            )
+            materialize_text(retrieved, text_store)
+        return retrieved
+
+    # Batch mode retrieves every paper up front, submits all prompts as one job and
+    # then builds the rows below from the results, exactly as the synchronous path does.
+    retrieved_by_paper: dict[str, list[dict]] = {}
+    batch_results: dict[str, dict] = {}
+    if batch_mode:
+        retrieved_by_paper = {paper_id: retrieve(paper_id) for paper_id in paper_ids}
+        with metrics.span("extract_batch"):
+            batch_results = run_batch(
+                client,
+                batch_dir_for(out_dir),
+                "extractions",
+                RESPONSES_ENDPOINT,
+                [(paper_id, extraction_request(paper_id, retrieved_by_paper[paper_id])) for paper_id in paper_ids],
+                args.batch_poll_seconds,
+            )
 
     all_rows: list[dict] = []
     for paper_id in paper_ids:
         paper_chunks = papers[paper_id]
-        retrieved = retrieve_chunks_for_paper(
-            paper_chunks,
-            query_vectors,
-            top_k_per_query=args.top_k_per_query,
-            max_chunks_sent=args.max_chunks_sent,
-        )
+        retrieved = retrieved_by_paper.pop(paper_id) if batch_mode else retrieve(paper_id)
 
         payload: ExtractionPayload
         qa: dict
         error_message = None
         try:
-            payload = call_extraction(client, paper_id, retrieved)
+            with metrics.span("extract"):
+                if batch_mode:
+                    payload = batch_extraction(batch_results[paper_id], paper_id, ledger)
+                else:
+                    payload = call_extraction(client, paper_id, retrieved, ledger)
             qa = qa_flags(payload, retrieved, total_chunks_available=len(paper_chunks))
         except (ValidationError, json.JSONDecodeError, Exception) as exc:
             # Keep pipeline auditable and resumable.
             error_message = f"{type(exc).__name__}: {exc}"
+            metrics.count("extraction_errors")
             payload = ExtractionPayload(
                 paper_id=paper_id,
                 population="unclear",
@@ -400,10 +606,12 @@ def main() -> None:
             {
                 "chunk_id": c["chunk_id"],
                 "page": c["page"],
+                "page_end": c.get("page_end", c["page"]),
                 "chunk_index_on_page": c["chunk_index_on_page"],
                 "char_start": c["char_start"],
                 "char_end": c["char_end"],
                 "retrieval_score": round(float(c.get("retrieval_score", 0.0)), 6),
+                "rrf_score": round(float(c["rrf_score"]), 6) if "rrf_score" in c else None,
             }
             for c in retrieved
         ]
@@ -414,14 +622,20 @@ def main() -> None:
             "extraction_model": EXTRACTION_MODEL,
             "prompt_version": PROMPT_VERSION,
             "retrieval_queries": RETRIEVAL_QUERIES,
+            "retrieval_mode": retrieval_mode,
+            "rrf_k": RRF_K if retrieval_mode == "hybrid" else None,
+            "batch_mode": ("stub" if args.batch_stub else "api") if batch_mode else None,
             "num_chunks_available": len(paper_chunks),
             "num_chunks_retrieved": len(retrieved),
             "top_k_per_query": args.top_k_per_query,
             "max_chunks_sent": args.max_chunks_sent,
             "qa_flags": qa,
+            "usage": ledger.for_paper(paper_id),
             "error": error_message,
         }
         all_rows.append(row)
+        metrics.count("papers")
+        metrics.count("chunks_sent", len(retrieved))
         print(f"{paper_id}: instruments={len(row['instruments'])} timepoints={len(row['timepoints'])} retrieved={len(retrieved)}")
 
     if args.resume:
@@ -434,6 +648,28 @@ def main() -> None:
         jsonl_write(extractions_path, all_rows)
         print(f"Wrote {len(all_rows)} paper-level extraction records to {extractions_path.as_posix()}")
 
+    run_summary = metrics.summary()
+    manifest = {
+        "timestamp_utc": utc_now_iso(),
+        "run_id": run_summary["run_id"],
+        "extractions_jsonl": str(extractions_path.as_posix()),
+        "resume": args.resume,
+        "papers_processed": len(all_rows),
+        "skipped_existing": skipped_existing,
+        "extraction_errors": run_summary["counters"].get("extraction_errors", 0),
+        "embedding_model": EMBEDDING_MODEL,
+        "extraction_model": EXTRACTION_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "retrieval_mode": retrieval_mode,
+        "batch_mode": ("stub" if args.batch_stub else "api") if batch_mode else None,
+        "usage": ledger.summary(),
+        "timings_s": {name: round(agg["wall_s"], 3) for name, agg in run_summary["spans"].items()},
+        "peak_rss_mb": run_summary["peak_rss_mb"],
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    print(f"Wrote {manifest_path.as_posix()}")
+    print("\n".join(ledger.report_lines() + metrics.close()))
+
 
 if __name__ == "__main__":
     main()
@@ -3,6 +3,7 @@ from __future__ import annotations
 import json
 import os
 import random
+import sys
 import time
 from pathlib import Path
 from typing import Any, Iterable, Iterator
@@ -11,9 +12,14 @@ import yaml
 from dotenv import load_dotenv
 from openai import OpenAI
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from grey_search.utils.log import RunMetrics, add_metrics_args, metrics_from_args  # noqa: E402,F401
+
 MAX_RETRIES = 5
 RETRY_BASE_SECONDS = 1.5
 DEFAULT_CONFIG_PATH = Path(__file__).resolve().parents[1] / "pipeline_config.yaml"
+# Joins consecutive pages inside a chunk that spans a page break (see build_index.py).
+PAGE_SEPARATOR = "\n\f\n"
 
 
 def jsonl_write(path: Path, rows: Iterable[dict]) -> None:
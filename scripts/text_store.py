@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+import mmap
+from pathlib import Path
+
+from shared import PAGE_SEPARATOR
+
+
+def text_store_dir_for(index_dir: Path) -> Path:
+    return index_dir / "text_store"
+
+
+class PaperText:
+    """One paper's pages joined by PAGE_SEPARATOR, as written to the corpus blob at `byte_offset`."""
+
+    def __init__(self, paper_id: str, source_path: str, pages: list[str], byte_offset: int):
+        self.paper_id = paper_id
+        self.source_path = source_path
+        self.text = PAGE_SEPARATOR.join(pages)
+        self.data = self.text.encode("utf-8")
+        self.byte_offset = byte_offset
+        self.page_starts: list[int] = []
+        pos = 0
+        for page in pages:
+            self.page_starts.append(pos)
+            pos += len(page) + len(PAGE_SEPARATOR)
+        self.page_lengths = [len(page) for page in pages]
+
+    def locate(self, text: str, page_idx: int, char_start: int) -> tuple[int, int]:
+        """Char span of `text` in the paper, expected at char_start of page page_idx or shortly after."""
+        start = self.page_starts[page_idx] + char_start
+        if not self.text.startswith(text, start):
+            found = self.text.find(text, start)
+            if found < 0:
+                found = self.text.find(text)
+            if found < 0:
+                raise ValueError(f"chunk text not found in {self.paper_id} page index {page_idx}")
+            start = found
+        return start, start + len(text)
+
+    def byte_spans(self, char_spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        """Corpus-wide (byte offset, byte length) for char spans, encoding each gap between positions once."""
+        positions = sorted({pos for span in char_spans for pos in span})
+        byte_at: dict[int, int] = {}
+        char_pos = byte_pos = 0
+        for pos in positions:
+            byte_pos += len(self.text[char_pos:pos].encode("utf-8"))
+            char_pos = pos
+            byte_at[pos] = byte_pos
+        return [(self.byte_offset + byte_at[s], byte_at[e] - byte_at[s]) for s, e in char_spans]
+
+
+class TextStoreWriter:
+    """Appends papers to `corpus.txt` and records each paper's source path and span in `papers.json`."""
+
+    def __init__(self, store_dir: Path):
+        self.store_dir = store_dir
+        store_dir.mkdir(parents=True, exist_ok=True)
+        self._fh = (store_dir / "corpus.txt").open("wb")
+        self._offset = 0
+        self.papers: dict[str, dict] = {}
+
+    def add_paper(self, paper_id: str, source_path: str, pages: list[str]) -> PaperText:
+        paper = PaperText(paper_id, source_path, pages, self._offset)
+        self._fh.write(paper.data)
+        self._offset += len(paper.data)
+        self.papers[paper_id] = {"source_path": source_path, "offset": paper.byte_offset, "length": len(paper.data)}
+        return paper
+
+    def close(self) -> None:
+        self._fh.close()
+        (self.store_dir / "papers.json").write_text(json.dumps(self.papers, indent=1), encoding="utf-8")
+
+    def __enter__(self) -> "TextStoreWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class TextStore:
+    """
+    Read side of the corpus blob: the file is memory-mapped and text is decoded
+    only for the (offset, length) spans asked for, so loading an index costs the
+    metadata, not the corpus text.
+    """
+
+    def __init__(self, store_dir: Path):
+        corpus_path = store_dir / "corpus.txt"
+        if not corpus_path.exists():
+            raise FileNotFoundError(f"Missing text store: {store_dir}. Run scripts/build_index.py first.")
+        self.papers: dict[str, dict] = json.loads((store_dir / "papers.json").read_text(encoding="utf-8"))
+        self._fh = corpus_path.open("rb")
+        size = corpus_path.stat().st_size
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def span(self, offset: int, length: int) -> str:
+        if self._mm is None or length <= 0:
+            return ""
+        return self._mm[offset : offset + length].decode("utf-8")
+
+    def text(self, row: dict) -> str:
+        """Text of a chunk/page row; rows from older indexes still carry it inline."""
+        if "text" in row:
+            return row["text"]
+        return self.span(row["text_offset"], row["text_length"])
+
+    def source_path(self, paper_id: str) -> str:
+        return (self.papers.get(paper_id) or {}).get("source_path", "")
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+        self._fh.close()
@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import argparse
 import csv
 import re
+import sys
 from pathlib import Path
 from typing import Dict, Iterable, List
 
 ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+from grey_search.utils.log import add_metrics_args, metrics_from_args  # noqa: E402
+
 RAW_DIR = ROOT / "data" / "raw"
 NORMALIZED_DIR = ROOT / "data" / "normalized"
 
@@ -147,10 +152,19 @@ def normalize_pubmed_csv() -> None:
 
 
 def main() -> None:
-    normalize_ris_source("cinahl")
-    normalize_ris_source("wos")
-    normalize_pubmed_csv()
+    parser = argparse.ArgumentParser(description="Normalize RIS exports and the PubMed CSV into data/normalized.")
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    metrics = metrics_from_args("ris_to_csv", args)
+
+    with metrics.span("cinahl", profile=True):
+        normalize_ris_source("cinahl")
+    with metrics.span("wos"):
+        normalize_ris_source("wos")
+    with metrics.span("pubmed"):
+        normalize_pubmed_csv()
     print(f"Wrote normalized CSV files to: {NORMALIZED_DIR}")
+    print("\n".join(metrics.close()))
 
 
 if __name__ == "__main__":
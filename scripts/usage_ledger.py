@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any
+
+# USD per 1M tokens at standard (synchronous) rates. `pricing:` in pipeline_config.yaml
+# overrides or extends this per model; unpriced models are counted but not costed.
+DEFAULT_PRICING: dict[str, dict[str, float]] = {
+    "text-embedding-3-small": {"input": 0.02},
+    "text-embedding-3-large": {"input": 0.13},
+    "gpt-5": {"input": 1.25, "cached_input": 0.125, "output": 10.0},
+    "gpt-5-mini": {"input": 0.25, "cached_input": 0.025, "output": 2.0},
+}
+# Batch API calls are billed at this fraction of the synchronous rate (per-model `batch_factor` overrides).
+BATCH_PRICE_FACTOR = 0.5
+TOKEN_FIELDS = ("input_tokens", "cached_input_tokens", "output_tokens", "reasoning_tokens")
+
+
+def load_pricing(cfg: dict) -> dict[str, dict[str, float]]:
+    pricing = {model: dict(rates) for model, rates in DEFAULT_PRICING.items()}
+    for model, rates in (cfg.get("pricing") or {}).items():
+        pricing.setdefault(model, {}).update({k: float(v) for k, v in (rates or {}).items()})
+    return pricing
+
+
+def _field(obj: Any, name: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def usage_tokens(usage: Any) -> dict[str, int]:
+    """
+    Token counts from an SDK `usage` object (or its dict form): embeddings report
+    prompt_tokens only, the Responses API input/output tokens plus cached and
+    reasoning details.
+    """
+    input_tokens = _field(usage, "input_tokens")
+    if input_tokens is None:
+        input_tokens = _field(usage, "prompt_tokens")
+    return {
+        "input_tokens": int(input_tokens or 0),
+        "cached_input_tokens": int(_field(_field(usage, "input_tokens_details"), "cached_tokens") or 0),
+        "output_tokens": int(_field(usage, "output_tokens") or 0),
+        "reasoning_tokens": int(_field(_field(usage, "output_tokens_details"), "reasoning_tokens") or 0),
+    }
+
+
+def token_cost(
+    model: str, tokens: dict[str, int], pricing: dict[str, dict[str, float]], batch: bool = False
+) -> float | None:
+    """USD cost of one call's tokens, or None when `model` has no pricing entry."""
+    rates = pricing.get(model)
+    if not rates:
+        return None
+    cached = tokens.get("cached_input_tokens", 0)
+    uncached = tokens.get("input_tokens", 0) - cached
+    cost = (
+        uncached * rates.get("input", 0.0)
+        + cached * rates.get("cached_input", rates.get("input", 0.0))
+        + tokens.get("output_tokens", 0) * rates.get("output", 0.0)
+    )
+    if batch:
+        cost *= rates.get("batch_factor", BATCH_PRICE_FACTOR)
+    return cost / 1_000_000
+
+
+def summarize(records: list[dict]) -> dict:
+    """Summed calls, tokens, latency and cost of usage records (cost None if any call was unpriced)."""
+    totals: dict[str, Any] = {"calls": len(records), **{field: 0 for field in TOKEN_FIELDS}, "latency_s": 0.0}
+    cost: float | None = 0.0
+    for rec in records:
+        for field in TOKEN_FIELDS:
+            totals[field] += rec[field]
+        totals["latency_s"] += rec["latency_s"]
+        cost = None if cost is None or rec["cost_usd"] is None else cost + rec["cost_usd"]
+    totals["latency_s"] = round(totals["latency_s"], 3)
+    totals["cost_usd"] = round(cost, 6) if cost is not None else None
+    return totals
+
+
+class UsageLedger:
+    """
+    Per-call token/latency/cost records for one run. Every embeddings/responses
+    call appends one record tagged with its stage (and paper, for extraction), so
+    the run can be rolled up per stage, per model or per paper.
+    """
+
+    def __init__(self, pricing: dict[str, dict[str, float]] | None = None):
+        self.pricing = pricing if pricing is not None else load_pricing({})
+        self.records: list[dict] = []
+
+    def record(
+        self, stage: str, model: str, usage: Any, latency_s: float, paper_id: str | None = None, batch: bool = False
+    ) -> dict:
+        """One call's usage; Batch API results pass batch=True (discounted, latency 0: they have no per-call latency)."""
+        tokens = usage_tokens(usage)
+        rec = {
+            "stage": stage,
+            "model": model,
+            "paper_id": paper_id,
+            **tokens,
+            "latency_s": round(latency_s, 3),
+            "cost_usd": token_cost(model, tokens, self.pricing, batch=batch),
+            "batch": batch,
+        }
+        self.records.append(rec)
+        return rec
+
+    def for_paper(self, paper_id: str) -> dict:
+        return summarize([rec for rec in self.records if rec["paper_id"] == paper_id])
+
+    def summary(self) -> dict:
+        by_stage: dict[str, list[dict]] = defaultdict(list)
+        by_model: dict[str, list[dict]] = defaultdict(list)
+        for rec in self.records:
+            by_stage[rec["stage"]].append(rec)
+            by_model[rec["model"]].append(rec)
+        return {
+            "totals": summarize(self.records),
+            "by_stage": {stage: summarize(recs) for stage, recs in by_stage.items()},
+            "by_model": {model: summarize(recs) for model, recs in by_model.items()},
+        }
+
+    def report_lines(self) -> list[str]:
+        lines = ["API usage:"]
+        for stage, agg in self.summary()["by_stage"].items():
+            cost = f"${agg['cost_usd']:.4f}" if agg["cost_usd"] is not None else "unpriced"
+            lines.append(
+                f"  {stage:<16} calls={agg['calls']:<5} in={agg['input_tokens']:<9} "
+                f"cached={agg['cached_input_tokens']:<8} out={agg['output_tokens']:<8} {cost}"
+            )
+        return lines
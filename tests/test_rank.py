@@ -0,0 +1,17 @@
+from grey_search.sources.record import GreyRecord
+from grey_search.utils.rank import RelevanceScorer
+
+
+def test_prefix_terms_all_score():
+    scorer = RelevanceScorer(["PROM", "PROMIS", "quality of life", "quality"], ["rat"], 1)
+    result = scorer.score(GreyRecord(title="quality of life"))
+    assert set(result.include_hits) == {"quality of life", "quality"}
+    assert result.score == 2
+
+
+def test_word_boundaries_and_plurals():
+    scorer = RelevanceScorer(["survivor", "PROM", "PROMIS"], ["rat"], 1)
+    result = scorer.score(GreyRecord(title="Survivors rate PROMIS", abstract="in rats"))
+    assert set(result.include_hits) == {"survivor", "promis"}
+    assert result.exclude_hits == ("rat",)
+    assert result.score == 0